@@ -0,0 +1,58 @@
+"""
+Startup time and peak chrome memory for N crawlers, with and without a shared DriverPool.
+
+    python -m benchmarks.driver_pool_bench --path /path/to/chromedriver -n 10 --pool-size 2
+
+"without pool": every crawler gets its own browser (the old behaviour of launching in __init__).
+"with pool": crawlers share --pool-size browsers, each one leasing only while it "checks out".
+Needs psutil for the memory figures.
+"""
+import argparse
+import time
+from sel_crawler.core.driver_pool import DriverPool
+from sel_crawler.core.profile import BrowserProfile
+from sel_crawler.core.websites import GlobalScrape
+
+def peak_rss(pools: list[DriverPool]) -> int:
+    total = 0
+    for pool in pools:
+        for pooled in pool._idle + [d for d in pool._leased if hasattr(d, '_driver')]:
+            total += DriverPool.rss(pooled._driver)
+    return total
+
+def without_pool(path: str, n: int, headless: bool) -> tuple[float, int]:
+    start = time.perf_counter()
+    crawlers = [GlobalScrape(path, None, None, headless=headless) for _ in range(n)]
+    for crawler in crawlers:
+        crawler.driver.get('about:blank')
+    elapsed = time.perf_counter() - start
+    peak = peak_rss([c.pool for c in crawlers])
+    for crawler in crawlers:
+        crawler.close()
+        crawler.pool.close()
+    return elapsed, peak
+
+def with_pool(path: str, n: int, size: int, headless: bool) -> tuple[float, int]:
+    start = time.perf_counter()
+    pool = DriverPool(path, size=size, profile=BrowserProfile(headless=headless))
+    crawlers = [GlobalScrape(path, None, None, pool=pool) for _ in range(n)]
+    peak = 0
+    for crawler in crawlers:
+        crawler.driver.get('about:blank')
+        peak = max(peak, peak_rss([pool]))
+        crawler.close()
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return elapsed, peak
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', required=True, help='chromedriver executable')
+    parser.add_argument('-n', type=int, default=10, help='number of crawlers')
+    parser.add_argument('--pool-size', type=int, default=2)
+    parser.add_argument('--headless', action='store_true')
+    args = parser.parse_args()
+
+    for name, (elapsed, peak) in (("without pool", without_pool(args.path, args.n, args.headless)),
+                                  ("with pool", with_pool(args.path, args.n, args.pool_size, args.headless))):
+        print("{:<13} n={:<4} startup={:7.2f}s peak_rss={:8.1f}MB".format(name, args.n, elapsed, peak / 2**20))
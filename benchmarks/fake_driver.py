@@ -0,0 +1,474 @@
+"""
+In-process stand in for a chrome webdriver, for benchmarking the crawlers offline.
+
+Pages are fetched over http (from the fixture site) and parsed with the probe's html parser.
+Every command goes through FakeDriver.execute, same as selenium, so it's counted, timestamped,
+delayed by a simulated round trip latency, and visible to Metrics.instrument.
+Clicking an element follows its (or an ancestor's) data-next attribute or link href;
+data-complete marks the click that places the order.
+"""
+from collections import Counter
+from urllib.parse import urljoin
+import base64
+import itertools
+import time
+from selenium.common import exceptions
+from selenium.webdriver.common.by import By
+from sel_crawler.core.forms import FILL_SCRIPT
+from sel_crawler.core.changes import REGION_SCRIPT, region_html
+from sel_crawler.core.probe import HttpProbe, ProbeError, Node, parse_html
+
+# smallest valid png, for screenshots
+PNG = base64.b64decode('iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg==')
+
+class _Document:
+    def __init__(self, url: str, html: str) -> None:
+        self.url = url
+        self.html = html
+        self.root = parse_html(html)
+        # set False once navigated away from, elements found in it go stale
+        self.live = True
+
+class _Window:
+    def __init__(self, document: _Document) -> None:
+        self.document = document
+        self.frames = []
+
+def _xpath(root: Node, path: str) -> list[Node]:
+    """
+    absolute paths of plain steps only, e.g. /html/body/div[1]/form/button (what the crawlers use)
+    """
+    if not path.startswith('/') or path.startswith('//'):
+        raise exceptions.InvalidSelectorException("fake driver only supports absolute xpaths: " + path)
+    nodes = [root]
+    for step in path.strip('/').split('/'):
+        tag, _, index = step.partition('[')
+        found = []
+        for node in nodes:
+            children = [c for c in node.children if isinstance(c, Node) and c.tag == tag]
+            if index:
+                position = int(index.rstrip(']'))
+                children = children[position - 1:position]
+            found += children
+        nodes = found
+    return nodes
+
+def _find(root: Node, by: str, value: str) -> list[Node]:
+    if by == By.CSS_SELECTOR:
+        return root.select(value)
+    if by == By.XPATH:
+        return _xpath(root, value)
+    if by == By.ID:
+        return [n for n in root.iter() if n.attrs.get('id') == value]
+    if by == By.NAME:
+        return [n for n in root.iter() if n.attrs.get('name') == value]
+    if by == By.TAG_NAME:
+        return [n for n in root.iter() if n.tag == value.lower()]
+    if by == By.CLASS_NAME:
+        return [n for n in root.iter() if value in n.classes]
+    if by == By.LINK_TEXT:
+        return [n for n in root.iter() if n.tag == 'a' and n.text == value]
+    if by == By.PARTIAL_LINK_TEXT:
+        return [n for n in root.iter() if n.tag == 'a' and value in n.text]
+    raise exceptions.InvalidSelectorException("unsupported locator " + by)
+
+class FakeElement:
+    """
+    WebElement lookalike, every call is one command on the owning driver.
+    """
+    def __init__(self, driver: "FakeDriver", node: Node, document: _Document) -> None:
+        self._driver = driver
+        self._node = node
+        self._document = document
+
+    def _execute(self, command: str, params: dict = None):
+        if not self._document.live:
+            raise exceptions.StaleElementReferenceException("element is no longer attached to the page")
+        return self._driver.execute(command, dict(params or {}, element=self))
+
+    @property
+    def tag_name(self) -> str:
+        return self._execute('getElementTagName')
+
+    @property
+    def text(self) -> str:
+        return self._execute('getElementText')
+
+    def get_attribute(self, name: str) -> str:
+        return self._execute('getElementAttribute', {'name': name})
+
+    def get_dom_attribute(self, name: str) -> str:
+        return self._execute('getElementAttribute', {'name': name})
+
+    def get_property(self, name: str):
+        return self._execute('getElementAttribute', {'name': name})
+
+    def is_displayed(self) -> bool:
+        return self._execute('isElementDisplayed')
+
+    def is_enabled(self) -> bool:
+        return self._execute('isElementEnabled')
+
+    def is_selected(self) -> bool:
+        return self._execute('isElementSelected')
+
+    def click(self) -> None:
+        self._execute('clickElement')
+
+    def clear(self) -> None:
+        self._execute('clearElement')
+
+    def send_keys(self, *value) -> None:
+        self._execute('sendKeysToElement', {'text': ''.join(value)})
+
+    def find_element(self, by: str = By.ID, value: str = None) -> "FakeElement":
+        return self._execute('findChildElement', {'using': by, 'value': value})
+
+    def find_elements(self, by: str = By.ID, value: str = None) -> list["FakeElement"]:
+        return self._execute('findChildElements', {'using': by, 'value': value})
+
+class _SwitchTo:
+    def __init__(self, driver: "FakeDriver") -> None:
+        self._driver = driver
+
+    def frame(self, frame_reference) -> None:
+        self._driver.execute('switchToFrame', {'id': frame_reference})
+
+    def default_content(self) -> None:
+        self._driver.execute('switchToFrame', {'id': None})
+
+    def parent_frame(self) -> None:
+        self._driver.execute('switchToParentFrame')
+
+    def window(self, handle: str) -> None:
+        self._driver.execute('switchToWindow', {'handle': handle})
+
+    def new_window(self, type_hint: str = None) -> None:
+        self.window(self._driver.execute('newWindow', {'type': type_hint}))
+
+class FakeDriver:
+    """
+    Counts every command (self.commands), timestamps them (self.log) and sleeps `latency`
+    seconds per command, plus `page_load` seconds per navigation.
+    self.orders holds (time.time(), commands so far) for every order placed.
+    """
+    def __init__(self, latency: float = 0.002, page_load: float = 0.02) -> None:
+        """
+        latency: simulated round trip per command, in seconds.
+        page_load: extra seconds every navigation (get/refresh/link click) takes.
+        """
+        self.latency = latency
+        self.page_load = page_load
+        self.commands = Counter()
+        self.log = []
+        self.orders = []
+        self.quit_called = False
+        self.blocked_urls = []
+        self._probe = HttpProbe(max_per_host=1)
+        self._cookies = {}
+        self._handles = itertools.count(1)
+        self._windows = {}
+        self._handle = self._new_window()
+        self.switch_to = _SwitchTo(self)
+
+    # --- transport ---
+
+    def execute(self, command: str, params: dict = None):
+        if self.quit_called:
+            raise exceptions.InvalidSessionIdException("session deleted because of page crash")
+        self.commands[command] += 1
+        self.log.append((time.time(), command))
+        if self.latency:
+            time.sleep(self.latency)
+        return getattr(self, '_cmd_' + command)(params or {})
+
+    @property
+    def total_commands(self) -> int:
+        return sum(self.commands.values())
+
+    # --- page state ---
+
+    def _new_window(self) -> str:
+        handle = 'fake-window-{}'.format(next(self._handles))
+        self._windows[handle] = _Window(_Document('about:blank', ''))
+        return handle
+
+    @property
+    def _window(self) -> _Window:
+        if self._handle not in self._windows:
+            raise exceptions.NoSuchWindowException("no such window " + self._handle)
+        return self._windows[self._handle]
+
+    @property
+    def _context(self) -> _Document:
+        window = self._window
+        return window.frames[-1] if window.frames else window.document
+
+    def _load(self, url: str) -> _Document:
+        if url == 'about:blank':
+            return _Document(url, '')
+        if self.page_load:
+            time.sleep(self.page_load)
+        try:
+            response = self._probe.fetch(url)
+            return _Document(response.url, response.text)
+        except ProbeError as e:
+            return _Document(url, '<html><body><h1>HTTP {}</h1></body></html>'.format(e.status))
+        except OSError as e:
+            return _Document(url, '<html><body><h1>{}</h1></body></html>'.format(e))
+
+    def _navigate(self, url: str) -> None:
+        window = self._window
+        for document in [window.document] + window.frames:
+            document.live = False
+        window.document = self._load(url)
+        window.frames = []
+
+    def _element(self, node: Node) -> FakeElement:
+        return FakeElement(self, node, self._context)
+
+    # --- driver api ---
+
+    def get(self, url: str) -> None:
+        self.execute('get', {'url': url})
+
+    def refresh(self) -> None:
+        self.execute('refresh')
+
+    @property
+    def current_url(self) -> str:
+        return self.execute('getCurrentUrl')
+
+    @property
+    def title(self) -> str:
+        return self.execute('getTitle')
+
+    @property
+    def page_source(self) -> str:
+        return self.execute('getPageSource')
+
+    @property
+    def window_handles(self) -> list[str]:
+        return self.execute('getWindowHandles')
+
+    @property
+    def current_window_handle(self) -> str:
+        return self.execute('getCurrentWindowHandle')
+
+    def find_element(self, by: str = By.ID, value: str = None) -> FakeElement:
+        return self.execute('findElement', {'using': by, 'value': value})
+
+    def find_elements(self, by: str = By.ID, value: str = None) -> list[FakeElement]:
+        return self.execute('findElements', {'using': by, 'value': value})
+
+    def execute_script(self, script: str, *args):
+        return self.execute('executeScript', {'script': script, 'args': list(args)})
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: dict):
+        return self.execute('executeCdpCommand', {'cmd': cmd, 'params': cmd_args})
+
+    def get_cookies(self) -> list[dict]:
+        return self.execute('getAllCookies')
+
+    def add_cookie(self, cookie: dict) -> None:
+        self.execute('addCookie', {'cookie': cookie})
+
+    def delete_all_cookies(self) -> None:
+        self.execute('deleteAllCookies')
+
+    def implicitly_wait(self, seconds: float) -> None:
+        self.execute('setTimeouts', {'implicit': seconds})
+
+    def get_screenshot_as_png(self) -> bytes:
+        return base64.b64decode(self.get_screenshot_as_base64())
+
+    def get_screenshot_as_base64(self) -> str:
+        return self.execute('screenshot')
+
+    def save_screenshot(self, filename: str) -> bool:
+        # nothing is written, the benchmark only cares about the round trip
+        self.get_screenshot_as_base64()
+        return True
+
+    def close(self) -> None:
+        self.execute('closeWindow')
+
+    def quit(self) -> None:
+        if not self.quit_called:
+            self.execute('quit')
+
+    # --- command handlers ---
+
+    def _cmd_get(self, params):
+        self._navigate(params['url'])
+
+    def _cmd_refresh(self, params):
+        self._navigate(self._window.document.url)
+
+    def _cmd_getCurrentUrl(self, params):
+        return self._window.document.url
+
+    def _cmd_getTitle(self, params):
+        titles = self._window.document.root.select('title')
+        return titles[0].text if titles else ''
+
+    def _cmd_getPageSource(self, params):
+        return '<html>{}</html>'.format(self._window.document.root.text)
+
+    def _cmd_getWindowHandles(self, params):
+        return list(self._windows)
+
+    def _cmd_getCurrentWindowHandle(self, params):
+        return self._handle
+
+    def _cmd_newWindow(self, params):
+        return self._new_window()
+
+    def _cmd_switchToWindow(self, params):
+        if params['handle'] not in self._windows:
+            raise exceptions.NoSuchWindowException("no such window " + params['handle'])
+        self._handle = params['handle']
+
+    def _cmd_closeWindow(self, params):
+        self._windows.pop(self._handle, None)
+
+    def _cmd_findElement(self, params, root: Node = None):
+        found = _find(root if root else self._context.root, params['using'], params['value'])
+        if not found:
+            raise exceptions.NoSuchElementException("Unable to locate element: {}={}".format(params['using'], params['value']))
+        return self._element(found[0])
+
+    def _cmd_findElements(self, params, root: Node = None):
+        return [self._element(n) for n in _find(root if root else self._context.root, params['using'], params['value'])]
+
+    def _cmd_findChildElement(self, params):
+        return self._cmd_findElement(params, params['element']._node)
+
+    def _cmd_findChildElements(self, params):
+        return self._cmd_findElements(params, params['element']._node)
+
+    def _cmd_switchToFrame(self, params):
+        window = self._window
+        ref = params['id']
+        if ref is None:
+            window.frames = []
+            return
+        if isinstance(ref, FakeElement):
+            node = ref._node
+        else:
+            frames = [n for n in self._context.root.iter() if n.tag in ('iframe', 'frame')]
+            if isinstance(ref, int):
+                frames = frames[ref:ref + 1]
+            else:
+                frames = [n for n in frames if ref in (n.attrs.get('name'), n.attrs.get('id'))]
+            if not frames:
+                raise exceptions.NoSuchFrameException(str(ref))
+            node = frames[0]
+        window.frames.append(self._load(urljoin(self._context.url, node.attrs.get('src', 'about:blank'))))
+
+    def _cmd_switchToParentFrame(self, params):
+        if self._window.frames:
+            self._window.frames.pop()
+
+    def _cmd_executeScript(self, params):
+        script, args = params['script'], params['args']
+        if script == FILL_SCRIPT:
+            return self._fill(args[0])
+        if script == REGION_SCRIPT:
+            # the markup as served, like outerHTML of a page nothing has changed since
+            return '\n'.join(''.join(region_html(self._context.html, selector)) for selector in args[0])
+        if 'performance.getEntriesByType' in script:
+            # fixtures have no subresources, the page is idle as soon as it's loaded
+            return 0
+        if 'localStorage' in script:
+            return {} if 'return' in script else None
+        return None
+
+    def _fill(self, batch: list) -> list[str]:
+        failed = []
+        for selector, value, kind in batch:
+            found = self._context.root.select(selector)
+            # the script only sets elements with a native value (input, textarea, select)
+            if not found or found[0].tag not in ('input', 'textarea', 'select') or (kind == 'select') != (found[0].tag == 'select'):
+                failed.append(selector)
+                continue
+            if kind == 'select':
+                options = [o for o in found[0].iter() if o.tag == 'option'
+                           and value in (o.attrs.get('value', o.text), o.text)]
+                if not options:
+                    failed.append(selector)
+                    continue
+                value = options[0].attrs.get('value', options[0].text)
+            found[0].attrs['value'] = value
+        return failed
+
+    def _cmd_executeCdpCommand(self, params):
+        # accepted and remembered, fixtures have no subresources to block
+        if params['cmd'] == 'Network.setBlockedURLs':
+            self.blocked_urls = list(params['params']['urls'])
+        return {}
+
+    def _cmd_getAllCookies(self, params):
+        return list(self._cookies.values())
+
+    def _cmd_addCookie(self, params):
+        self._cookies[params['cookie']['name']] = dict(params['cookie'])
+
+    def _cmd_deleteAllCookies(self, params):
+        self._cookies = {}
+
+    def _cmd_setTimeouts(self, params):
+        pass
+
+    def _cmd_screenshot(self, params):
+        return base64.b64encode(PNG).decode()
+
+    def _cmd_quit(self, params):
+        self.quit_called = True
+        self._probe.close()
+
+    def _cmd_getElementTagName(self, params):
+        return params['element']._node.tag
+
+    def _cmd_getElementText(self, params):
+        return params['element']._node.text
+
+    def _cmd_getElementAttribute(self, params):
+        return params['element']._node.attrs.get(params['name'])
+
+    def _cmd_isElementDisplayed(self, params):
+        node = params['element']._node
+        while node is not None:
+            if 'hidden' in node.attrs or 'display:none' in node.attrs.get('style', '').replace(' ', ''):
+                return False
+            node = node.parent
+        return True
+
+    def _cmd_isElementEnabled(self, params):
+        return 'disabled' not in params['element']._node.attrs
+
+    def _cmd_isElementSelected(self, params):
+        node = params['element']._node
+        return 'selected' in node.attrs or 'checked' in node.attrs
+
+    def _cmd_clearElement(self, params):
+        params['element']._node.attrs['value'] = ''
+
+    def _cmd_sendKeysToElement(self, params):
+        node = params['element']._node
+        node.attrs['value'] = node.attrs.get('value', '') + params['text']
+
+    def _cmd_clickElement(self, params):
+        element = params['element']
+        node = element._node
+        while node is not None and node.tag != '#document':
+            target = node.attrs.get('data-next')
+            if target is None and node.tag == 'a':
+                target = node.attrs.get('href')
+            if target and not target.startswith(('#', 'javascript:')):
+                if 'data-complete' in node.attrs:
+                    # the order is placed before the confirmation page loads
+                    self.orders.append((time.time(), self.total_commands))
+                self._navigate(urljoin(element._document.url, target))
+                return
+            node = node.parent
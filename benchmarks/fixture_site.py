@@ -0,0 +1,83 @@
+"""
+Serves benchmarks/fixtures over http on localhost, with switchable stock.
+
+/game/product.html is the out of stock page; once restock('game/product.html') is called
+the server answers with game/product.in-stock.html instead. Query strings are ignored,
+so many targets can watch /game/product.html?id=1, ?id=2... on one fixture.
+Responses carry an ETag and honour If-None-Match, like a retailer's cdn would.
+"""
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import functools
+import os
+import threading
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+class _Handler(SimpleHTTPRequestHandler):
+    def translate_path(self, path):
+        page = urlsplit(path).path.lstrip('/')
+        if page in self.server.site.in_stock:
+            stocked = page.replace('.html', '.in-stock.html')
+            if os.path.exists(os.path.join(FIXTURES, stocked)):
+                page = stocked
+        return os.path.join(FIXTURES, *page.split('/'))
+
+    def send_head(self):
+        # the etag is the file actually served, so it changes exactly when the stock does
+        etag = '"{}"'.format(os.path.basename(self.translate_path(self.path)))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return None
+        # fixture mtimes say nothing about stock, so no If-Modified-Since shortcut
+        del self.headers['If-Modified-Since']
+        self.etag = etag
+        return super().send_head()
+
+    def end_headers(self):
+        if getattr(self, 'etag', None):
+            self.send_header('ETag', self.etag)
+            self.etag = None
+        # stock pages must never be served from a cache
+        self.send_header('Cache-Control', 'no-store')
+        super().end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class FixtureSite:
+    """
+    Local copy of the Game/Argos flows: product page (out of stock / in stock), basket popup,
+    checkout pages and payment iframe.
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        """
+        port: 0 picks a free one.
+        """
+        self.in_stock = set()
+        self._server = ThreadingHTTPServer((host, port), functools.partial(_Handler, directory=FIXTURES))
+        self._server.site = self
+        self._server.daemon_threads = True
+        self.base_url = 'http://{}:{}/'.format(*self._server.server_address)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def url(self, page: str) -> str:
+        return self.base_url + page
+
+    def restock(self, page: str) -> None:
+        self.in_stock.add(page)
+
+    def sell_out(self, page: str = None) -> None:
+        """
+        page: put back out of stock, every page if None.
+        """
+        if page is None:
+            self.in_stock.clear()
+        else:
+            self.in_stock.discard(page)
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,160 @@
+"""
+Offline benchmark: Game and Argos crawlers against a local copy of their checkout flows,
+driven by FakeDriver instead of chrome, so it runs anywhere in seconds and changes show up in numbers.
+
+    python -m benchmarks.offline_bench --targets 1,10,100 --latency 0.002
+
+For each site and target count, the targets are polled by a PollScheduler until the product
+restocks, then each one checks out on its own fake browser. Reported per run:
+  skipped     polls answered by a 304 or an unchanged stock region (no parsing)
+  saved       polls not made because targets watching one product share a poller (--subscribers)
+  replaced    product polls not made because a listing page showed them out of stock (--listing)
+  mem/target  python heap held per watched target while polling (tracemalloc)
+  detect      restock -> crawler noticing it
+  checkout    detection -> order placed (the final click)
+  commands    webdriver commands from launching the browser to placing the order
+With --declarative the crawlers are the ones load_site() builds from sel_crawler/sites/*.json.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from sel_crawler.core.driver_pool import DriverPool
+from sel_crawler.core.personal_details import ContactDetails, PaymentDetails, LoginDetails
+from sel_crawler.core.probe import HttpProbe
+from sel_crawler.core.screenshots import ScreenshotService
+from sel_crawler.core.history import HistoryStore
+from sel_crawler.core.websites import Game, Argos
+from sel_crawler.core.sites import load_site
+from sel_crawler.scheduler import PollScheduler
+from sel_crawler.budget import PollBudget
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.fixture_site import FixtureSite
+
+CONTACT = ContactDetails('Jane', 'Doe', 'jane@example.com', '07515365978', 'SW1A 1AA',
+                         '1', 'Cecilia Palace', 'Greater London', 'London')
+PAYMENT = PaymentDetails('VISA', '4111111111111111', 'J DOE', '04/27', '123')
+LOGIN = LoginDetails('jane@example.com', 'not-a-real-password')
+
+# fixture product page per site
+PRODUCTS = {'game': 'game/product.html', 'argos': 'argos/product.html'}
+# fixture search results page listing product.html?id=0..99
+LISTINGS = {'game': 'game/listing.html', 'argos': 'argos/listing.html'}
+
+def make_crawler(site: type, drivers: list, latency: float, page_load: float, screenshots: ScreenshotService):
+    """
+    a crawler whose browsers are FakeDrivers (appended to drivers as they launch).
+    """
+    def launch():
+        drivers.append(FakeDriver(latency, page_load))
+        return drivers[-1]
+
+    pool = DriverPool(size=1, launch=launch)
+    if site.SITE == 'argos':
+        crawler = site(None, CONTACT, PAYMENT, LOGIN, pool=pool, screenshots=screenshots)
+    else:
+        crawler = site(None, CONTACT, PAYMENT, pool=pool, screenshots=screenshots)
+    crawler.POLL_INTERVAL = (0.05, 0.1)
+    return crawler
+
+def median(values: list) -> float:
+    return statistics.median(values) if values else float('nan')
+
+def run(fixtures: FixtureSite, site: type, n: int, latency: float, page_load: float,
+        interval: tuple[float, float], warmup: float, workers: int, subscribers: int = 1,
+        listing: bool = False, rpm: float = None, history: HistoryStore = None) -> dict:
+    page = PRODUCTS[site.SITE]
+    fixtures.sell_out()
+    probe = HttpProbe(max_per_host=4)
+    screenshots = ScreenshotService(tempfile.mkdtemp())
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    drivers = {}
+    budget = PollBudget(rpm, min_interval=interval[0], max_interval=60) if rpm else None
+    scheduler = PollScheduler(probe=probe, per_host=4, checkout_workers=workers, interval=interval, budget=budget,
+                              history=history)
+    for i in range(n):
+        crawler = make_crawler(site, drivers.setdefault(i, []), latency, page_load, screenshots)
+        # every `subscribers` targets watch the same product
+        scheduler.add(crawler, fixtures.url('{}?id={}'.format(page, i // subscribers)), delay=interval[0] * i / n)
+    if listing:
+        scheduler.add_listing(fixtures.url(LISTINGS[site.SITE]))
+    thread = threading.Thread(target=asyncio.run, args=(scheduler.run(),))
+    thread.start()
+    # let every target settle into polling before measuring
+    time.sleep(warmup)
+    held = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    stats = scheduler.stats()
+
+    restocked_at = time.time()
+    fixtures.restock(page)
+    fixtures.restock(LISTINGS[site.SITE])
+    thread.join()
+    probe.close()
+    screenshots.close()
+
+    detect, checkout, commands = [], [], []
+    for i, target in enumerate(scheduler.targets):
+        crawler = target.crawler
+        if crawler.detected_at is not None:
+            detect.append(max(0.0, crawler.detected_at - restocked_at))
+        orders = [order for driver in drivers[i] for order in driver.orders]
+        if orders and crawler.detected_at is not None:
+            checkout.append(orders[0][0] - crawler.detected_at)
+            commands.append(orders[0][1])
+        crawler.pool.close()
+    return {"site": site.SITE, "targets": n, "polls": stats["polls"], "skipped": stats["polls_skipped"],
+            "saved": stats["polls_saved"], "replaced": stats["polls_replaced"], "mem_per_target": held / n,
+            "orders": len(checkout), "detect": detect, "checkout": checkout, "commands": commands}
+
+def print_result(r: dict) -> None:
+    print("{:<6} targets={:<4} polls={:<5} skipped={:<5} saved={:<5} replaced={:<5} mem/target={:7.1f}KB orders={}/{} "
+          "detect med={:5.2f}s max={:5.2f}s  checkout med={:5.2f}s max={:5.2f}s  commands/checkout={:.0f}".format(
+              r["site"], r["targets"], r["polls"], r["skipped"], r["saved"], r["replaced"], r["mem_per_target"] / 1024, r["orders"], r["targets"],
+              median(r["detect"]), max(r["detect"], default=float('nan')),
+              median(r["checkout"]), max(r["checkout"], default=float('nan')), median(r["commands"])))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', default='1,10,100', help='comma separated target counts')
+    parser.add_argument('--sites', default='game,argos')
+    parser.add_argument('--latency', type=float, default=0.002, help='simulated seconds per webdriver command')
+    parser.add_argument('--page-load', type=float, default=0.02, help='simulated seconds per navigation')
+    parser.add_argument('--interval', type=float, nargs=2, default=(0.5, 1.0), help='min/max seconds between polls')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds of polling before the restock')
+    parser.add_argument('--workers', type=int, default=4, help='checkouts running at once')
+    parser.add_argument('--subscribers', type=int, default=1, help='targets watching each product')
+    parser.add_argument('--listing', action='store_true', help='also watch the search results page listing the products')
+    parser.add_argument('--rpm', type=float, help='poll under a requests a minute budget instead of --interval')
+    parser.add_argument('--history', help='sqlite file to record probes/checkouts in, summarised at the end')
+    parser.add_argument('--declarative', action='store_true', help='run the crawlers loaded from the json site definitions')
+    parser.add_argument('--verbose', action='store_true', help="show the crawlers' own output")
+    args = parser.parse_args()
+
+    sites = {name: load_site(name) for name in PRODUCTS} if args.declarative else {cls.SITE: cls for cls in (Game, Argos)}
+    fixtures = FixtureSite()
+    history = HistoryStore(args.history) if args.history else None
+    try:
+        for name in args.sites.split(','):
+            for n in (int(t) for t in args.targets.split(',')):
+                quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+                with quiet:
+                    result = run(fixtures, sites[name], n, args.latency, args.page_load,
+                                 tuple(args.interval), args.warmup, args.workers, args.subscribers, args.listing, args.rpm, history)
+                print_result(result)
+        if history is not None:
+            history.flush()
+            print("history: {}".format(history.stats()))
+            print("detection lag: {}".format(history.detection_lag()))
+            print("checkouts: {}".format(history.success_rate()))
+    finally:
+        fixtures.close()
+        if history is not None:
+            history.close()
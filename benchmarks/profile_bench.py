@@ -0,0 +1,105 @@
+"""
+Bytes transferred and refresh latency per poll, old browser setup vs a lean BrowserProfile.
+
+    python -m benchmarks.profile_bench --path /path/to/chromedriver --polls 20
+    python -m benchmarks.profile_bench --path /path/to/chromedriver --url https://www.game.co.uk/...
+
+"before": default ChromeOptions, normal page load strategy, nothing blocked (what crawlers used to launch with).
+"after": BrowserProfile() while polling, eager page load strategy with images, fonts, media and trackers blocked.
+Without --url a local product page with a few MB of images, fonts and video is served, uncacheable
+so every refresh pays for it (the worst case).
+"""
+import argparse
+import functools
+import http.server
+import os
+import statistics
+import tempfile
+import threading
+import time
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from sel_crawler.core.profile import BrowserProfile
+
+# bytes the page and everything it pulled in took over the wire
+TRANSFERRED = """
+return performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'))
+    .reduce((total, e) => total + (e.transferSize || 0), 0);
+"""
+
+PAGE = """<html><head><style>{fonts}</style></head><body>
+<div id="mainPDPButtons"><div class="btnMint"><a href="#">Add to basket</a></div></div>
+{images}
+<video src="clip.mp4" autoplay muted></video>
+</body></html>"""
+
+class _NoStore(http.server.SimpleHTTPRequestHandler):
+    def end_headers(self):
+        self.send_header('Cache-Control', 'no-store')
+        super().end_headers()
+
+    def log_message(self, *args):
+        pass
+
+def serve_heavy_page(images: int = 20) -> tuple[http.server.ThreadingHTTPServer, str]:
+    directory = tempfile.mkdtemp()
+    for i in range(images):
+        with open(os.path.join(directory, 'img{}.png'.format(i)), 'wb') as f:
+            f.write(os.urandom(150 * 1024))
+    for i in range(4):
+        with open(os.path.join(directory, 'font{}.woff2'.format(i)), 'wb') as f:
+            f.write(os.urandom(60 * 1024))
+    with open(os.path.join(directory, 'clip.mp4'), 'wb') as f:
+        f.write(os.urandom(1024 * 1024))
+    fonts = ''.join("@font-face {{font-family: f{0}; src: url(font{0}.woff2);}} body {{font-family: f{0};}}".format(i) for i in range(4))
+    with open(os.path.join(directory, 'index.html'), 'w') as f:
+        f.write(PAGE.format(fonts=fonts, images=''.join('<img src="img{}.png">'.format(i) for i in range(images))))
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(_NoStore, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:{}/index.html'.format(server.server_port)
+
+def run(mode: str, path: str, url: str, polls: int, headless: bool) -> dict:
+    profile = BrowserProfile(headless=headless)
+    if mode == 'before':
+        options = webdriver.ChromeOptions()
+        if headless:
+            options.add_argument('--headless=new')
+    else:
+        options = profile.options()
+    driver = webdriver.Chrome(options=options, service=Service(executable_path=path))
+    try:
+        if mode == 'after':
+            profile.polling(driver)
+        driver.get(url)
+        latencies, transferred = [], []
+        for _ in range(polls):
+            start = time.perf_counter()
+            driver.refresh()
+            latencies.append(time.perf_counter() - start)
+            # let whatever the refresh started finish before counting it
+            time.sleep(0.5)
+            transferred.append(driver.execute_script(TRANSFERRED))
+    finally:
+        driver.quit()
+    return {"mode": mode, "kb_median": statistics.median(transferred) / 1024,
+            "refresh_median_s": statistics.median(latencies), "refresh_max_s": max(latencies)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', required=True, help='chromedriver executable')
+    parser.add_argument('--url', help='page to poll (defaults to a local heavy page)')
+    parser.add_argument('--polls', type=int, default=20)
+    parser.add_argument('--headless', action='store_true')
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        server, url = serve_heavy_page()
+    try:
+        for mode in ('before', 'after'):
+            r = run(mode, args.path, url, args.polls, args.headless)
+            print("{mode:<7} per poll: transferred={kb_median:9.1f}KB refresh median={refresh_median_s:6.3f}s max={refresh_max_s:6.3f}s".format(**r))
+    finally:
+        if server is not None:
+            server.shutdown()
@@ -0,0 +1,71 @@
+"""
+Shards fixture targets across local worker processes, kills one mid-watch, then restocks.
+
+    python -m benchmarks.sharding_bench --workers 3 -n 30
+
+Shows the coordinator end to end on one box: assignment, heartbeats, the dead worker's
+targets moving to the others, every target checking out, and metrics merged across processes.
+Workers drive FakeDrivers against the fixture site (see offline_bench), no chrome needed.
+"""
+import argparse
+import tempfile
+import time
+from sel_crawler.core.driver_pool import DriverPool
+from sel_crawler.core.screenshots import ScreenshotService
+from sel_crawler.core.websites import Game, Argos
+from sel_crawler.sharding import ShardCoordinator, build_crawler
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.fixture_site import FixtureSite
+from benchmarks.offline_bench import CONTACT, PAYMENT, LOGIN, PRODUCTS
+
+def fake_crawler(spec: dict, metrics):
+    """
+    worker side factory: the usual crawler, but on a FakeDriver.
+    """
+    crawler = build_crawler(spec, metrics)
+    crawler.pool = DriverPool(size=1, launch=FakeDriver)
+    crawler.screenshots = ScreenshotService(tempfile.mkdtemp())
+    crawler.POLL_INTERVAL = (0.05, 0.1)
+    return crawler
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('-n', type=int, default=30, help='number of targets (half game, half argos)')
+    parser.add_argument('--warmup', type=float, default=4, help='seconds of polling before a worker is killed')
+    args = parser.parse_args()
+
+    fixtures = FixtureSite()
+    multi = {}
+    for i in range(args.n):
+        site = Game if i % 2 else Argos
+        crawler = Argos(None, CONTACT, PAYMENT, LOGIN) if site is Argos else Game(None, CONTACT, PAYMENT)
+        multi[crawler] = fixtures.url('{}?id={}'.format(PRODUCTS[site.SITE], i))
+    coordinator = ShardCoordinator(multi, heartbeat=0.5, timeout=3)
+    processes = coordinator.spawn(args.workers, factory='benchmarks.sharding_bench:fake_crawler', interval=(0.3, 0.6))
+    try:
+        time.sleep(args.warmup)
+        print("killing worker process {}".format(processes[0].pid))
+        processes[0].kill()
+        time.sleep(2)
+        restocked = time.monotonic()
+        for page in PRODUCTS.values():
+            fixtures.restock(page)
+        finished = coordinator.wait(timeout=120)
+        elapsed = time.monotonic() - restocked
+        stats = coordinator.stats()
+        metrics = coordinator.metrics()
+    finally:
+        coordinator.stop()
+        fixtures.close()
+
+    states = {}
+    for target in stats["targets"].values():
+        states[target["state"]] = states.get(target["state"], 0) + 1
+    commands = sum(v for (name, _), v in metrics.counters.items() if name == 'webdriver_commands_total')
+    print("finished={} in {:.1f}s after restock  states={}".format(finished, elapsed, states))
+    print("reassigned targets={}  polls={} skipped={}  webdriver commands (merged)={:.0f}".format(
+        sum(t["assignments"] > 1 for t in stats["targets"].values()),
+        stats["scheduler"].get("polls", 0), stats["scheduler"].get("polls_skipped", 0), commands))
+    for worker, info in stats["workers"].items():
+        print("  {:<24} alive={} targets={}".format(worker, info["alive"], info["targets"]))
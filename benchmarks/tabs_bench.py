@@ -0,0 +1,86 @@
+"""
+Memory and time-to-detect for N crawlers: one browser each vs one shared browser with N tabs.
+
+    python -m benchmarks.tabs_bench --path /path/to/chromedriver -n 20
+
+Every crawler watches its own page on a local http server. Once they're all polling, the pages
+flip to in stock and we time how long each crawler takes to notice.
+Needs psutil for the memory figures.
+"""
+import argparse
+import functools
+import http.server
+import os
+import statistics
+import tempfile
+import threading
+import time
+from sel_crawler.core.driver_pool import DriverPool
+from sel_crawler.core.profile import BrowserProfile
+from sel_crawler.core.tabs import SharedBrowser
+from sel_crawler.core.websites import Game
+
+OUT_OF_STOCK = '<html><body><div id="mainPDPButtons"></div></body></html>'
+IN_STOCK = '<html><body><div id="mainPDPButtons"><div class="btnMint"><a href="#"><span class="btnName">Buy</span></a></div></div></body></html>'
+
+def serve(directory: str) -> http.server.ThreadingHTTPServer:
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=directory)
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def write_pages(directory: str, n: int, html: str) -> None:
+    for i in range(n):
+        with open(os.path.join(directory, '{}.html'.format(i)), 'w') as f:
+            f.write(html)
+
+def watch(crawler: Game, url: str, flipped: dict, detected: list, interval: float) -> None:
+    crawler.driver.get(url)
+    while not crawler.is_product_available():
+        time.sleep(interval)
+        crawler.driver.refresh()
+    detected.append(time.monotonic() - flipped['at'])
+
+def run(mode: str, path: str, n: int, headless: bool, interval: float) -> dict:
+    directory = tempfile.mkdtemp()
+    write_pages(directory, n, OUT_OF_STOCK)
+    server = serve(directory)
+    options = BrowserProfile(headless=headless).options()
+    shared = SharedBrowser(path, options) if mode == 'tabs' else None
+    crawlers = [Game(path, None, None, headless=headless, pool=shared) for _ in range(n)]
+    flipped = {}
+    detected = []
+    threads = [threading.Thread(target=watch, args=(c, 'http://127.0.0.1:{}/{}.html'.format(server.server_port, i), flipped, detected, interval))
+               for i, c in enumerate(crawlers)]
+    for thread in threads:
+        thread.start()
+    # let every crawler load its page before measuring
+    while sum(c._driver is not None for c in crawlers) < n:
+        time.sleep(0.1)
+    time.sleep(2)
+    pools = [shared.pool] if shared else [c.pool for c in crawlers]
+    rss = sum(DriverPool.rss(d._driver) for p in pools for d in list(p._leased) if hasattr(d, '_driver'))
+    flipped['at'] = time.monotonic()
+    write_pages(directory, n, IN_STOCK)
+    for thread in threads:
+        thread.join()
+    for crawler in crawlers:
+        crawler.close()
+    for pool in pools:
+        pool.close()
+    server.shutdown()
+    return {"mode": mode, "n": n, "rss_mb": rss / 2**20,
+            "detect_median_s": statistics.median(detected), "detect_max_s": max(detected)}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', required=True, help='chromedriver executable')
+    parser.add_argument('-n', type=int, default=20, help='number of crawlers')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between refreshes')
+    parser.add_argument('--headless', action='store_true')
+    args = parser.parse_args()
+
+    for mode in ('browsers', 'tabs'):
+        r = run(mode, args.path, args.n, args.headless, args.interval)
+        print("{mode:<9} n={n:<4} rss={rss_mb:8.1f}MB detect median={detect_median_s:6.2f}s max={detect_max_s:6.2f}s".format(**r))
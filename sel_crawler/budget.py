@@ -0,0 +1,196 @@
+from .core.probe import ProbeError
+import threading
+import random
+import time
+
+# statuses that mean the site wants us to slow down, not that the page is broken
+THROTTLED = (429, 503)
+
+class _Bucket:
+    """
+    token bucket: rate tokens a second, holding at most burst.
+    """
+    def __init__(self, rpm: float, burst: float) -> None:
+        self.rate = rpm / 60
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+class _Site:
+    def __init__(self) -> None:
+        self.backoff = 1.0
+        self.paused_until = 0.0
+        self.errors = 0
+        self.throttled = 0
+        # restocks seen per hour of the day
+        self.hours = [0] * 24
+
+class PollBudget:
+    """
+    Spreads a requests-per-minute budget, global and per site, over the targets being polled.
+    Each target's share follows its weight: user priority, how often it has restocked before,
+    and how often its site restocks at this hour. Hard caps are enforced with token buckets, and
+    a site that errors or answers 429/503 is backed off (honouring Retry-After) until it recovers.
+    """
+    def __init__(self,
+                 rpm: float = 60,
+                 per_site: dict[str, float] = None,
+                 min_interval: float = 2.0,
+                 max_interval: float = 300.0,
+                 max_backoff: float = 32.0,
+                 pause: float = 30.0,
+                 history_days: float = 30,
+                 burst: float = 2
+                 ) -> None:
+        """
+        rpm: requests a minute across every site.
+        per_site: requests a minute per site (crawler.SITE, or host), on top of the global cap.
+        min_interval, max_interval: seconds between polls of one target, whatever its share.
+        max_backoff: most a site's intervals are stretched by after errors (doubling per error)
+        pause: seconds a site is left alone after a 429/503 without a Retry-After.
+        history_days: how far back restocks count towards a target's weight.
+        burst: requests a bucket lets through back to back.
+        """
+        self.rpm = rpm
+        self.per_site = per_site if per_site else {}
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_backoff = max_backoff
+        self.pause = pause
+        self.history_days = history_days
+        self._global = _Bucket(rpm, burst)
+        self._buckets = {site: _Bucket(limit, burst) for site, limit in self.per_site.items()}
+        self._sites = {}
+        # watch key -> restock times (time.time())
+        self.restocks = {}
+        self._lock = threading.Lock()
+
+    def _site(self, site: str) -> _Site:
+        if site not in self._sites:
+            self._sites[site] = _Site()
+        return self._sites[site]
+
+    def record_restock(self, key: str, site: str, when: float = None) -> None:
+        """
+        remembers that key came into stock at when (now by default), for the weights.
+        """
+        when = when if when is not None else time.time()
+        with self._lock:
+            self.restocks.setdefault(key, []).append(when)
+            self._site(site).hours[time.localtime(when).tm_hour] += 1
+
+    def weight(self, target, now: float = None) -> float:
+        """
+        target: anything with key, site and priority (WatchTarget, ListingTarget)
+        """
+        now = now if now is not None else time.time()
+        # each priority step doubles the share
+        weight = 2.0 ** max(-3, min(3, target.priority))
+        recent = sum(1 for t in self.restocks.get(target.key, ()) if now - t < self.history_days * 86400)
+        weight *= 1 + min(recent, 4)
+        hours = self._site(target.site).hours
+        if any(hours):
+            hour = time.localtime(now).tm_hour
+            around = hours[hour - 1] + hours[hour] + hours[(hour + 1) % 24]
+            weight *= max(0.5, min(4.0, (around / 3 + 1) / (sum(hours) / 24 + 1)))
+        # a listing page stands in for every product on it
+        return weight * max(1, len(getattr(target, 'covers', ())))
+
+    def _site_rpm(self, weights: dict[str, float]) -> dict[str, float]:
+        """
+        splits the global rpm between sites by weight, capped by per_site, with what a capped
+        site can't use going to the others.
+        """
+        rpm, left, split = self.rpm, dict(weights), {}
+        while left:
+            total = sum(left.values())
+            capped = {s: self.per_site[s] for s in left if s in self.per_site and self.per_site[s] < rpm * left[s] / total}
+            if not capped:
+                split.update({s: rpm * w / total for s, w in left.items()})
+                break
+            for site, limit in capped.items():
+                split[site] = limit
+                rpm -= limit
+                del left[site]
+        return split
+
+    def _shares(self, targets: list) -> dict:
+        """
+        target -> requests a minute it gets.
+        """
+        now = time.time()
+        weights = {target: self.weight(target, now) for target in targets}
+        totals = {}
+        for target, weight in weights.items():
+            totals[target.site] = totals.get(target.site, 0) + weight
+        site_rpm = self._site_rpm(totals)
+        return {target: site_rpm[target.site] * weight / totals[target.site] for target, weight in weights.items()}
+
+    def _interval(self, rpm: float, site: str) -> float:
+        state = self._site(site)
+        interval = max(self.min_interval, 60 / rpm) if rpm else self.max_interval
+        return min(self.max_interval, interval) * state.backoff
+
+    def interval(self, target, targets: list) -> float:
+        """
+        seconds until target's next poll: its share of the budget among targets (everything
+        being polled), stretched by its site's backoff, with some jitter.
+        """
+        rpm = self._shares(set(targets) | {target})[target]
+        return self._interval(rpm, target.site) * random.uniform(0.8, 1.2)
+
+    def split(self, targets: list) -> dict:
+        """
+        how the budget is shared out right now:
+        {site: {"rpm", "backoff", "paused", "targets": {key: {"weight", "rpm", "interval"}}}}
+        """
+        view = {}
+        now = time.monotonic()
+        for target, rpm in self._shares(targets).items():
+            state = self._site(target.site)
+            site = view.setdefault(target.site, {"rpm": 0.0, "backoff": state.backoff,
+                                                 "paused": round(max(0.0, state.paused_until - now), 1), "targets": {}})
+            site["rpm"] += rpm
+            site["targets"][target.key] = {"weight": round(self.weight(target), 2), "rpm": round(rpm, 2),
+                                           "interval": round(self._interval(rpm, target.site), 1)}
+        return view
+
+    def acquire(self, site: str) -> float:
+        """
+        takes a request from the global and site buckets. Returns 0 if it can go now, otherwise
+        how many seconds to wait before asking again (nothing is taken).
+        """
+        now = time.monotonic()
+        with self._lock:
+            state = self._site(site)
+            buckets = [self._global] + ([self._buckets[site]] if site in self._buckets else [])
+            wait = max([state.paused_until - now] + [b.wait(now) for b in buckets])
+            if wait > 0:
+                return wait
+            for bucket in buckets:
+                bucket.tokens -= 1
+            return 0.0
+
+    def succeeded(self, site: str) -> None:
+        with self._lock:
+            state = self._site(site)
+            state.backoff = max(1.0, state.backoff / 2)
+
+    def failed(self, site: str, error: Exception) -> None:
+        """
+        backs site off after an error; a 429/503 also pauses it for Retry-After (or pause) seconds.
+        """
+        with self._lock:
+            state = self._site(site)
+            state.errors += 1
+            state.backoff = min(self.max_backoff, state.backoff * 2)
+            if isinstance(error, ProbeError) and error.status in THROTTLED:
+                state.throttled += 1
+                wait = error.retry_after if error.retry_after is not None else self.pause * state.backoff / 2
+                state.paused_until = max(state.paused_until, time.monotonic() + wait)
+                print("{} throttled us (HTTP {}), pausing it for {:.0f}s".format(site, error.status, wait))
@@ -0,0 +1,137 @@
+from .probe import HttpProbe, VOID_TAGS, parse_html
+import threading
+import hashlib
+import re
+
+# outerHTML of every element matching each region selector, in one round trip
+REGION_SCRIPT = """
+return arguments[0].map(s => Array.from(document.querySelectorAll(s)).map(e => e.outerHTML).join('')).join('\\n');
+"""
+
+def _region_start(html: str, selector: str, pos: int):
+    name = re.escape(selector[1:])
+    if selector.startswith('#'):
+        pattern = r'<(\w+)\b[^>]*?(?<![\w-])id\s*=\s*["\']?' + name + r'["\'\s/>]'
+    elif selector.startswith('.'):
+        pattern = r'<(\w+)\b[^>]*?(?<![\w-])class\s*=\s*["\'][^"\']*?(?<![\w-])' + name + r'(?![\w-])'
+    else:
+        raise ValueError("stock regions are '#id' or '.class' selectors, not {!r}".format(selector))
+    return re.compile(pattern, re.IGNORECASE).search(html, pos)
+
+def region_html(html: str, selector: str) -> list[str]:
+    """
+    the raw markup of every element matching selector ('#id' or '.class'), found without parsing the page.
+    """
+    regions = []
+    pos = 0
+    while True:
+        match = _region_start(html, selector, pos)
+        if match is None:
+            return regions
+        tag = match.group(1).lower()
+        end = html.find('>', match.end() - 1) + 1
+        if tag not in VOID_TAGS:
+            # walk to the matching close tag
+            depth = 0
+            for m in re.compile(r'<(/?)' + tag + r'\b[^>]*>', re.IGNORECASE).finditer(html, match.start()):
+                depth += -1 if m.group(1) else 1
+                if depth == 0:
+                    end = m.end()
+                    break
+            else:
+                end = len(html)
+        regions.append(html[match.start():end])
+        pos = end
+
+class _Target:
+    def __init__(self) -> None:
+        self.etag = None
+        self.last_modified = None
+        self.digest = None
+        self.result = None
+        self.not_modified = 0
+        self.unchanged = 0
+        self.changed = 0
+
+class ChangeDetector:
+    """
+    Skips re-checking pages that haven't changed since the last poll. Probe polls send
+    conditional requests (ETag/Last-Modified), and for both probe and browser polls only the
+    stock region of the page is hashed: parsing and selector evaluation only happen when it changed.
+    Keeps hit/miss counters per target.
+    """
+    def __init__(self) -> None:
+        self._targets = {}
+        self._lock = threading.Lock()
+
+    def _target(self, key) -> _Target:
+        with self._lock:
+            if key not in self._targets:
+                self._targets[key] = _Target()
+            return self._targets[key]
+
+    @staticmethod
+    def _digest(parts: list[str]) -> bytes:
+        return hashlib.blake2b('\n'.join(parts).encode('utf-8', errors='replace'), digest_size=16).digest()
+
+    def _evaluate(self, target: _Target, digest: bytes, evaluate) -> bool:
+        if digest is not None and digest == target.digest and target.result is not None:
+            target.unchanged += 1
+            return target.result
+        # if evaluate raises nothing is remembered, the next poll evaluates again
+        result = evaluate()
+        target.digest, target.result = digest, result
+        target.changed += 1
+        return result
+
+    def check(self, probe: HttpProbe, url: str, regions: list[str], evaluate) -> bool:
+        """
+        polls url over probe.
+        regions: '#id'/'.class' selectors holding everything the stock check looks at. Empty hashes the whole page.
+        evaluate: parsed page (Node) -> availability, only called when the region changed.
+        """
+        target = self._target(url)
+        headers = {}
+        if target.result is not None:
+            if target.etag:
+                headers['If-None-Match'] = target.etag
+            if target.last_modified:
+                headers['If-Modified-Since'] = target.last_modified
+        resp = probe.fetch(url, headers)
+        if resp.status == 304:
+            target.not_modified += 1
+            return target.result
+        target.etag = resp.headers.get('etag')
+        target.last_modified = resp.headers.get('last-modified')
+        html = resp.text
+        parts = [part for selector in regions for part in region_html(html, selector)]
+        # region not found (layout change?) -> hash the lot rather than miss a restock
+        digest = self._digest(parts if parts else [html])
+        return self._evaluate(target, digest, lambda: evaluate(parse_html(html)))
+
+    def check_driver(self, driver, regions: list[str], evaluate) -> bool:
+        """
+        same check against the page loaded in the browser: one script call fetches the stock
+        region, evaluate() (the usual find_elements checks) only runs when it changed.
+        """
+        target = self._target(('driver',) + tuple(regions))
+        markup = driver.execute_script(REGION_SCRIPT, list(regions))
+        # nothing rendered yet, can't vouch for anything
+        digest = self._digest([markup]) if markup and markup.strip() else None
+        return self._evaluate(target, digest, evaluate)
+
+    def stats(self) -> dict:
+        """
+        per target (url, or ('driver', regions...) for browser checks): not_modified (304s),
+        unchanged (region hash hits), changed (pages actually parsed and checked).
+        """
+        with self._lock:
+            targets = dict(self._targets)
+        return {key: {"not_modified": t.not_modified, "unchanged": t.unchanged, "changed": t.changed}
+                for key, t in targets.items()}
+
+    def skipped(self) -> int:
+        """
+        polls that didn't need parsing or selector evaluation.
+        """
+        return sum(s["not_modified"] + s["unchanged"] for s in self.stats().values())
@@ -0,0 +1,170 @@
+from selenium.common import exceptions
+from dataclasses import dataclass
+from typing import Callable
+import time
+
+class StepFailed(Exception):
+    """
+    Raised by a step's action when the page isn't in the state it should be.
+    """
+
+class OrderUncertain(Exception):
+    """
+    Raised when the final step's action (the final click) failed after it started. The order may
+    have gone through, so checkout must not be retried or restarted.
+    """
+
+# failures worth retrying/resuming from, anything else is a bug and propagates
+RETRYABLE = (StepFailed,
+             exceptions.NoSuchElementException,
+             exceptions.TimeoutException,
+             exceptions.ElementClickInterceptedException,
+             exceptions.ElementNotInteractableException,
+             exceptions.StaleElementReferenceException)
+
+@dataclass
+class Step:
+    """
+    One checkout step.
+    name: label used in logs/transitions.
+    action: does the step's work (fill the page, click continue...)
+    detect: entry condition, True when the browser is on this step. None if the step can't be told apart, it's then only reached in order.
+    timeout: seconds to wait for the entry condition before looking for where the browser actually is. None waits forever.
+    retries: how many times the step may fail before checkout gives up.
+    """
+    name: str
+    action: Callable[[], None]
+    detect: Callable[[], bool] = None
+    timeout: float = 15
+    retries: int = 2
+
+@dataclass
+class Transition:
+    step: str
+    seconds: float
+    attempt: int
+    ok: bool
+    error: str = None
+
+class CheckoutRunner:
+    """
+    Runs checkout as a sequence of steps. A failed step doesn't end checkout: the runner
+    works out which step the browser is actually on and carries on from there, until a step
+    uses up its retries. The basket and filled pages are never thrown away.
+    Resuming never moves past the step that failed. The last step's action (the final click)
+    only ever runs once: if it fails part way we can't tell whether the order went through,
+    and a second click could buy twice, so OrderUncertain is raised instead.
+    """
+    def __init__(self, steps: list[Step], waiter, on_transition: Callable[[Transition], None] = None) -> None:
+        """
+        steps: in order, product page first, final confirmation last.
+        waiter: the crawler's Waiter, used to wait for entry conditions.
+        on_transition: called with every Transition (optional, defaults to printing it)
+        """
+        self.steps = steps
+        self.waiter = waiter
+        self.on_transition = on_transition if on_transition else self.print_transition
+        self.transitions = []
+
+    # polls of the current step between checks for later steps
+    LOOKAHEAD_EVERY = 10
+
+    @staticmethod
+    def print_transition(t: Transition) -> None:
+        status = "done" if t.ok else "failed ({})".format(t.error)
+        print("checkout step {} {} in {:.2f}s (attempt {})".format(t.step, status, t.seconds, t.attempt))
+
+    def _detected(self, step: Step) -> bool:
+        try:
+            return bool(step.detect())
+        except RETRYABLE:
+            return False
+
+    def locate(self, start: int = 0, end: int = None) -> int:
+        """
+        index of the furthest step (from start up to end, inclusive) whose entry condition holds,
+        None if no step can be detected.
+        """
+        end = len(self.steps) - 1 if end is None else end
+        for index in range(end, start - 1, -1):
+            step = self.steps[index]
+            if step.detect is not None and self._detected(step):
+                return index
+        return None
+
+    def _enter(self, index: int, lookahead: bool = True) -> int:
+        """
+        waits for step `index`'s entry condition. Every so often also checks whether the site
+        skipped ahead (e.g. no login page because we're already logged in), unless lookahead is False.
+        Returns the index of the step the browser is on, None on timeout.
+        """
+        step = self.steps[index]
+        polls = {"count": 0}
+
+        def entered(driver):
+            # wrapped in a tuple, index 0 would read as "not yet" to the wait
+            if self._detected(step):
+                return (index,)
+            polls["count"] += 1
+            if lookahead and polls["count"] % self.LOOKAHEAD_EVERY == 0:
+                later = self.locate(index + 1)
+                if later is not None:
+                    return (later,)
+            return False
+
+        try:
+            return self.waiter.until("enter {}".format(step.name), entered,
+                                     step.timeout if step.timeout is not None else float('inf'))[0]
+        except exceptions.TimeoutException:
+            return None
+
+    def run(self) -> bool:
+        """
+        True once the last step's action succeeds, False if a step before it ran out of retries.
+        Raises OrderUncertain if the last step's action started and failed.
+        """
+        failures = {step.name: 0 for step in self.steps}
+        located = self.locate()
+        index = located if located is not None else 0
+        while index < len(self.steps):
+            step = self.steps[index]
+            final = index == len(self.steps) - 1
+            self.waiter.begin(step.name)
+            start = time.perf_counter()
+            error = None
+            if step.detect is not None:
+                # a step that already failed is retried where it is, never skipped past
+                entered = self._enter(index, lookahead=not failures[step.name])
+                if entered is None:
+                    error = "entry condition not met within {}s".format(step.timeout)
+                elif entered != index:
+                    index = entered
+                    continue
+            acted = False
+            if error is None:
+                try:
+                    acted = True
+                    step.action()
+                except RETRYABLE as e:
+                    error = "{}: {}".format(type(e).__name__, str(e).strip().splitlines()[0] if str(e).strip() else '')
+                except Exception as e:
+                    if final:
+                        raise OrderUncertain("the {} step failed after it started ({})".format(step.name, type(e).__name__)) from e
+                    raise
+            transition = Transition(step.name, time.perf_counter() - start, failures[step.name] + 1, error is None, error)
+            self.transitions.append(transition)
+            self.on_transition(transition)
+            if error is None:
+                index += 1
+                continue
+            failures[step.name] += 1
+            if acted and final:
+                raise OrderUncertain("the {} step failed after it started ({}), not clicking it again".format(step.name, error))
+            if failures[step.name] > step.retries:
+                print("smth went wrong on the {} step, giving up".format(step.name))
+                return False
+            # resume from wherever the browser really is, back as far as needed but never past the failed step
+            located = self.locate(end=index)
+            if located is not None:
+                index = located
+        return True
@@ -0,0 +1,244 @@
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from .profile import BrowserProfile
+import threading
+import atexit
+import time
+
+try:
+    import psutil
+except ImportError:
+    # rss based recycling is skipped without psutil
+    psutil = None
+
+class PooledDriver:
+    """
+    A leased webdriver. Behaves like the driver itself, but counts navigations
+    so the pool knows when to recycle it. Once quit through it (e.g. by an aborted
+    crawler) it's dead, and the pool discards it instead of resetting it.
+    """
+    def __init__(self, driver, pool: "DriverPool") -> None:
+        self.__dict__['_driver'] = driver
+        self.__dict__['_pool'] = pool
+        self.__dict__['navigations'] = 0
+        self.__dict__['launched_at'] = time.monotonic()
+        self.__dict__['base_rss'] = pool.rss(driver)
+        self.__dict__['dead'] = False
+
+    def get(self, url: str) -> None:
+        self.__dict__['navigations'] += 1
+        self._driver.get(url)
+
+    def refresh(self) -> None:
+        self.__dict__['navigations'] += 1
+        self._driver.refresh()
+
+    def quit(self) -> None:
+        self.__dict__['dead'] = True
+        self._driver.quit()
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._driver, name, value)
+
+class DriverPool:
+    """
+    Hands out chrome drivers on demand. Drivers are only launched when a crawler
+    actually needs a browser, are health checked between leases, recycled once
+    they get old or bloated, and always quit when the process exits.
+    """
+    def __init__(self,
+                 path: str = None,
+                 options = None,
+                 size: int = 4,
+                 max_navigations: int = 500,
+                 max_rss_growth_mb: float = 400,
+                 reset: bool = True,
+                 launch = None,
+                 profile: BrowserProfile = None
+                 ) -> None:
+        """
+        path: absolute path to chromedriver.exe on your system.
+        options: chrome options passed to every driver (optional)
+        size: max number of drivers alive at once. acquire() blocks when they're all leased.
+        max_navigations: recycle a driver after this many get()/refresh() calls.
+        max_rss_growth_mb: recycle a driver once chrome has grown this much since launch (needs psutil)
+        reset: clear cookies and blank the page when a driver is returned.
+        launch: callable returning a new driver, replaces the chrome launch (optional)
+        profile: BrowserProfile the browsers launch with, instead of options. Without either the first
+                 crawler given the pool sets it (see use_profile). (optional)
+        """
+        self.path = path
+        self.profile = profile
+        self.options = options if options is not None or profile is None else profile.options()
+        self.size = size
+        self.max_navigations = max_navigations
+        self.max_rss_growth = max_rss_growth_mb * 1024 * 1024
+        self.reset = reset
+        self.launch = launch if launch else self._launch_chrome
+        self.launched = 0
+        self.recycled = 0
+        self._idle = []
+        self._leased = set()
+        self._cond = threading.Condition()
+        self._closed = False
+        atexit.register(self.close)
+
+    def use_profile(self, profile: BrowserProfile, explicit: bool = True) -> BrowserProfile:
+        """
+        settles the profile of a crawler sharing this pool, which launches its browsers. A pool with
+        neither profile nor options takes the first crawler's. After that a crawler that asks for a
+        different one (explicit) is an error, its browsers would silently launch without it.
+        Returns the profile the crawler should use.
+        """
+        with self._cond:
+            if self.profile is None and self.options is None:
+                self.profile, self.options = profile, profile.options()
+            elif self.profile is None:
+                if explicit:
+                    print("this pool launches browsers with its own options, the crawler's profile only sets what's blocked while polling")
+                return profile
+            elif explicit and profile != self.profile:
+                raise ValueError("the crawler's BrowserProfile differs from the one its pool launches browsers with, "
+                                 "pass the profile to the pool (DriverPool(..., profile=...)) instead")
+            return self.profile
+
+    def _launch_chrome(self):
+        # no implicit wait, crawlers wait explicitly per step (see waits.py)
+        return webdriver.Chrome(options=self.options, service=Service(executable_path=self.path))
+
+    @staticmethod
+    def rss(driver) -> int:
+        """
+        resident memory (bytes) of chromedriver and all of its browser processes. 0 if unknown.
+        """
+        if psutil is None:
+            return 0
+        try:
+            proc = psutil.Process(driver.service.process.pid)
+            return sum(p.memory_info().rss for p in [proc] + proc.children(recursive=True))
+        except (AttributeError, psutil.Error):
+            return 0
+
+    @staticmethod
+    def healthy(driver) -> bool:
+        """
+        one cheap round trip to check the browser session is still alive.
+        """
+        try:
+            driver.window_handles
+            return True
+        except Exception:
+            # a dead chromedriver fails at the connection (MaxRetryError, ConnectionError...), not with a WebDriverException
+            return False
+
+    def _needs_recycle(self, pooled: PooledDriver) -> bool:
+        if pooled.navigations >= self.max_navigations:
+            return True
+        if pooled.base_rss and self.rss(pooled._driver) - pooled.base_rss >= self.max_rss_growth:
+            return True
+        return False
+
+    @staticmethod
+    def _quit(pooled: PooledDriver) -> None:
+        try:
+            pooled._driver.quit()
+        except Exception:
+            pass
+
+    def acquire(self, timeout: float = None) -> PooledDriver:
+        """
+        leases a driver, launching one if none are idle and the pool isn't full.
+        """
+        while True:
+            pooled = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise RuntimeError("driver pool is closed")
+                    if self._idle:
+                        # leased while it's checked, so the slot can't be taken twice
+                        pooled = self._idle.pop()
+                        self._leased.add(pooled)
+                        break
+                    if len(self._leased) < self.size:
+                        # reserve the slot before launching so other threads can't overshoot the cap
+                        placeholder = object()
+                        self._leased.add(placeholder)
+                        break
+                    if not self._cond.wait(timeout):
+                        raise TimeoutError("no driver free within {}s".format(timeout))
+            if pooled is None:
+                break
+            # round trips outside the lock, a hung chromedriver mustn't block every other acquire/release
+            if self.healthy(pooled):
+                return pooled
+            self._quit(pooled)
+            with self._cond:
+                self._leased.discard(pooled)
+                self._cond.notify()
+        try:
+            pooled = PooledDriver(self.launch(), self)
+        except Exception:
+            with self._cond:
+                self._leased.discard(placeholder)
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._leased.discard(placeholder)
+            self._leased.add(pooled)
+            self.launched += 1
+        return pooled
+
+    def due(self, pooled: PooledDriver) -> bool:
+        """
+        whether a leased driver is past its navigation/memory limits. Those are checked on release,
+        so crawlers holding one lease for a whole watch ask between polls (see GlobalScrape.pause).
+        """
+        return isinstance(pooled, PooledDriver) and not pooled.dead and self._needs_recycle(pooled)
+
+    def release(self, pooled: PooledDriver) -> None:
+        """
+        returns a leased driver. Recycled (quit) if it's past its limits or broken.
+        """
+        keep = False
+        try:
+            keep = not self._closed and not pooled.dead and not self._needs_recycle(pooled)
+            if keep and self.reset:
+                pooled._driver.delete_all_cookies()
+                pooled._driver.get('about:blank')
+        except Exception:
+            # broken or dead (chromedriver gone fails with urllib3/connection errors)
+            keep = False
+        finally:
+            # whatever happened the slot goes back, or acquire() would wait on it forever
+            if not keep and not pooled.dead:
+                self._quit(pooled)
+            with self._cond:
+                self._leased.discard(pooled)
+                if keep:
+                    self._idle.append(pooled)
+                else:
+                    self.recycled += 1
+                self._cond.notify()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"size": self.size, "leased": len(self._leased), "idle": len(self._idle),
+                    "launched": self.launched, "recycled": self.recycled}
+
+    def close(self) -> None:
+        """
+        quits every driver (idle and leased). Safe to call more than once.
+        """
+        atexit.unregister(self.close)
+        with self._cond:
+            self._closed = True
+            drivers = self._idle + [d for d in self._leased if isinstance(d, PooledDriver)]
+            self._idle = []
+            self._leased = set()
+            self._cond.notify_all()
+        for pooled in drivers:
+            self._quit(pooled)
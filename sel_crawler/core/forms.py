@@ -0,0 +1,117 @@
+from selenium.webdriver.support.ui import Select
+from selenium.common import exceptions
+from dataclasses import dataclass, field
+
+# Fills every field in one execute_script call. Values go through the native value setter
+# and input/change/blur are dispatched, so angular/react forms register the change.
+# Returns the selectors it couldn't fill (missing element, no matching <option>, or an element
+# with no value to set, e.g. a contenteditable or whatever a wrong selector hit), for typing instead.
+FILL_SCRIPT = """
+const failed = [];
+const setter = (el) => {
+    for (let proto = Object.getPrototypeOf(el); proto; proto = Object.getPrototypeOf(proto)) {
+        const descriptor = Object.getOwnPropertyDescriptor(proto, 'value');
+        if (descriptor) return descriptor.set;
+    }
+};
+const fire = (el, type) => el.dispatchEvent(new Event(type, {bubbles: true}));
+for (const [selector, value, kind] of arguments[0]) {
+    try {
+        const el = document.querySelector(selector);
+        if (!el) { failed.push(selector); continue; }
+        if (kind === 'select') {
+            const option = el.options && Array.from(el.options).find(o => o.value === value || o.text.trim() === value);
+            if (!option) { failed.push(selector); continue; }
+            el.value = option.value;
+        } else {
+            const set = setter(el);
+            if (!set) { failed.push(selector); continue; }
+            el.focus();
+            set.call(el, value);
+            fire(el, 'input');
+        }
+        fire(el, 'change');
+        el.blur && el.blur();
+    } catch (e) {
+        // one odd field doesn't stop the rest of the batch
+        failed.push(selector);
+    }
+}
+return failed;
+"""
+
+# what filling a field the old way costs: find, click, clear, send_keys
+ROUND_TRIPS_PER_FIELD = 4
+
+@dataclass
+class FillReport:
+    """
+    What one batched fill cost compared to filling field by field.
+    """
+    page: str
+    scripted: int = 0
+    typed: list[str] = field(default_factory=list)
+    round_trips: int = 0
+
+    @property
+    def fields(self) -> int:
+        return self.scripted + len(self.typed)
+
+    @property
+    def saved(self) -> int:
+        return self.fields * ROUND_TRIPS_PER_FIELD - self.round_trips
+
+class FormFiller:
+    """
+    Batched form filling: resolve and populate a whole page of fields in one round trip,
+    typing only the fields a site insists on real keystrokes for (or that the script couldn't fill).
+    """
+    def __init__(self, crawler, keystrokes: set[str] = None) -> None:
+        """
+        crawler: the GlobalScrape using this (for its driver and find_by_CSS)
+        keystrokes: selectors that always get typed rather than scripted (optional)
+        """
+        self.crawler = crawler
+        self.keystrokes = set(keystrokes or ())
+        self.reports = []
+
+    def _type(self, selector: str, value: str) -> int:
+        search = self.crawler.find_by_CSS(selector)
+        if search.tag_name == 'select':
+            select = Select(search)
+            try:
+                select.select_by_value(value)
+            except exceptions.NoSuchElementException:
+                select.select_by_visible_text(value)
+            return 2
+        search.click()
+        search.clear()
+        search.send_keys(value)
+        return ROUND_TRIPS_PER_FIELD
+
+    def fill(self, page: str, fields: dict[str, str], selects: dict[str, str] = None) -> FillReport:
+        """
+        page: label for the report.
+        fields: css selector -> value for text inputs.
+        selects: css selector -> option value (or visible text) for <select> dropdowns.
+        Raises NoSuchElementException if a field can't be filled either way.
+        """
+        report = FillReport(page)
+        values = {**fields, **(selects or {})}
+        batch = [[sel, value, 'input'] for sel, value in fields.items() if sel not in self.keystrokes]
+        batch += [[sel, value, 'select'] for sel, value in (selects or {}).items() if sel not in self.keystrokes]
+        typed = {sel: value for sel, value in values.items() if sel in self.keystrokes}
+        if batch:
+            # make sure the page has rendered its form before the one-shot script runs
+            self.crawler.find_by_CSS(batch[0][0])
+            failed = self.crawler.driver.execute_script(FILL_SCRIPT, batch)
+            report.round_trips += 2
+            report.scripted = len(batch) - len(failed)
+            for sel in failed:
+                typed[sel] = values[sel]
+        for sel, value in typed.items():
+            report.round_trips += self._type(sel, value)
+            report.typed.append(sel)
+        self.reports.append(report)
+        print("filled {}: {} fields in {} round trips ({} saved)".format(page, report.fields, report.round_trips, report.saved))
+        return report
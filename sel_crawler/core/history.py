@@ -0,0 +1,247 @@
+from contextlib import closing
+import threading
+import sqlite3
+import atexit
+import queue
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, site TEXT);
+CREATE TABLE IF NOT EXISTS probes (product INTEGER NOT NULL, t INTEGER NOT NULL, result INTEGER NOT NULL, ms INTEGER, listing INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS probes_t ON probes (t);
+CREATE INDEX IF NOT EXISTS probes_product ON probes (product, t);
+CREATE TABLE IF NOT EXISTS transitions (product INTEGER NOT NULL, t INTEGER NOT NULL, available INTEGER NOT NULL, gap INTEGER);
+CREATE INDEX IF NOT EXISTS transitions_product ON transitions (product, t);
+CREATE TABLE IF NOT EXISTS checkouts (product INTEGER NOT NULL, t INTEGER NOT NULL, crawler TEXT, ok INTEGER NOT NULL,
+                                      detected INTEGER, ms INTEGER, error TEXT);
+"""
+
+# probes.result
+OUT_OF_STOCK, IN_STOCK, ERROR = 0, 1, 2
+
+def _ms(seconds: float) -> int:
+    return int(round(seconds * 1000)) if seconds is not None else None
+
+def _summary(values: list[float]) -> dict:
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+    return {"count": len(values), "median": values[len(values) // 2],
+            "p95": values[min(len(values) - 1, int(len(values) * 0.95))], "max": values[-1]}
+
+class HistoryStore:
+    """
+    Append-only sqlite record of what the crawlers saw: every probe result, every in/out of
+    stock flip, every checkout and how long it took. Writes are queued and committed in
+    batches from a background thread, so the poll loop only pays for a queue put.
+    Rows are small (products are stored once and referred to by id, times are integer ms)
+    and old probe rows are pruned, flips and checkouts are kept.
+    """
+    def __init__(self,
+                 path: str = 'history.sqlite',
+                 flush_every: float = 1.0,
+                 batch: int = 1000,
+                 keep_probes_days: float = 30,
+                 max_queue: int = 100000
+                 ) -> None:
+        """
+        path: sqlite file, created if missing.
+        flush_every: seconds queued events wait at most before being written.
+        batch: most events written per transaction.
+        keep_probes_days: probe rows older than this are deleted (None keeps them all)
+        max_queue: events waiting to be written before new ones are dropped.
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.batch = batch
+        self.keep_probes_days = keep_probes_days
+        self.written = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        # sqlite3's own context manager only commits, closing() is what closes the connection
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _put(self, event: tuple) -> None:
+        if self._closed:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="history", daemon=True)
+                self._thread.start()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def probe(self, key: str, site: str, available: bool, seconds: float = None, listing: bool = False, when: float = None) -> None:
+        """
+        one stock check of key. available: True/False, or None if the check failed.
+        seconds: how long the check took. listing: read off a listing page rather than the product's own.
+        """
+        result = ERROR if available is None else (IN_STOCK if available else OUT_OF_STOCK)
+        self._put(('probe', key, site, _ms(when if when is not None else time.time()), result, _ms(seconds), int(listing)))
+
+    def checkout(self, key: str, site: str, crawler: str, ok: bool, detected: float = None,
+                 seconds: float = None, error: str = None, when: float = None) -> None:
+        """
+        one finished checkout of key. detected: when stock was seen (time.time()), seconds: how long it ran.
+        """
+        self._put(('checkout', key, site, _ms(when if when is not None else time.time()), crawler, int(bool(ok)),
+                   _ms(detected), _ms(seconds), error))
+
+    def _run(self) -> None:
+        conn = self._connect()
+        products = dict(conn.execute('SELECT key, id FROM products'))
+        # product id -> (available, last probe time) as of the last probe written
+        seen = dict(conn.execute('SELECT product, MAX(t) FROM probes WHERE result != ? GROUP BY product', (ERROR,)))
+        last = {product: (available, seen.get(product, t)) for product, available, t in
+                conn.execute('SELECT product, available, MAX(t) FROM transitions GROUP BY product')}
+        pruned = 0.0
+        done = False
+        while not done:
+            events = []
+            try:
+                events.append(self._queue.get(timeout=self.flush_every))
+                while len(events) < self.batch:
+                    events.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if events and events[-1] is None:
+                events.pop()
+                done = True
+            try:
+                with conn:
+                    self._write(conn, events, products, last)
+                    if self.keep_probes_days is not None and time.monotonic() - pruned > 3600:
+                        pruned = time.monotonic()
+                        conn.execute('DELETE FROM probes WHERE t < ?', (_ms(time.time() - self.keep_probes_days * 86400),))
+                self.written += len(events)
+            except sqlite3.Error as e:
+                print("couldnt write {} history events ({})".format(len(events), e))
+                # ids handed out in the rolled back transaction are gone
+                products.clear()
+                products.update(conn.execute('SELECT key, id FROM products'))
+            finally:
+                for _ in range(len(events) + done):
+                    self._queue.task_done()
+        conn.close()
+
+    def _write(self, conn: sqlite3.Connection, events: list, products: dict, last: dict) -> None:
+        probes, transitions, checkouts = [], [], []
+        for event in events:
+            kind, key, site, t = event[:4]
+            if key not in products:
+                conn.execute('INSERT OR IGNORE INTO products (key, site) VALUES (?, ?)', (key, site))
+                products[key] = conn.execute('SELECT id FROM products WHERE key = ?', (key,)).fetchone()[0]
+            product = products[key]
+            if kind == 'probe':
+                result, ms, listing = event[4:]
+                probes.append((product, t, result, ms, listing))
+                if result == ERROR:
+                    continue
+                available, seen = last.get(product, (None, None))
+                if available != result:
+                    # the flip happened somewhere since the last probe, gap is the most we could have been late by
+                    transitions.append((product, t, result, t - seen if seen is not None else None))
+                last[product] = (result, t)
+            else:
+                checkouts.append((product, t) + tuple(event[4:]))
+        conn.executemany('INSERT INTO probes VALUES (?, ?, ?, ?, ?)', probes)
+        conn.executemany('INSERT INTO transitions VALUES (?, ?, ?, ?)', transitions)
+        conn.executemany('INSERT INTO checkouts VALUES (?, ?, ?, ?, ?, ?, ?)', checkouts)
+
+    def flush(self) -> None:
+        """
+        waits for every queued event to be written.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """
+        writes out what's queued and stops the writer. Safe to call more than once.
+        """
+        atexit.unregister(self.close)
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+
+    # ----- queries -----
+
+    def _query(self, sql: str, params: tuple = ()) -> list:
+        with closing(self._connect()) as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def windows(self, key: str, since: float = None) -> list[dict]:
+        """
+        restock windows of key, oldest first: {"start", "end", "seconds"} (time.time() values).
+        The last one has end None if it's still in stock.
+        """
+        rows = self._query('SELECT t.t, t.available FROM transitions t JOIN products p ON p.id = t.product '
+                           'WHERE p.key = ? AND t.t >= ? ORDER BY t.t', (key, _ms(since) if since else 0))
+        windows = []
+        for t, available in rows:
+            if available == IN_STOCK:
+                windows.append({"start": t / 1000, "end": None, "seconds": None})
+            elif windows and windows[-1]["end"] is None:
+                windows[-1]["end"] = t / 1000
+                windows[-1]["seconds"] = (t - windows[-1]["start"] * 1000) / 1000
+        return windows
+
+    def restocks(self, since: float = None) -> list[tuple[str, str, float]]:
+        """
+        (key, site, time) of every flip into stock since since.
+        """
+        rows = self._query('SELECT p.key, p.site, t.t FROM transitions t JOIN products p ON p.id = t.product '
+                           'WHERE t.available = ? AND t.t >= ? ORDER BY t.t', (IN_STOCK, _ms(since) if since else 0))
+        return [(key, site, t / 1000) for key, site, t in rows]
+
+    def detection_lag(self, site: str = None) -> dict:
+        """
+        seconds between the last out of stock probe and the in stock one that caught the restock
+        (the most detection could have lagged by), summarised per site: {site: {count, median, p95, max}}
+        """
+        rows = self._query('SELECT p.site, t.gap FROM transitions t JOIN products p ON p.id = t.product '
+                           'WHERE t.available = ? AND t.gap IS NOT NULL AND (? IS NULL OR p.site = ?)', (IN_STOCK, site, site))
+        lags = {}
+        for row_site, gap in rows:
+            lags.setdefault(row_site, []).append(gap / 1000)
+        return {s: _summary(values) for s, values in lags.items()}
+
+    def success_rate(self, site: str = None) -> dict:
+        """
+        checkouts per site: {site: {attempts, ok, rate, reaction}}; reaction summarises seconds
+        from detection to the end of successful checkouts.
+        """
+        rows = self._query('SELECT p.site, c.ok, c.t - c.detected FROM checkouts c JOIN products p ON p.id = c.product '
+                           'WHERE (? IS NULL OR p.site = ?)', (site, site))
+        sites = {}
+        for row_site, ok, reaction in rows:
+            stats = sites.setdefault(row_site, {"attempts": 0, "ok": 0, "reaction": []})
+            stats["attempts"] += 1
+            stats["ok"] += ok
+            if ok and reaction is not None:
+                stats["reaction"].append(reaction / 1000)
+        for stats in sites.values():
+            stats["rate"] = stats["ok"] / stats["attempts"]
+            stats["reaction"] = _summary(stats["reaction"])
+        return sites
+
+    def stats(self) -> dict:
+        counts = {table: self._query('SELECT COUNT(*) FROM {}'.format(table))[0][0]
+                  for table in ('products', 'probes', 'transitions', 'checkouts')}
+        return dict(counts, written=self.written, queued=self._queue.qsize(), dropped=self.dropped)
@@ -0,0 +1,211 @@
+from .driver_pool import PooledDriver
+from .tabs import TabDriver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import atexit
+import bisect
+import json
+import time
+
+COMMAND_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+DETECT_BUCKETS = (1, 5, 15, 60, 300, 900, 3600, 4 * 3600, 12 * 3600, 24 * 3600)
+CHECKOUT_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+# whichever crawler last touched its driver on this thread; webdriver commands get labelled with it
+_local = threading.local()
+
+def bind(crawler) -> None:
+    """
+    attributes webdriver commands made on this thread to crawler.
+    """
+    _local.crawler = crawler
+
+class Histogram:
+    def __init__(self, buckets: tuple) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _escape(value) -> str:
+    # prometheus label values: backslash, double quote and newline are escaped
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(labels: tuple) -> str:
+    return ','.join('{}="{}"'.format(k, _escape(v)) for k, v in labels)
+
+class Metrics:
+    """
+    Counts and times every webdriver command per crawler, site and checkout step, plus spans for
+    detect -> checkout steps -> final click. Exported as a jsonl trace file and prometheus text.
+    Cheap enough to leave on: a dict update per command, and trace lines are buffered.
+    """
+    def __init__(self, trace_path: str = None) -> None:
+        """
+        trace_path: jsonl file spans/events get appended to (optional)
+        """
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._trace = open(trace_path, 'a', buffering=64 * 1024) if trace_path else None
+        self._server = None
+        if self._trace is not None:
+            atexit.register(self.close)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: tuple = COMMAND_BUCKETS, **labels) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            self.histograms[key].observe(value)
+
+    def event(self, kind: str, **fields) -> None:
+        """
+        appends one line to the trace file.
+        """
+        if self._trace is None:
+            return
+        line = json.dumps(dict(fields, type=kind, ts=time.time()), default=str)
+        with self._lock:
+            self._trace.write(line + '\n')
+
+    def span(self, name: str, start: float, end: float, **labels) -> None:
+        """
+        start/end are time.time() timestamps.
+        """
+        # the histogram only gets low cardinality labels, the trace line gets the lot
+        self.observe('span_seconds', end - start, CHECKOUT_BUCKETS, span=name, site=labels.get('site'))
+        self.event('span', name=name, start=start, duration=end - start, **labels)
+
+    def instrument(self, driver) -> None:
+        """
+        Hooks driver.execute, which every webdriver command (driver and element) goes through.
+        Accepts a raw driver or any of the pool/tab wrappers around one. Safe to call repeatedly.
+        """
+        raw = driver
+        while isinstance(raw, (PooledDriver, TabDriver)):
+            if isinstance(raw, TabDriver):
+                # the tab's browser can be replaced (SharedBrowser.abort), hook the next one as it's leased
+                if self.instrument not in raw._browser.on_lease:
+                    raw._browser.on_lease.append(self.instrument)
+                raw = raw._browser.driver
+            else:
+                raw = raw._driver
+        if raw is None or getattr(raw, '_sel_metrics', None) is self:
+            return
+        execute = raw.execute
+        metrics = self
+
+        def timed_execute(command, params=None):
+            start = time.perf_counter()
+            try:
+                return execute(command, params)
+            finally:
+                crawler = getattr(_local, 'crawler', None)
+                labels = {"command": command}
+                if crawler is not None:
+                    labels.update(crawler=crawler.name, site=crawler.SITE, step=crawler.wait.current_step)
+                metrics.inc('webdriver_commands_total', **labels)
+                metrics.observe('webdriver_command_seconds', time.perf_counter() - start,
+                                site=labels.get('site'), command=command)
+
+        raw.execute = timed_execute
+        raw._sel_metrics = self
+
+    def snapshot(self) -> dict:
+        """
+        every counter and histogram as plain json-able data (see merged())
+        """
+        with self._lock:
+            return {"counters": [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                    "histograms": [[name, list(labels), {"buckets": list(h.buckets), "counts": list(h.counts),
+                                                          "sum": h.sum, "count": h.count}]
+                                   for (name, labels), h in self.histograms.items()]}
+
+    @classmethod
+    def merged(cls, snapshots: list[dict]) -> "Metrics":
+        """
+        one Metrics adding up snapshots from several processes (counters and histogram buckets summed)
+        """
+        merged = cls()
+        for snap in snapshots:
+            for name, labels, value in snap["counters"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged.counters[key] = merged.counters.get(key, 0) + value
+            for name, labels, h in snap["histograms"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                if key not in merged.histograms:
+                    merged.histograms[key] = Histogram(tuple(h["buckets"]))
+                hist = merged.histograms[key]
+                hist.counts = [a + b for a, b in zip(hist.counts, h["counts"])]
+                hist.sum += h["sum"]
+                hist.count += h["count"]
+        return merged
+
+    def render(self) -> str:
+        """
+        prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items(), key=str):
+                lines.append('sel_{}{{{}}} {}'.format(name, _labels(labels), value))
+            for (name, labels), hist in sorted(self.histograms.items(), key=str):
+                cumulative = 0
+                for bound, count in zip(hist.buckets + ('+Inf',), hist.counts):
+                    cumulative += count
+                    lines.append('sel_{}_bucket{{{}}} {}'.format(name, _labels(labels + (('le', bound),)), cumulative))
+                lines.append('sel_{}_sum{{{}}} {}'.format(name, _labels(labels), hist.sum))
+                lines.append('sel_{}_count{{{}}} {}'.format(name, _labels(labels), hist.count))
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, port: int = 9108, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """
+        serves render() at http://host:port/metrics from a background thread.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        atexit.register(self.close)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self._server
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._trace is not None:
+                self._trace.flush()
+
+    def close(self) -> None:
+        atexit.unregister(self.close)
+        if self._server is not None:
+            self._server.shutdown()
+            self._server = None
+        with self._lock:
+            if self._trace is not None:
+                self._trace.close()
+                self._trace = None
@@ -0,0 +1,30 @@
+class NotificationError(Exception):
+    """
+    Raised by a backend when a message couldn't be delivered.
+    retry: False if sending it again can't help (bad token, malformed request...)
+    """
+    def __init__(self, message: str, retry: bool = True) -> None:
+        super().__init__(message)
+        self.retry = retry
+
+class Backend:
+    """
+    Somewhere notifications can be delivered. Subclasses implement send().
+    send() may block and may raise; the Dispatcher calls it from its own thread and retries.
+    """
+    name = 'backend'
+
+    def send(self, text: str) -> None:
+        raise NotImplementedError
+
+    def send_notif(self, product, url):
+        """
+        As soon as stock becomes available, sends message.
+        """
+        self.send('{} available at {}'.format(product, url))
+
+    def send_final_notif(self):
+        """
+        Right before the final payment button, another notification is sent.
+        """
+        self.send('Filling out Final Details Page')
@@ -0,0 +1,189 @@
+from .backend import Backend, NotificationError
+from collections import deque
+import threading
+import atexit
+import random
+import time
+
+class Dispatcher:
+    """
+    Sends notifications from a background thread so crawlers never wait on them.
+    Messages go on an in-memory queue. Bursts arriving within `coalesce` seconds go out as one
+    message, with repeats collapsed. Every backend gets each message, retried with exponential
+    backoff. Whatever is still queued is flushed on close() (and at exit).
+    Has the same send_notif/send_final_notif as a backend, so it can be passed as a crawler's bot.
+    """
+    def __init__(self,
+                 backends: list[Backend],
+                 max_queue: int = 1000,
+                 retries: int = 3,
+                 backoff: float = 1.0,
+                 max_backoff: float = 30.0,
+                 coalesce: float = 1.0
+                 ) -> None:
+        """
+        backends: where messages are delivered (TelegramBot, WebhookBackend...)
+        max_queue: queued messages kept before the oldest are dropped.
+        retries: extra attempts per backend after a failed send.
+        backoff: seconds before the first retry, doubling each time up to max_backoff.
+        coalesce: seconds to wait for a burst to build up before sending. 0 sends straight away.
+        """
+        self.backends = list(backends)
+        self.max_queue = max_queue
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.coalesce = coalesce
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self._queue = deque()
+        # queued + being sent, flush() waits for this to hit 0
+        self._pending = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        self._hurry = False
+        self._closed = False
+        atexit.register(self.close)
+
+    def notify(self, text: str, key=None) -> bool:
+        """
+        queues text for every backend and returns straight away.
+        key: messages with the same key in one burst are sent once (defaults to the text itself)
+        Returns False if the dispatcher is closed.
+        """
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._queue) >= self.max_queue:
+                self._queue.popleft()
+                self._pending -= 1
+                self.dropped += 1
+            self._queue.append((key if key is not None else text, text))
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return True
+
+    def send_notif(self, product, url):
+        """
+        As soon as stock becomes available, sends message.
+        """
+        self.notify('{} available at {}'.format(product, url), key=('stock', url))
+
+    def send_final_notif(self):
+        """
+        Right before the final payment button, another notification is sent.
+        """
+        self.notify('Filling out Final Details Page', key='final')
+
+    def _next_batch(self) -> list:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return []
+            # give the rest of the burst a chance to arrive, unless we're shutting down
+            deadline = time.monotonic() + self.coalesce
+            while not (self._hurry or self._closed) and time.monotonic() < deadline:
+                self._cond.wait(deadline - time.monotonic())
+            batch = list(self._queue)
+            self._queue.clear()
+            return batch
+
+    def _merge(self, batch: list) -> str:
+        """
+        one message for the burst; repeated keys are sent once with a count.
+        """
+        counts, texts = {}, {}
+        for key, text in batch:
+            counts[key] = counts.get(key, 0) + 1
+            texts[key] = text
+        self.coalesced += len(batch) - len(counts)
+        return '\n'.join(text if counts[key] == 1 else '{} (x{})'.format(text, counts[key]) for key, text in texts.items())
+
+    def _deliver(self, backend, text: str) -> None:
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retried += 1
+                delay = min(self.backoff * 2 ** (attempt - 1), self.max_backoff)
+                time.sleep(delay * random.uniform(0.5, 1))
+            try:
+                backend.send(text)
+                self.sent += 1
+                return
+            except NotificationError as e:
+                error = e
+                if not e.retry:
+                    break
+            except Exception as e:
+                error = e
+        self.failed += 1
+        print("couldnt send notification via {} ({})".format(getattr(backend, 'name', type(backend).__name__), error))
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            text = self._merge(batch)
+            for backend in self.backends:
+                self._deliver(backend, text)
+            with self._cond:
+                self._pending -= len(batch)
+                self._cond.notify_all()
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        sends everything queued now (skipping the coalesce wait) and waits for it.
+        Returns False if it didn't finish within timeout.
+        """
+        with self._cond:
+            self._hurry = True
+            self._cond.notify_all()
+            try:
+                return self._cond.wait_for(lambda: self._pending == 0, timeout)
+            finally:
+                self._hurry = False
+
+    def close(self, timeout: float = 10) -> None:
+        """
+        stops taking messages and flushes the queue (for up to timeout seconds). Safe to call more than once.
+        """
+        atexit.unregister(self.close)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if not self.flush(timeout):
+            print("gave up on {} unsent notifications".format(self._pending))
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._cond:
+            queued = len(self._queue)
+        return {"queued": queued, "sent": self.sent, "failed": self.failed, "retried": self.retried,
+                "coalesced": self.coalesced, "dropped": self.dropped}
+
+def share_dispatchers(crawlers: list) -> None:
+    """
+    Each crawler wraps its bot in a Dispatcher of its own, so alerts are only coalesced per crawler.
+    This gives crawlers notifying the same backend objects one Dispatcher between them (the first
+    one's), so a restock seen by many crawlers goes out as one message.
+    """
+    shared = {}
+    for crawler in crawlers:
+        bot = crawler.bot
+        if not isinstance(bot, Dispatcher):
+            continue
+        key = frozenset(id(backend) for backend in bot.backends)
+        if key not in shared:
+            shared[key] = bot
+        elif shared[key] is not bot:
+            bot.close()
+            crawler.bot = shared[key]
@@ -1,10 +1,13 @@
+from .backend import Backend
 import telegram
 
-class TelegramBot:
+class TelegramBot(Backend):
     """
     Uses the python-telegram-bot API
     https://github.com/python-telegram-bot/python-telegram-bot
     """
+    name = 'telegram'
+
     def __init__(self, bot_token: str, chat_id: int):
         """
         bot_token : the token bound to your telegram bot
@@ -13,15 +16,6 @@ class TelegramBot:
         self.bot_token = bot_token
         self.chat_id = chat_id
         self.bot = telegram.Bot(token=self.bot_token)
-    
-    def send_notif(self, product, url):
-        """
-        As soon as stock becomes available, sends message.
-        """
-        self.bot.sendMessage(chat_id=self.chat_id,text='{} available at {}'.format(product,url))
 
-    def send_final_notif(self):
-        """
-        Right before the final payment button, another notification is sent.
-        """
-        self.bot.sendMessage(chat_id=self.chat_id,text='Filling out Final Details Page')
+    def send(self, text: str) -> None:
+        self.bot.sendMessage(chat_id=self.chat_id,text=text)
@@ -0,0 +1,34 @@
+from .backend import Backend, NotificationError
+import urllib.request
+import urllib.error
+import json
+
+class WebhookBackend(Backend):
+    """
+    POSTs every message as json ({"text": ...}) to a url: slack/discord style incoming
+    webhooks, or your own endpoint.
+    """
+    name = 'webhook'
+
+    def __init__(self, url: str, field: str = 'text', headers: dict[str, str] = None, timeout: float = 10) -> None:
+        """
+        url: where to POST.
+        field: json key the message goes under ('content' for discord)
+        headers: extra request headers, e.g. auth (optional)
+        timeout: seconds per request.
+        """
+        self.url = url
+        self.field = field
+        self.headers = dict({'Content-Type': 'application/json'}, **(headers or {}))
+        self.timeout = timeout
+
+    def send(self, text: str) -> None:
+        request = urllib.request.Request(self.url, json.dumps({self.field: text}).encode(), self.headers, method='POST')
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as resp:
+                resp.read()
+        except urllib.error.HTTPError as e:
+            # client errors won't fix themselves, except being rate limited
+            raise NotificationError('{} returned HTTP {}'.format(self.url, e.code), retry=e.code >= 500 or e.code == 429)
+        except (urllib.error.URLError, OSError) as e:
+            raise NotificationError('{} unreachable ({})'.format(self.url, e))
@@ -0,0 +1,293 @@
+from html.parser import HTMLParser
+from urllib.parse import urlsplit, urljoin
+import http.client
+import threading
+import gzip
+import zlib
+
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input",
+             "link", "meta", "param", "source", "track", "wbr"}
+
+class ProbeError(Exception):
+    """
+    Raised when a probe request comes back with an error status.
+    retry_after: seconds the site asked us to wait (Retry-After on a 429/503), if it said.
+    """
+    def __init__(self, url: str, status: int, retry_after: float = None) -> None:
+        super().__init__('{} returned HTTP {}'.format(url, status))
+        self.url = url
+        self.status = status
+        self.retry_after = retry_after
+
+class Node:
+    """
+    Bare bones html element. Just enough of the selenium WebElement interface
+    (text, get_attribute) for the availability helpers to run against it.
+    """
+    def __init__(self, tag: str, attrs: dict[str, str] = None, parent: "Node" = None) -> None:
+        self.tag = tag
+        self.attrs = attrs if attrs else {}
+        self.parent = parent
+        self.children = []
+        self.classes = set(self.attrs.get('class', '').split())
+
+    @property
+    def text(self) -> str:
+        """
+        whitespace normalised text of the element and its descendants.
+        """
+        parts = []
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                parts.append(node)
+            else:
+                stack.extend(reversed(node.children))
+        return ' '.join(''.join(parts).split())
+
+    def get_attribute(self, name: str) -> str:
+        return self.attrs.get(name)
+
+    def iter(self):
+        """
+        yields every element below this one in document order.
+        """
+        stack = list(reversed([c for c in self.children if isinstance(c, Node)]))
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed([c for c in node.children if isinstance(c, Node)]))
+
+    def select(self, css: str) -> list["Node"]:
+        """
+        returns every element matching the css selector (see parse_selector for what's supported).
+        """
+        chain = parse_selector(css)
+        return [node for node in self.iter() if _matches_chain(node, chain)]
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.root = Node('#document')
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, {k: (v if v is not None else '') for k, v in attrs}, self.current)
+        self.current.children.append(node)
+        if tag not in VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        node = Node(tag, {k: (v if v is not None else '') for k, v in attrs}, self.current)
+        self.current.children.append(node)
+
+    def handle_endtag(self, tag):
+        # browsers forgive unclosed tags, so pop up to the nearest matching open tag (if any)
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+def parse_html(html: str) -> Node:
+    """
+    Parses html into a Node tree, returning the document root.
+    """
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+def _parse_compound(token: str) -> dict:
+    """
+    tag#id.class:not(.other) -> {'tag':..., 'id':..., 'classes':[...], 'not':[...]}
+    """
+    compound = {'tag': None, 'id': None, 'classes': [], 'not': []}
+    i = 0
+    while i < len(token):
+        if token.startswith(':not(', i):
+            end = token.index(')', i)
+            compound['not'].append(_parse_compound(token[i + 5:end]))
+            i = end + 1
+            continue
+        kind = token[i] if token[i] in '#.' else ''
+        start = i + 1 if kind else i
+        end = start
+        while end < len(token) and token[end] not in '#.:':
+            end += 1
+        name = token[start:end]
+        if kind == '#':
+            compound['id'] = name
+        elif kind == '.':
+            compound['classes'].append(name)
+        elif name and name != '*':
+            compound['tag'] = name.lower()
+        i = end
+    return compound
+
+def parse_selector(css: str) -> list[tuple[str, dict]]:
+    """
+    Supports the subset of css the crawlers use: tag, #id, .class, :not(...)
+    compounds joined by descendant (space) or child (>) combinators.
+    Returns a list of (combinator, compound) pairs, left to right.
+    """
+    chain = []
+    combinator = ' '
+    for token in css.replace('>', ' > ').split():
+        if token == '>':
+            combinator = '>'
+            continue
+        chain.append((combinator, _parse_compound(token)))
+        combinator = ' '
+    return chain
+
+def _matches_compound(node: Node, compound: dict) -> bool:
+    if compound['tag'] and node.tag != compound['tag']:
+        return False
+    if compound['id'] and node.attrs.get('id') != compound['id']:
+        return False
+    if any(c not in node.classes for c in compound['classes']):
+        return False
+    return not any(_matches_compound(node, n) for n in compound['not'])
+
+def _matches_chain(node: Node, chain: list) -> bool:
+    combinator, compound = chain[-1]
+    if not _matches_compound(node, compound):
+        return False
+    if len(chain) == 1:
+        return True
+    parent = node.parent
+    if combinator == '>':
+        return parent is not None and parent.tag != '#document' and _matches_chain(parent, chain[:-1])
+    while parent is not None and parent.tag != '#document':
+        if _matches_chain(parent, chain[:-1]):
+            return True
+        parent = parent.parent
+    return False
+
+class ProbeResponse:
+    """
+    Result of a probe fetch.
+    """
+    def __init__(self, url: str, status: int, headers: dict[str, str], body: bytes) -> None:
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    @property
+    def text(self) -> str:
+        return self.body.decode('utf-8', errors='replace')
+
+    def page(self) -> Node:
+        return parse_html(self.text)
+
+class HttpProbe:
+    """
+    Fetches pages over pooled keep-alive connections instead of a browser.
+    Used to poll for stock cheaply; chrome only gets driven once stock shows up.
+    """
+    DEFAULT_HEADERS = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                      "(KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36",
+        "Accept": "text/html,application/xhtml+xml",
+        "Accept-Encoding": "gzip, deflate",
+        "Accept-Language": "en-GB,en;q=0.9",
+        "Connection": "keep-alive",
+    }
+
+    def __init__(self, timeout: float = 10, max_per_host: int = 4, headers: dict[str, str] = None) -> None:
+        """
+        timeout: socket timeout in seconds.
+        max_per_host: idle connections kept open per host.
+        headers: extra/overriding request headers (optional)
+        """
+        self.timeout = timeout
+        self.max_per_host = max_per_host
+        self.headers = dict(self.DEFAULT_HEADERS, **(headers or {}))
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _checkout_conn(self, scheme: str, netloc: str) -> http.client.HTTPConnection:
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+        if scheme == 'https':
+            return http.client.HTTPSConnection(netloc, timeout=self.timeout)
+        return http.client.HTTPConnection(netloc, timeout=self.timeout)
+
+    def _return_conn(self, scheme: str, netloc: str, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault((scheme, netloc), [])
+            if len(idle) < self.max_per_host:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _request(self, url: str, headers: dict[str, str]) -> ProbeResponse:
+        parts = urlsplit(url)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        # a pooled connection may have been closed by the server since its last use, so retry once on a fresh one
+        for attempt in range(2):
+            conn = self._checkout_conn(parts.scheme, parts.netloc)
+            try:
+                conn.request('GET', path, headers=headers)
+                resp = conn.getresponse()
+                body = resp.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if attempt:
+                    raise
+                continue
+            except Exception:
+                conn.close()
+                raise
+            if resp.will_close:
+                conn.close()
+            else:
+                self._return_conn(parts.scheme, parts.netloc, conn)
+            encoding = resp.getheader('Content-Encoding', '')
+            if encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif encoding == 'deflate':
+                body = zlib.decompress(body)
+            return ProbeResponse(url, resp.status, {k.lower(): v for k, v in resp.getheaders()}, body)
+
+    def fetch(self, url: str, headers: dict[str, str] = None) -> ProbeResponse:
+        """
+        GETs url (following redirects). Raises ProbeError on 4xx/5xx.
+        """
+        merged = dict(self.headers, **(headers or {}))
+        for _ in range(5):
+            resp = self._request(url, merged)
+            if resp.status in (301, 302, 303, 307, 308) and 'location' in resp.headers:
+                url = urljoin(url, resp.headers['location'])
+                continue
+            break
+        if resp.status >= 400:
+            retry_after = resp.headers.get('retry-after', '')
+            raise ProbeError(url, resp.status, float(retry_after) if retry_after.isdigit() else None)
+        return resp
+
+    def fetch_page(self, url: str) -> Node:
+        """
+        fetches url and returns the parsed document.
+        """
+        return self.fetch(url).page()
+
+    def close(self) -> None:
+        """
+        closes every pooled connection.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
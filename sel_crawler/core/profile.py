@@ -0,0 +1,99 @@
+from selenium import webdriver
+from selenium.common import exceptions
+
+# url patterns (chrome's Network.setBlockedURLs wildcard syntax) per kind of resource
+RESOURCE_PATTERNS = {
+    "image": ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.avif*", "*.svg*", "*.ico*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"],
+    "tracking": ["*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*",
+                 "*googlesyndication.com*", "*facebook.net*", "*hotjar.com*", "*criteo.*",
+                 "*scorecardresearch.com*", "*quantserve.com*", "*tiqcdn.com*"],
+}
+
+# blocked while polling unless told otherwise, none of it changes what the stock check sees
+DEFAULT_BLOCKED = ("image", "font", "media", "tracking")
+
+class BrowserProfile:
+    """
+    How chrome is launched and what it loads. Builds the real ChromeOptions (headless,
+    page load strategy, image prefs), and switches a running browser between lean loading
+    while polling (images, fonts, media, trackers and per site patterns blocked) and
+    full loading for checkout.
+    """
+    def __init__(self,
+                 headless: bool = False,
+                 page_load_strategy: str = 'eager',
+                 block_types: tuple = DEFAULT_BLOCKED,
+                 block_patterns: tuple = (),
+                 disable_images: bool = False,
+                 arguments: tuple = ()
+                 ) -> None:
+        """
+        headless: run without head if True.
+        page_load_strategy: 'normal' waits for every subresource, 'eager' returns once the DOM is parsed,
+                            'none' returns straight away (the explicit waits do the rest)
+        block_types: keys of RESOURCE_PATTERNS blocked while polling.
+        block_patterns: extra url patterns blocked while polling, e.g. '*reviews*' (optional)
+        disable_images: never load images at all, checkout included (a chrome pref, fixed at launch)
+        arguments: extra chrome command line switches (optional)
+        """
+        if page_load_strategy not in ('normal', 'eager', 'none'):
+            raise ValueError("page_load_strategy must be normal, eager or none, not {!r}".format(page_load_strategy))
+        unknown = set(block_types) - set(RESOURCE_PATTERNS)
+        if unknown:
+            raise ValueError("unknown resource types {}".format(sorted(unknown)))
+        self.headless = headless
+        self.page_load_strategy = page_load_strategy
+        self.block_types = tuple(block_types)
+        self.block_patterns = tuple(block_patterns)
+        self.disable_images = disable_images
+        self.arguments = tuple(arguments)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, BrowserProfile) and vars(self) == vars(other)
+
+    def options(self) -> webdriver.ChromeOptions:
+        """
+        a fresh ChromeOptions for launching a driver with this profile.
+        """
+        options = webdriver.ChromeOptions()
+        options.page_load_strategy = self.page_load_strategy
+        if self.headless:
+            options.add_argument('--headless=new')
+        for argument in self.arguments:
+            options.add_argument(argument)
+        if self.disable_images:
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        return options
+
+    def blocklist(self, site_patterns: tuple = ()) -> list[str]:
+        """
+        every url pattern blocked while polling.
+        site_patterns: the crawler's own BLOCKED_WHILE_POLLING.
+        """
+        patterns = [p for kind in self.block_types for p in RESOURCE_PATTERNS[kind]]
+        return patterns + list(self.block_patterns) + list(site_patterns)
+
+    @staticmethod
+    def _set_blocked(driver, patterns: list[str]) -> bool:
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+            return True
+        except (AttributeError, exceptions.WebDriverException):
+            # not chrome (or no devtools access), loads everything as before
+            return False
+
+    def polling(self, driver, site_patterns: tuple = ()) -> bool:
+        """
+        lean loading for stock checks. Applies to navigations from now on.
+        Returns False if the browser doesn't support blocking.
+        """
+        return self._set_blocked(driver, self.blocklist(site_patterns))
+
+    def checkout(self, driver) -> bool:
+        """
+        full loading again, checkout pages need their scripts and payment iframes.
+        """
+        return self._set_blocked(driver, [])
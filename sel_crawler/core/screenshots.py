@@ -0,0 +1,206 @@
+from selenium.common import exceptions
+from datetime import datetime
+import threading
+import atexit
+import base64
+import queue
+import os
+import io
+import re
+
+try:
+    from PIL import Image
+except ImportError:
+    # screenshots are written as the png chrome sends, no jpeg re-encoding
+    Image = None
+
+# default run directory names (start time and pid), the only directories _rotate_runs deletes
+RUN_ID = re.compile(r'^\d{8}-\d{6}-\d+$')
+# files this service writes
+SCREENSHOT = re.compile(r'^\d{4,}-[\w.-]*\.(png|jpg)$')
+
+class ScreenshotService:
+    """
+    Takes screenshots off the crawler's critical path. capture() costs the crawler one
+    webdriver command; decoding, optional jpeg re-encoding and the disk write happen on a
+    background thread. Each run writes to its own directory, and old files/runs are
+    rotated out to stay under the size caps. Once closed, captures are written synchronously
+    instead, so a screenshot taken during shutdown isn't lost.
+    """
+    def __init__(self,
+                 directory: str = 'screenshots',
+                 run_id: str = None,
+                 max_files: int = 500,
+                 max_bytes: int = 200 * 2**20,
+                 max_runs: int = 20,
+                 jpeg_quality: int = None,
+                 max_queue: int = 50
+                 ) -> None:
+        """
+        directory: base directory, each run gets a subdirectory of it (created if missing)
+        run_id: name of this run's subdirectory, defaults to the start time and pid (so shard workers
+                started in the same second don't share one).
+        max_files: screenshots kept in this run's directory, oldest deleted first.
+        max_bytes: total size kept in this run's directory, oldest deleted first.
+        max_runs: run directories kept under directory, oldest deleted first. Only directories named
+                  like a default run_id are counted or deleted, anything else in there is left alone.
+        jpeg_quality: re-encode as jpeg at this quality (needs Pillow), None keeps png.
+        max_queue: captures waiting to be written before new ones are dropped.
+        """
+        self.base = directory
+        self.run_id = run_id if run_id else '{}-{}'.format(datetime.now().strftime('%Y%m%d-%H%M%S'), os.getpid())
+        self.directory = os.path.join(directory, self.run_id)
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.max_runs = max_runs
+        self.jpeg_quality = jpeg_quality if Image is not None else None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._files = []
+        self._bytes = 0
+        self._thread = None
+        self._closed = False
+        atexit.register(self.close)
+
+    def capture(self, driver, label: str) -> bool:
+        """
+        grabs the screenshot (one round trip) and queues it for writing.
+        label: becomes part of the file name, e.g. 'game-final_payment'
+        Returns False if it couldn't be taken or queued; never raises for a failed screenshot.
+        After close() it's written before returning.
+        """
+        try:
+            # the wire format, decoding is left to the writer
+            data = driver.get_screenshot_as_base64()
+        except exceptions.WebDriverException as e:
+            print("couldnt take {} screenshot ({})".format(label, e))
+            return False
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+            # checked and queued under the lock, so nothing lands behind close()'s sentinel
+            if not self._closed:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="screenshots", daemon=True)
+                    self._thread.start()
+                try:
+                    self._queue.put_nowait((seq, label, data))
+                    return True
+                except queue.Full:
+                    self.dropped += 1
+                    return False
+        return self._write_now(seq, label, data)
+
+    def _write_now(self, seq: int, label: str, data: str) -> bool:
+        try:
+            with self._write_lock:
+                self._write(seq, label, data)
+            return True
+        except Exception as e:
+            self.failed += 1
+            print("couldnt save {} screenshot ({})".format(label, e))
+            return False
+
+    def _encode(self, data: str) -> tuple[bytes, str]:
+        png = base64.b64decode(data)
+        if self.jpeg_quality is None:
+            return png, 'png'
+        out = io.BytesIO()
+        Image.open(io.BytesIO(png)).convert('RGB').save(out, 'JPEG', quality=self.jpeg_quality, optimize=True)
+        return out.getvalue(), 'jpg'
+
+    def _write(self, seq: int, label: str, data: str) -> None:
+        content, ext = self._encode(data)
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, exist_ok=True)
+            self._rotate_runs()
+        name = '{:04d}-{}.{}'.format(seq, re.sub(r'[^\w.-]+', '_', label), ext)
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(content)
+        self._files.append((path, len(content)))
+        self._bytes += len(content)
+        self.written += 1
+        while self._files and (len(self._files) > self.max_files or self._bytes > self.max_bytes):
+            old, size = self._files.pop(0)
+            self._bytes -= size
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def _rotate_runs(self) -> None:
+        runs = sorted(d for d in os.listdir(self.base) if RUN_ID.match(d) and os.path.isdir(os.path.join(self.base, d)))
+        for run in runs[:max(0, len(runs) - self.max_runs)]:
+            if run == self.run_id:
+                continue
+            path = os.path.join(self.base, run)
+            for name in os.listdir(path):
+                if not SCREENSHOT.match(name):
+                    continue
+                try:
+                    os.remove(os.path.join(path, name))
+                except OSError:
+                    pass
+            try:
+                os.rmdir(path)
+            except OSError:
+                pass
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                with self._write_lock:
+                    self._write(*item)
+            except Exception as e:
+                self.failed += 1
+                print("couldnt save {} screenshot ({})".format(item[1], e))
+            finally:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """
+        waits for every queued screenshot to be written.
+        """
+        if self._thread is not None:
+            self._queue.join()
+
+    def close(self) -> None:
+        """
+        writes out what's queued and stops the writer. Safe to call more than once.
+        """
+        atexit.unregister(self.close)
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+            if thread is not None:
+                self._queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def stats(self) -> dict:
+        return {"directory": self.directory, "written": self.written, "queued": self._queue.qsize(),
+                "dropped": self.dropped, "failed": self.failed, "files": len(self._files), "bytes": self._bytes}
+
+_default = None
+_default_lock = threading.Lock()
+
+def default_service() -> ScreenshotService:
+    """
+    the service crawlers share when they aren't given one.
+    """
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = ScreenshotService()
+        return _default
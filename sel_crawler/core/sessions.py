@@ -0,0 +1,99 @@
+from .personal_details import LoginDetails
+import tempfile
+import json
+import time
+import os
+
+class SessionStore:
+    """
+    Keeps each site's cookies and local storage on disk so a crawler can start checkout
+    already logged in, with cookie popups dismissed.
+    One json file per site (and account), replaced atomically on every save.
+    """
+    VERSION = 1
+
+    def __init__(self, directory: str = 'sessions', max_age: float = 12 * 3600) -> None:
+        """
+        directory: where session files live (created if missing)
+        max_age: seconds after which a stored session is treated as expired regardless of cookie expiry.
+        """
+        self.directory = directory
+        self.max_age = max_age
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, site: str, login: LoginDetails = None) -> str:
+        name = site if login is None else '{}-{}'.format(site, login.user)
+        safe = ''.join(c if c.isalnum() or c in '-_.@' else '_' for c in name)
+        return os.path.join(self.directory, safe + '.json')
+
+    def _write(self, path: str, data: dict) -> None:
+        # write to a temp file in the same directory then rename over, so a crash never leaves half a session behind
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.session-', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def save(self, site: str, driver, login: LoginDetails = None) -> None:
+        """
+        snapshots the cookies and local storage of the page the driver is on.
+        """
+        data = {
+            "version": self.VERSION,
+            "site": site,
+            "user": login.user if login else None,
+            "origin": driver.execute_script("return window.location.origin;"),
+            "saved_at": time.time(),
+            "cookies": driver.get_cookies(),
+            "local_storage": driver.execute_script("return Object.assign({}, window.localStorage);"),
+        }
+        self._write(self._path(site, login), data)
+
+    def load(self, site: str, login: LoginDetails = None) -> dict:
+        """
+        returns the stored session, or None if there isn't a usable one.
+        Expired cookies are dropped; a session with none left (or older than max_age) counts as expired.
+        """
+        try:
+            with open(self._path(site, login)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        if data.get("version") != self.VERSION or now - data.get("saved_at", 0) > self.max_age:
+            return None
+        data["cookies"] = [c for c in data.get("cookies", []) if c.get("expiry", now + 1) > now]
+        if not data["cookies"]:
+            return None
+        return data
+
+    def restore(self, site: str, driver, login: LoginDetails = None) -> bool:
+        """
+        loads a stored session into the driver. Returns False if there was nothing usable.
+        """
+        data = self.load(site, login)
+        if data is None:
+            return False
+        # cookies can only be set for the origin the browser is currently on
+        driver.get(data["origin"])
+        for cookie in data["cookies"]:
+            if cookie.get("sameSite") not in ("Strict", "Lax", "None"):
+                cookie.pop("sameSite", None)
+            driver.add_cookie(cookie)
+        driver.execute_script(
+            "for (const [k, v] of Object.entries(arguments[0])) { window.localStorage.setItem(k, v); }",
+            data["local_storage"] or {})
+        driver.refresh()
+        return True
+
+    def clear(self, site: str, login: LoginDetails = None) -> None:
+        try:
+            os.remove(self._path(site, login))
+        except FileNotFoundError:
+            pass
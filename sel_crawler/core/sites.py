@@ -0,0 +1,694 @@
+from .websites import GlobalScrape
+from .checkout import Step, StepFailed
+from .personal_details import ContactDetails, PaymentDetails, LoginDetails
+from .probe import Node
+from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.common.by import By
+from selenium.common import exceptions
+import dataclasses
+import threading
+import string
+import random
+import json
+import os
+import re
+
+try:
+    import yaml
+except ImportError:
+    # only json site definitions can be loaded
+    yaml = None
+
+# where the shipped definitions live, load_site('argos') reads sel_crawler/sites/argos.json
+SITES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sites')
+EXTENSIONS = ('.json', '.yaml', '.yml')
+
+# locator spec prefix -> selenium strategy. A spec without a known prefix is css.
+STRATEGIES = {'css': By.CSS_SELECTOR, 'xpath': By.XPATH, 'id': By.ID, 'name': By.NAME, 'tag': By.TAG_NAME,
+              'class': By.CLASS_NAME, 'link': By.LINK_TEXT, 'partial_link': By.PARTIAL_LINK_TEXT}
+
+# details a template can refer to, e.g. "{contact.f_name}"
+DETAILS = {'contact': ContactDetails, 'payment': PaymentDetails, 'login': LoginDetails}
+# worked out from PaymentDetails.expiry_date (MM/YY): "04" and "2027"
+DERIVED = ('expiry_month', 'expiry_year')
+# format specs any template can use ("{contact.town:upper}"), on top of the definition's maps
+FORMATS = {'upper': str.upper, 'lower': str.lower}
+
+KEYS = {'site', 'class', 'home_url', 'sku_pattern', 'poll_interval', 'keystroke_fields', 'blocked_while_polling',
+        'maps', 'locators', 'cookie', 'session', 'login', 'stock', 'listing', 'checkout'}
+STOCK_KEYS = {'in_stock', 'unless', 'add_to_basket', 'regions', 'network_idle', 'screenshot'}
+LISTING_KEYS = {'item', 'link', 'require', 'contains', 'unless_text', 'regions'}
+SESSION_KEYS = {'login_url', 'account_url', 'logged_out_url_contains'}
+STEP_KEYS = {'name', 'detect', 'timeout', 'retries', 'skip_if', 'actions'}
+
+class SiteDefinitionError(ValueError):
+    """
+    Raised when a site definition doesn't load or validate, saying where in it the problem is.
+    """
+
+def parse_spec(spec: str) -> tuple[str, str]:
+    """
+    'xpath://form/button' -> (By.XPATH, '//form/button'), '#email' -> (By.CSS_SELECTOR, '#email')
+    """
+    kind, sep, value = spec.partition(':')
+    if sep and kind in STRATEGIES:
+        return STRATEGIES[kind], value
+    return By.CSS_SELECTOR, spec
+
+def _probe_css(by: str, value: str) -> str:
+    """
+    the spec as css the probe's selector engine understands (no attribute selectors or
+    pseudo classes bar :not), None if there isn't one.
+    """
+    if by == By.ID:
+        return '#' + value
+    if by == By.CLASS_NAME:
+        return '.' + value
+    if by == By.TAG_NAME:
+        return value
+    if by == By.CSS_SELECTOR and '[' not in value and not re.search(r':(?!not\()', value):
+        return value
+    return None
+
+class Locator:
+    """
+    One element of a site, with an ordered list of ways to find it. The way that last found it
+    is tried first, so a lookup normally costs a single find_elements; the fallbacks are only
+    tried once it stops matching (a layout change), and whichever matches then is tried first
+    from then on. Locators are compiled once per definition and shared by every crawler of
+    the site, so what one crawler learns the others skip straight to.
+    """
+    def __init__(self, name: str, specs: list[str]) -> None:
+        self.name = name
+        self.specs = list(specs)
+        self.strategies = [parse_spec(spec) for spec in self.specs]
+        # index -> css for probed pages
+        self.probe_css = {i: css for i, css in enumerate(_probe_css(by, value) for by, value in self.strategies)
+                          if css is not None}
+        # index of the strategy that last found the element
+        self.last = 0
+        self.lookups = 0
+        self.fallbacks = 0
+
+    def _order(self) -> list[int]:
+        last = self.last
+        return [last] + [i for i in range(len(self.strategies)) if i != last]
+
+    def _matched(self, index: int) -> None:
+        if index != self.last:
+            self.fallbacks += 1
+            self.last = index
+            print("locator {} now found by {}".format(self.name, self.specs[index]))
+
+    def _elements(self, driver, index: int) -> list:
+        by, value = self.strategies[index]
+        try:
+            return driver.find_elements(by=by, value=value)
+        except exceptions.InvalidSelectorException:
+            # syntax this browser won't take, the next fallback might do
+            return []
+
+    def find_all(self, driver) -> list:
+        """
+        every element the first matching strategy finds, straight away (no waiting). [] if none match.
+        """
+        self.lookups += 1
+        for index in self._order():
+            elements = self._elements(driver, index)
+            if elements:
+                self._matched(index)
+                return elements
+        return []
+
+    def find(self, waiter, timeout: float = None, clickable: bool = False):
+        """
+        waits (up to timeout, default waiter.timeout) for the element to be present, or visible and
+        enabled if clickable. Raises NoSuchElementException, like the crawlers' find_by_* helpers.
+        """
+        self.lookups += 1
+
+        def located(driver):
+            for index in self._order():
+                for element in self._elements(driver, index):
+                    if not clickable or (element.is_displayed() and element.is_enabled()):
+                        self._matched(index)
+                        return element
+            return False
+
+        try:
+            return waiter.until("{} {}".format("clickable" if clickable else "present", self.name), located, timeout)
+        except exceptions.TimeoutException:
+            raise exceptions.NoSuchElementException("waited {}s for {} ({})".format(
+                waiter.timeout if timeout is None else timeout, self.name, ' | '.join(self.specs)))
+
+    def select(self, page: Node) -> list[Node]:
+        """
+        find_all against a probed page, using the strategies that have a css form.
+        """
+        for index in self._order():
+            if index in self.probe_css:
+                nodes = page.select(self.probe_css[index])
+                if nodes:
+                    self._matched(index)
+                    return nodes
+        return []
+
+    def css(self) -> str:
+        """
+        the css form of the strategy tried first, for batched form fills.
+        """
+        for index in self._order():
+            by, value = self.strategies[index]
+            if by == By.CSS_SELECTOR:
+                return value
+            if by == By.ID:
+                return '#' + value
+        return None
+
+class _Formatter(string.Formatter):
+    def __init__(self, maps: dict[str, dict]) -> None:
+        super().__init__()
+        self.maps = maps
+
+    def format_field(self, value, spec: str) -> str:
+        if spec in FORMATS:
+            return FORMATS[spec](str(value))
+        if spec in self.maps:
+            if value not in self.maps[spec]:
+                raise SiteDefinitionError("{!r} isn't in the {} map".format(value, spec))
+            return self.maps[spec][value]
+        return super().format_field(value, spec)
+
+def _values(crawler: GlobalScrape) -> dict:
+    values = {'contact': crawler.contact_details, 'payment': crawler.payment_details, 'login': crawler.login}
+    if crawler.payment_details is not None:
+        month, _, year = crawler.payment_details.expiry_date.partition('/')
+        values['expiry_month'], values['expiry_year'] = month, '20' + year
+    return values
+
+class Template:
+    """
+    A form value filled in from the crawler's details: "{contact.street_num} {contact.street_name}",
+    "{contact.town:upper}", "{payment.card_type:card_types}" (looked up in the definition's maps).
+    """
+    def __init__(self, text: str, maps: dict[str, dict], where: str) -> None:
+        if not isinstance(text, str):
+            raise SiteDefinitionError("{}: expected a string, got {!r}".format(where, text))
+        self.text = text
+        self.formatter = _Formatter(maps)
+        try:
+            parsed = list(self.formatter.parse(text))
+        except ValueError as e:
+            raise SiteDefinitionError("{}: {}".format(where, e))
+        for _, field, spec, conversion in parsed:
+            if field is None:
+                continue
+            if field not in DERIVED:
+                details, _, attr = field.partition('.')
+                if details not in DETAILS or attr not in {f.name for f in dataclasses.fields(DETAILS[details])}:
+                    raise SiteDefinitionError("{}: unknown field {{{}}} (use contact.*, payment.*, login.* or {})".format(
+                        where, field, ', '.join(DERIVED)))
+            if spec and spec not in FORMATS and spec not in maps:
+                raise SiteDefinitionError("{}: unknown format {!r} (use {} or a map)".format(where, spec, ', '.join(FORMATS)))
+            if conversion:
+                raise SiteDefinitionError("{}: conversions (!{}) aren't supported".format(where, conversion))
+
+    def render(self, crawler: GlobalScrape) -> str:
+        return self.formatter.vformat(self.text, (), _values(crawler))
+
+@dataclasses.dataclass
+class _Stock:
+    in_stock: Locator
+    add_to_basket: Locator
+    # (locator, text): out of stock if the locator's first element contains text
+    unless: list[tuple[Locator, str]]
+    regions: list[str]
+    network_idle: bool
+    screenshot: str
+
+@dataclasses.dataclass
+class _Step:
+    name: str
+    actions: list
+    detect: object
+    timeout: float
+    retries: int
+    skip_if: object
+
+    def bind(self, crawler: GlobalScrape) -> Step:
+        detect, skip_if = self.detect, self.skip_if
+
+        def action():
+            # e.g. a warm session goes straight past the login page
+            if skip_if is None or not skip_if(crawler):
+                _run(self.actions, crawler)
+        return Step(self.name, action, (lambda: detect(crawler)) if detect is not None else None,
+                    self.timeout, self.retries)
+
+def _run(actions: list, crawler: GlobalScrape) -> None:
+    for action in actions:
+        action(crawler)
+
+class SiteDefinition:
+    """
+    A site definition (json, or yaml with PyYAML installed) checked and compiled: Locators,
+    Templates and actions, ready for SiteScrape. See sel_crawler/sites/ for the format.
+    """
+    def __init__(self, data: dict, source: str = '<definition>') -> None:
+        """
+        data: the parsed definition.
+        source: where it came from, for error messages.
+        """
+        self.source = source
+        self._check_keys(data, KEYS, '')
+        for key in ('site', 'home_url', 'stock', 'checkout'):
+            if key not in data:
+                raise SiteDefinitionError("{}: missing {}".format(source, key))
+        self.site = data['site']
+        self.class_name = data.get('class', re.sub(r'\W', '', self.site.title()) + 'Site')
+        self.home_url = data['home_url']
+        self.sku_pattern = data.get('sku_pattern')
+        if self.sku_pattern is not None:
+            try:
+                if re.compile(self.sku_pattern).groups < 1:
+                    raise SiteDefinitionError("{}: sku_pattern needs a group around the product id".format(source))
+            except re.error as e:
+                raise SiteDefinitionError("{}: sku_pattern: {}".format(source, e))
+        self.poll_interval = tuple(data.get('poll_interval', GlobalScrape.POLL_INTERVAL))
+        self.blocked = tuple(data.get('blocked_while_polling', ()))
+        self.maps = data.get('maps', {})
+        self.locators = {}
+        for name, specs in data.get('locators', {}).items():
+            specs = [specs] if isinstance(specs, str) else specs
+            if not specs or not all(isinstance(s, str) and s for s in specs):
+                raise SiteDefinitionError("{}: locators.{}: expected a spec or a list of them".format(source, name))
+            self.locators[name] = Locator(name, specs)
+        self.keystroke_fields = {self._css(field, 'keystroke_fields') for field in data.get('keystroke_fields', ())}
+        self.cookie = self._locator(data['cookie'], 'cookie') if 'cookie' in data else None
+        self.session = data.get('session', {})
+        self._check_keys(self.session, SESSION_KEYS, 'session')
+        self.login = self._actions(data.get('login', []), 'login')
+        self.stock = self._stock(data['stock'])
+        self.listing = self._listing(data['listing']) if 'listing' in data else None
+        self.steps = [self._step(step, 'checkout[{}]'.format(i)) for i, step in enumerate(data['checkout'])]
+
+    # ----- validation/compiling -----
+
+    def _check_keys(self, section: dict, allowed: set, where: str) -> None:
+        if not isinstance(section, dict):
+            raise SiteDefinitionError("{}: {} should be a mapping".format(self.source, where or 'definition'))
+        unknown = set(section) - allowed
+        if unknown:
+            raise SiteDefinitionError("{}: {}unknown keys {}".format(self.source, where + ': ' if where else '', sorted(unknown)))
+
+    def _locator(self, name: str, where: str) -> Locator:
+        if name not in self.locators:
+            raise SiteDefinitionError("{}: {}: no locator called {!r}".format(self.source, where, name))
+        return self.locators[name]
+
+    def _css(self, ref: str, where: str) -> str:
+        """
+        a locator name or plain css -> css selector (form fills are one script, by css)
+        """
+        if ref in self.locators:
+            css = self.locators[ref].css()
+            if css is None:
+                raise SiteDefinitionError("{}: {}: locator {} has no css or id spec to fill by".format(self.source, where, ref))
+            return css
+        return ref
+
+    def _template(self, text: str, where: str) -> Template:
+        return Template(text, self.maps, "{}: {}".format(self.source, where))
+
+    def _stock(self, stock: dict) -> _Stock:
+        self._check_keys(stock, STOCK_KEYS, 'stock')
+        for key in ('in_stock', 'add_to_basket'):
+            if key not in stock:
+                raise SiteDefinitionError("{}: stock: missing {}".format(self.source, key))
+        unless = []
+        for u in stock.get('unless', []):
+            self._check_keys(u, {'locator', 'contains'}, 'stock.unless')
+            unless.append((self._locator(u.get('locator'), 'stock.unless'), u.get('contains', '')))
+        for locator in [self._locator(stock['in_stock'], 'stock.in_stock')] + [loc for loc, _ in unless]:
+            if not locator.probe_css:
+                raise SiteDefinitionError("{}: stock: locator {} needs a css spec the http probe can use".format(self.source, locator.name))
+        return _Stock(self.locators[stock['in_stock']], self._locator(stock['add_to_basket'], 'stock.add_to_basket'),
+                      unless, list(stock.get('regions', [])), bool(stock.get('network_idle', False)), stock.get('screenshot'))
+
+    def _listing(self, listing: dict) -> dict:
+        self._check_keys(listing, LISTING_KEYS, 'listing')
+        if 'item' not in listing:
+            raise SiteDefinitionError("{}: listing: missing item".format(self.source))
+        for key in ('item', 'link', 'require'):
+            if key in listing and _probe_css(By.CSS_SELECTOR, listing[key]) is None:
+                raise SiteDefinitionError("{}: listing.{}: the http probe can't evaluate {!r}".format(self.source, key, listing[key]))
+        return dict({'link': 'a', 'require': None, 'contains': None, 'unless_text': [], 'regions': []}, **listing)
+
+    def _step(self, step: dict, where: str) -> _Step:
+        self._check_keys(step, STEP_KEYS, where)
+        if 'name' not in step:
+            raise SiteDefinitionError("{}: {}: missing name".format(self.source, where))
+        if step['name'] == 'product':
+            raise SiteDefinitionError("{}: {}: 'product' is the built in first step (see stock)".format(self.source, where))
+        where = "{} ({})".format(where, step['name'])
+        detect = self._condition(step.get('detect'), where + '.detect')
+        skip_if = self._condition(step.get('skip_if'), where + '.skip_if')
+        return _Step(step['name'], self._actions(step.get('actions', []), where), detect,
+                     step.get('timeout', 15), step.get('retries', 2), skip_if)
+
+    def _condition(self, condition, where: str):
+        """
+        a locator name (present on the page), {url_contains: ...}, {filled: locator} (an input with a
+        value), or a list of these (any of them) -> crawler -> bool. None stays None.
+        """
+        if condition is None:
+            return None
+        if isinstance(condition, str):
+            locator = self._locator(condition, where)
+            return lambda crawler: bool(locator.find_all(crawler.driver))
+        if isinstance(condition, dict) and set(condition) == {'url_contains'}:
+            fragment = condition['url_contains']
+            return lambda crawler: fragment in crawler.driver.current_url
+        if isinstance(condition, dict) and set(condition) == {'filled'}:
+            field = self._locator(condition['filled'], where + '.filled')
+
+            def filled(crawler):
+                found = field.find_all(crawler.driver)
+                return bool(found and found[0].get_attribute('value'))
+            return filled
+        if isinstance(condition, list) and condition:
+            conditions = [self._condition(c, "{}[{}]".format(where, i)) for i, c in enumerate(condition)]
+            return lambda crawler: any(c(crawler) for c in conditions)
+        raise SiteDefinitionError("{}: {}: expected a locator name, {{url_contains: ...}}, {{filled: ...}} or a list of them".format(self.source, where))
+
+    def _actions(self, actions: list, where: str) -> list:
+        if not isinstance(actions, list):
+            raise SiteDefinitionError("{}: {}: actions should be a list".format(self.source, where))
+        compiled = []
+        for i, action in enumerate(actions):
+            here = "{}.actions[{}]".format(where, i)
+            if not isinstance(action, dict) or len(action) != 1:
+                raise SiteDefinitionError("{}: {}: expected one {{action: argument}}".format(self.source, here))
+            (kind, arg), = action.items()
+            compile_action = getattr(self, '_action_' + kind, None)
+            if compile_action is None:
+                raise SiteDefinitionError("{}: {}: unknown action {!r}".format(self.source, here, kind))
+            compiled.append(compile_action(arg, "{}.{}".format(here, kind)))
+        return compiled
+
+    def _options(self, arg, where: str, allowed: set) -> dict:
+        """
+        an action's argument: a locator name, or a mapping with locator and options.
+        """
+        options = {'locator': arg} if isinstance(arg, str) else dict(arg) if isinstance(arg, dict) else arg
+        self._check_keys(options, allowed | {'locator'}, where)
+        options['locator'] = self._locator(options.get('locator'), where)
+        return options
+
+    # ----- actions, each compiles to crawler -> None -----
+
+    def _action_click(self, arg, where: str):
+        options = self._options(arg, where, {'clickable', 'optional', 'timeout', 'wait_url_change'})
+        locator, timeout = options['locator'], options.get('timeout')
+        clickable, optional, wait_url_change = (bool(options.get(k)) for k in ('clickable', 'optional', 'wait_url_change'))
+
+        def click(crawler):
+            before = crawler.driver.current_url if wait_url_change else None
+            try:
+                element = locator.find(crawler.wait, timeout, clickable)
+            except exceptions.NoSuchElementException:
+                if optional:
+                    return
+                raise
+            element.click()
+            if wait_url_change:
+                crawler.wait.url_changes(before)
+        return click
+
+    def _action_type(self, arg, where: str):
+        options = self._options(arg, where, {'value', 'click'})
+        locator, value = options['locator'], self._template(options.get('value'), where + '.value')
+        click = options.get('click', True)
+
+        def type_value(crawler):
+            element = locator.find(crawler.wait)
+            if click:
+                element.click()
+            element.send_keys(value.render(crawler))
+        return type_value
+
+    def _action_press_return(self, arg, where: str):
+        locator = self._options(arg, where, set())['locator']
+
+        def press_return(crawler):
+            element = locator.find(crawler.wait)
+            element.click()
+            element.send_keys(Keys.RETURN)
+        return press_return
+
+    def _action_fill(self, arg, where: str):
+        self._check_keys(arg, {'label', 'fields', 'selects'}, where)
+        fields = {self._css(ref, where): self._template(text, "{}.fields.{}".format(where, ref))
+                  for ref, text in arg.get('fields', {}).items()}
+        selects = {self._css(ref, where): self._template(text, "{}.selects.{}".format(where, ref))
+                   for ref, text in arg.get('selects', {}).items()}
+        label = arg.get('label', where)
+
+        def fill(crawler):
+            crawler.form.fill(label, {css: t.render(crawler) for css, t in fields.items()},
+                              {css: t.render(crawler) for css, t in selects.items()})
+        return fill
+
+    def _action_frame(self, arg, where: str):
+        options = self._options(arg, where, {'timeout'})
+        locator, timeout = options['locator'], options.get('timeout')
+
+        def frame(crawler):
+            # from the top level page, so a retry can re-enter it
+            crawler.driver.switch_to.default_content()
+            crawler.driver.switch_to.frame(locator.find(crawler.wait, timeout))
+        return frame
+
+    def _action_leave_frame(self, arg, where: str):
+        return lambda crawler: crawler.driver.switch_to.default_content()
+
+    def _action_scroll(self, arg, where: str):
+        if arg not in ('top', 'bottom'):
+            raise SiteDefinitionError("{}: {}: scroll to top or bottom".format(self.source, where))
+        script = "window.scrollTo(0, {});".format('document.body.scrollHeight' if arg == 'bottom' else 0)
+        return lambda crawler: crawler.driver.execute_script(script)
+
+    def _action_expect_text(self, arg, where: str):
+        options = self._options(arg, where, {'text'})
+        locator, text = options['locator'], options.get('text', '')
+
+        def expect_text(crawler):
+            if text not in locator.find(crawler.wait).text:
+                raise StepFailed("{} doesn't say {!r}".format(locator.name, text))
+        return expect_text
+
+    def _action_screenshot(self, arg, where: str):
+        return lambda crawler: crawler.screenshot(arg)
+
+    def _action_notify(self, arg, where: str):
+        if arg != 'final':
+            raise SiteDefinitionError("{}: {}: only the final notification can be sent from checkout".format(self.source, where))
+        return lambda crawler: crawler.bot.send_final_notif() if crawler.bot is not None else None
+
+    def _action_log_in(self, arg, where: str):
+        def log_in(crawler):
+            if crawler.session_warm:
+                print("{} session expired since it was warmed up, logging in again".format(crawler.SITE))
+                crawler.session_warm = False
+            crawler.log_in()
+        return log_in
+
+    def locator_stats(self) -> dict:
+        """
+        per locator: the spec tried first now, lookups made and times a fallback took over.
+        """
+        return {name: {"using": loc.specs[loc.last], "lookups": loc.lookups, "fallbacks": loc.fallbacks}
+                for name, loc in self.locators.items()}
+
+class SiteScrape(GlobalScrape):
+    """
+    A crawler run from a SiteDefinition (DEFINITION) rather than code. Classes for each
+    definition are made by load_site().
+    """
+    DEFINITION = None
+
+    def close_cookie_policy(self) -> None:
+        """
+        Safely checks whether there is a cookie policy that must be closed.
+        """
+        if self.DEFINITION.cookie is None:
+            return
+        try:
+            self.DEFINITION.cookie.find(self.wait, timeout=2).click()
+        except exceptions.NoSuchElementException:
+            print("couldn't find cookie policy to close. Proceeding.")
+
+    def log_in(self) -> None:
+        """
+        runs the definition's login actions on the current page.
+        """
+        _run(self.DEFINITION.login, self)
+
+    def session_valid(self) -> bool:
+        session = self.DEFINITION.session
+        if 'account_url' not in session:
+            return True
+        self.driver.get(session['account_url'])
+        return session.get('logged_out_url_contains', 'login') not in self.driver.current_url
+
+    def refresh_session(self) -> None:
+        self.driver.get(self.DEFINITION.session.get('login_url', self.HOME_URL))
+        self.close_cookie_policy()
+        self.log_in()
+
+    def stock_in(self, find) -> bool:
+        """
+        stock check shared by the driver and the http probe.
+        find: Locator -> list of elements (anything with a .text)
+        """
+        stock = self.DEFINITION.stock
+        if not find(stock.in_stock):
+            return False
+        for locator, text in stock.unless:
+            found = find(locator)
+            if found and text in found[0].text:
+                return False
+        return True
+
+    def probe_available(self, url: str, page: Node) -> bool:
+        return self.stock_in(lambda locator: locator.select(page))
+
+    def stock_regions(self, url: str) -> list[str]:
+        return self.DEFINITION.stock.regions
+
+    def is_product_available(self) -> bool:
+        return self.driver_check(self.stock_regions(None),
+                                 lambda: self.stock_in(lambda locator: locator.find_all(self.driver)))
+
+    def listing_item_available(self, item: Node) -> bool:
+        listing = self.DEFINITION.listing
+        found = item.select(listing['require']) if listing['require'] else [item]
+        if listing['contains'] is not None:
+            found = [node for node in found if listing['contains'] in node.text]
+        if not found:
+            return False
+        return not any(label in item.text for label in listing['unless_text'])
+
+    def listing_regions(self, url: str) -> list[str]:
+        return self.DEFINITION.listing['regions'] if self.DEFINITION.listing else []
+
+    def open_product(self, url: str) -> None:
+        """
+        loads the product page (if not already there) and refreshes until stock is available,
+        then adds it to the basket.
+        """
+        stock = self.DEFINITION.stock
+        self.lean_loading()
+        if self.driver.current_url != url:
+            self.driver.get(url)
+            if stock.network_idle:
+                self.wait.network_idle()
+        if not self.session_warm:
+            self.close_cookie_policy()
+        while not self.is_product_available():
+            self.pause(random.uniform(*self.POLL_INTERVAL))
+            self.driver.refresh()
+            self.wait.network_idle()
+        self.full_loading()
+        self.bot.send_notif(self.SITE, url) if self.bot is not None else None
+        stock.add_to_basket.find(self.wait).click()
+        if stock.screenshot:
+            self.screenshot(stock.screenshot)
+
+    def checkout_steps(self, url: str) -> list[Step]:
+        return [Step('product', lambda: self.open_product(url), timeout=None)] + [step.bind(self) for step in self.DEFINITION.steps]
+
+def definition_path(name: str) -> str:
+    """
+    'argos' -> the shipped sel_crawler/sites/argos.json (or .yaml); a path to a file is returned as is.
+    """
+    if os.path.splitext(name)[1] in EXTENSIONS:
+        return name
+    for ext in EXTENSIONS:
+        path = os.path.join(SITES_DIR, name + ext)
+        if os.path.exists(path):
+            return path
+    raise SiteDefinitionError("no site definition called {} in {}".format(name, SITES_DIR))
+
+def read_definition(path: str) -> dict:
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.json'):
+            try:
+                return json.load(f)
+            except json.JSONDecodeError as e:
+                raise SiteDefinitionError("{}: {}".format(path, e))
+        if yaml is None:
+            raise SiteDefinitionError("{} needs PyYAML (pip install pyyaml), or write it as json".format(path))
+        try:
+            return yaml.safe_load(f)
+        except yaml.YAMLError as e:
+            raise SiteDefinitionError("{}: {}".format(path, e))
+
+# absolute path -> crawler class, so each definition is read and compiled once
+_loaded = {}
+_lock = threading.Lock()
+
+def load_site(name: str) -> type:
+    """
+    name: a shipped definition ('game', 'argos') or the path to one.
+    Returns a SiteScrape subclass for it, used like Game/Argos. Raises SiteDefinitionError if the
+    definition doesn't validate. Loading the same definition again returns the same class.
+    """
+    path = os.path.abspath(definition_path(name))
+    with _lock:
+        if path not in _loaded:
+            definition = SiteDefinition(read_definition(path), path)
+            cls = type(definition.class_name, (SiteScrape,), {
+                '__doc__': "crawler for {}, from {}".format(definition.home_url, os.path.basename(path)),
+                '__module__': __name__,
+                'DEFINITION': definition,
+                'SITE': definition.site,
+                'HOME_URL': definition.home_url,
+                'SKU_PATTERN': definition.sku_pattern,
+                'POLL_INTERVAL': definition.poll_interval,
+                'KEYSTROKE_FIELDS': definition.keystroke_fields,
+                'BLOCKED_WHILE_POLLING': definition.blocked,
+                'LISTING_ITEM': definition.listing['item'] if definition.listing else None,
+                'LISTING_LINK': definition.listing['link'] if definition.listing else 'a',
+            })
+            _loaded[path] = cls
+        return _loaded[path]
+
+def site_classes() -> list[type]:
+    """
+    a class for every shipped definition, then any other definitions this process has loaded.
+    """
+    classes = []
+    if os.path.isdir(SITES_DIR):
+        for file in sorted(os.listdir(SITES_DIR)):
+            base, ext = os.path.splitext(file)
+            if ext in EXTENSIONS:
+                classes.append(load_site(base))
+    with _lock:
+        loaded = list(_loaded.values())
+    return classes + [cls for cls in loaded if cls not in classes]
+
+def __getattr__(name: str):
+    """
+    'sel_crawler.core.sites:GameSite' -> the class load_site made for a shipped definition,
+    so sharding workers can rebuild crawlers from their class name.
+    """
+    for cls in list(_loaded.values()):
+        if cls.__name__ == name:
+            return cls
+    if os.path.isdir(SITES_DIR):
+        for file in sorted(os.listdir(SITES_DIR)):
+            base, ext = os.path.splitext(file)
+            if ext in EXTENSIONS and load_site(base).__name__ == name:
+                return load_site(base)
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
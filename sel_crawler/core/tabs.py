@@ -0,0 +1,245 @@
+from selenium.webdriver.remote.webelement import WebElement
+from selenium.common import exceptions
+from .driver_pool import DriverPool
+import threading
+
+def _unwrap(value):
+    """
+    swaps TabElements back to the raw WebElement before they go to selenium.
+    """
+    if isinstance(value, TabElement):
+        return value._element
+    if isinstance(value, (list, tuple)):
+        return type(value)(_unwrap(v) for v in value)
+    return value
+
+class TabElement:
+    """
+    WebElement living in one tab. Every call makes sure its tab is the active window first.
+    """
+    def __init__(self, element: WebElement, tab: "TabDriver") -> None:
+        self._element = element
+        self._tab = tab
+
+    def __getattr__(self, name):
+        return self._tab._run(lambda: getattr(self._element, name))
+
+    def __eq__(self, other):
+        return _unwrap(other) == self._element
+
+    def __hash__(self):
+        return hash(self._element)
+
+class _TabSwitchTo:
+    """
+    driver.switch_to for one tab. Remembers which frame the tab is in so it can be
+    re-entered after another tab has had the browser.
+    """
+    def __init__(self, tab: "TabDriver") -> None:
+        self._tab = tab
+
+    def frame(self, frame_reference) -> None:
+        frame_reference = _unwrap(frame_reference)
+        self._tab._run(lambda: self._tab._browser.driver.switch_to.frame(frame_reference))
+        self._tab._frames.append(frame_reference)
+
+    def parent_frame(self) -> None:
+        self._tab._run(lambda: self._tab._browser.driver.switch_to.parent_frame())
+        if self._tab._frames:
+            self._tab._frames.pop()
+
+    def default_content(self) -> None:
+        self._tab._run(lambda: self._tab._browser.driver.switch_to.default_content())
+        self._tab._frames = []
+
+    def __getattr__(self, name):
+        return self._tab._run(lambda: getattr(self._tab._browser.driver.switch_to, name))
+
+class TabDriver:
+    """
+    Looks like a webdriver, but is one tab of a SharedBrowser.
+    Commands are serialised on the browser lock and switch to this tab's window first.
+    If the browser was aborted under it, the tab is reopened in the next one at the last url it loaded.
+    """
+    def __init__(self, browser: "SharedBrowser", handle: str) -> None:
+        self._browser = browser
+        self._handle = handle
+        self._generation = browser.generation
+        self._url = None
+        self._frames = []
+        self.switch_to = _TabSwitchTo(self)
+
+    def _activate(self) -> None:
+        if getattr(self._browser.driver, 'dead', False):
+            # aborted from another thread, this is the first command since
+            self._browser._retire()
+        if self._generation != self._browser.generation:
+            self._browser._reopen(self)
+        driver = self._browser.driver
+        if self._browser.active is not self:
+            driver.switch_to.window(self._handle)
+            for frame in self._frames:
+                driver.switch_to.frame(frame)
+            self._browser.active = self
+
+    def _wrap(self, value):
+        if isinstance(value, WebElement):
+            return TabElement(value, self)
+        if isinstance(value, list):
+            return [self._wrap(v) for v in value]
+        if callable(value) and not isinstance(value, type):
+            return lambda *args, **kwargs: self._run(lambda: value(*_unwrap(args), **{k: _unwrap(v) for k, v in kwargs.items()}))
+        return value
+
+    def _run(self, func):
+        with self._browser.lock:
+            self._activate()
+            return self._wrap(func())
+
+    @property
+    def current_window_handle(self) -> str:
+        return self._handle
+
+    def get(self, url: str) -> None:
+        self._url = url
+        self._run(lambda: self._browser.driver.get(url))
+
+    def __getattr__(self, name):
+        return self._run(lambda: getattr(self._browser.driver, name))
+
+class SharedBrowser:
+    """
+    One chrome process shared by many crawlers, each in its own tab.
+    Drop-in for a DriverPool: pass it as a crawler's pool and the crawler gets a tab instead of a browser.
+    Note that tabs share cookies, so crawlers logged into the same site with different accounts shouldn't share a browser.
+    """
+    def __init__(self, path: str = None, options = None, pool: DriverPool = None) -> None:
+        """
+        path, options: used to launch the browser when no pool is given.
+        pool: where the browser itself is leased from (optional)
+        """
+        self.pool = pool if pool else DriverPool(path, options, size=1)
+        self.lock = threading.RLock()
+        self.driver = None
+        self.active = None
+        self.tabs = []
+        # bumped when the browser is aborted, tabs from before are reopened in the next one
+        self.generation = 0
+        # called with every browser leased from the pool (e.g. Metrics.instrument)
+        self.on_lease = []
+        self._spare_handle = None
+
+    def use_profile(self, profile, explicit: bool = True):
+        """
+        see DriverPool.use_profile, the browser comes from self.pool.
+        """
+        return self.pool.use_profile(profile, explicit)
+
+    def _open(self, timeout: float = None) -> str:
+        """
+        a new window handle, launching the browser if there isn't one. Called with the lock held.
+        """
+        if self.driver is None:
+            self.driver = self.pool.acquire(timeout)
+            for hook in self.on_lease:
+                hook(self.driver)
+            self._spare_handle = self.driver.current_window_handle
+        if self._spare_handle is not None:
+            # the window chrome starts with becomes the first tab
+            handle, self._spare_handle = self._spare_handle, None
+            return handle
+        self.driver.switch_to.new_window('tab')
+        return self.driver.current_window_handle
+
+    def acquire(self, timeout: float = None) -> TabDriver:
+        """
+        opens a tab for a crawler, launching the browser on first use.
+        """
+        with self.lock:
+            tab = TabDriver(self, self._open(timeout))
+            self.active = tab
+            self.tabs.append(tab)
+            return tab
+
+    def _reopen(self, tab: TabDriver) -> None:
+        """
+        gives a tab whose browser was aborted a window in the current one, back on the page it last loaded.
+        """
+        if tab not in self.tabs:
+            raise exceptions.InvalidSessionIdException("tab was closed when its browser was aborted")
+        tab._handle = self._open()
+        tab._generation = self.generation
+        tab._frames = []
+        self.active = tab
+        if tab._url is not None:
+            self.driver.get(tab._url)
+
+    def abort(self, tab: TabDriver, grace: float = 10.0) -> None:
+        """
+        quits the browser from another thread, so a command hung in tab fails and lets go of the
+        lock. The dead browser goes back to the pool (which discards it) and the other tabs move
+        to a fresh one on their next command. tab itself is dropped.
+        grace: seconds to wait for the hung command to let go of the lock.
+        """
+        driver = self.driver
+        if driver is None:
+            return
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        if not self.lock.acquire(timeout=grace):
+            print("browser quit but its lock is still held, leaving the tabs where they are")
+            return
+        try:
+            if tab in self.tabs:
+                self.tabs.remove(tab)
+            if self.driver is driver:
+                self._retire()
+        finally:
+            self.lock.release()
+
+    def _retire(self) -> None:
+        """
+        hands the dead browser back to the pool. Called with the lock held.
+        """
+        self.pool.release(self.driver)
+        self.driver = None
+        self.active = None
+        self._spare_handle = None
+        self.generation += 1
+
+    def due(self, tab: TabDriver) -> bool:
+        """
+        tabs aren't recycled one by one, the browser is when it's released (see DriverPool.due).
+        """
+        return False
+
+    def release(self, tab: TabDriver) -> None:
+        """
+        closes a crawler's tab. The last tab is kept as a blank window and the
+        browser goes back to the pool.
+        """
+        with self.lock:
+            if tab not in self.tabs:
+                return
+            self.tabs.remove(tab)
+            if self.tabs:
+                tab._activate()
+                self.driver.close()
+                self.active = None
+                return
+            self.pool.release(self.driver)
+            self.driver = None
+            self.active = None
+
+    def stats(self) -> dict:
+        return {"tabs": len(self.tabs), "browser_running": self.driver is not None}
+
+    def close(self) -> None:
+        with self.lock:
+            if self.driver is not None:
+                self.pool.release(self.driver)
+            self.driver = None
+            self.tabs = []
+        self.pool.close()
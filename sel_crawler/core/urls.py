@@ -0,0 +1,19 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# query parameters that only track where the click came from, never which product it is
+TRACKING_PARAMS = {'gclid', 'gclsrc', 'dclid', 'fbclid', 'msclkid', 'mc_cid', 'mc_eid', 'cmpid', 'clickid', 'ref'}
+
+def normalise_url(url: str) -> str:
+    """
+    one spelling per page: lowercase scheme/host, no default port, www. kept as is, no fragment,
+    tracking parameters (utm_*, gclid...) dropped and the rest sorted, no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or 'https'
+    host = (parts.hostname or '').lower()
+    if parts.port and (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        host = '{}:{}'.format(host, parts.port)
+    query = sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                   if not k.lower().startswith('utm_') and k not in TRACKING_PARAMS)
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
@@ -0,0 +1,122 @@
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.common import exceptions
+from collections import deque
+import time
+
+class Waiter:
+    """
+    Explicit waits for the crawlers, replacing the implicit wait and fixed sleeps.
+    Every wait polls its condition at a fine interval, gives up after its own timeout,
+    and records how long it actually took under the current checkout step.
+    """
+    def __init__(self, get_driver, timeout: float = 5, poll: float = 0.05) -> None:
+        """
+        get_driver: callable returning the driver (so the browser can still be launched lazily)
+        timeout: default seconds before a wait gives up.
+        poll: seconds between condition checks.
+        """
+        self.get_driver = get_driver
+        self.timeout = timeout
+        self.poll = poll
+        self.current_step = None
+        # time.monotonic() when current_step began, lets a supervisor spot a step that hangs
+        self.step_started = None
+        # (step, what was waited for, seconds, succeeded), most recent only so long polls don't grow it forever
+        self.timings = deque(maxlen=10000)
+
+    def begin(self, step: str) -> None:
+        """
+        labels the waits that follow, e.g. self.wait.begin('payment')
+        """
+        self.current_step = step
+        self.step_started = time.monotonic()
+
+    def until(self, what: str, condition, timeout: float = None):
+        """
+        waits for condition(driver) to be truthy and returns its value. Raises TimeoutException.
+        """
+        start = time.perf_counter()
+        ok = False
+        try:
+            wait = WebDriverWait(self.get_driver(), self.timeout if timeout is None else timeout,
+                                 poll_frequency=self.poll, ignored_exceptions=(exceptions.StaleElementReferenceException,))
+            result = wait.until(condition)
+            ok = True
+            return result
+        finally:
+            self.timings.append((self.current_step, what, time.perf_counter() - start, ok))
+
+    def _element(self, what: str, condition, timeout: float):
+        # element waits fail the same way a missing element always has, so existing handlers still catch them
+        try:
+            return self.until(what, condition, timeout)
+        except exceptions.TimeoutException:
+            raise exceptions.NoSuchElementException("waited {}s for {}".format(self.timeout if timeout is None else timeout, what))
+
+    def present(self, by: str, value: str, timeout: float = None):
+        """
+        element is in the DOM.
+        """
+        return self._element("present {}".format(value), EC.presence_of_element_located((by, value)), timeout)
+
+    def clickable(self, by: str, value: str, timeout: float = None):
+        """
+        element is visible and enabled.
+        """
+        return self._element("clickable {}".format(value), EC.element_to_be_clickable((by, value)), timeout)
+
+    def frame(self, by: str, value: str, timeout: float = None) -> None:
+        """
+        iframe is loaded; switches into it.
+        """
+        self._element("frame {}".format(value), EC.frame_to_be_available_and_switch_to_it((by, value)), timeout)
+
+    def url_changes(self, old_url: str, timeout: float = None) -> bool:
+        """
+        the browser has navigated away from old_url. Returns False on timeout.
+        """
+        try:
+            return self.until("url change", EC.url_changes(old_url), timeout)
+        except exceptions.TimeoutException:
+            return False
+
+    def url_contains(self, fragment: str, timeout: float = None) -> bool:
+        try:
+            return self.until("url contains {}".format(fragment), EC.url_contains(fragment), timeout)
+        except exceptions.TimeoutException:
+            return False
+
+    def network_idle(self, quiet: float = 0.3, timeout: float = None) -> bool:
+        """
+        document has loaded and no new resources have been fetched for `quiet` seconds.
+        Returns False on timeout.
+        """
+        state = {"count": None, "since": None}
+
+        def idle(driver):
+            count = driver.execute_script(
+                "return document.readyState === 'complete' ? performance.getEntriesByType('resource').length : -1;")
+            now = time.perf_counter()
+            if count < 0 or count != state["count"]:
+                state["count"], state["since"] = count, now
+                return False
+            return now - state["since"] >= quiet
+
+        try:
+            return self.until("network idle", idle, timeout)
+        except exceptions.TimeoutException:
+            return False
+
+    def report(self) -> dict:
+        """
+        total/max/count of wait time per step.
+        """
+        out = {}
+        for step, what, seconds, ok in self.timings:
+            entry = out.setdefault(step, {"count": 0, "total_s": 0.0, "max_s": 0.0, "timeouts": 0})
+            entry["count"] += 1
+            entry["total_s"] += seconds
+            entry["max_s"] = max(entry["max_s"], seconds)
+            entry["timeouts"] += 0 if ok else 1
+        return out
@@ -1,117 +1,586 @@
 from .personal_details import PaymentDetails, ContactDetails, LoginDetails
 from .notifications.telegram_bot import TelegramBot
-from selenium import webdriver
+from .notifications.dispatcher import Dispatcher
+from .probe import HttpProbe, ProbeError, Node
+from .changes import ChangeDetector
+from .driver_pool import DriverPool, PooledDriver
+from .tabs import TabDriver
+from .sessions import SessionStore
+from .waits import Waiter
+from .forms import FormFiller
+from .checkout import CheckoutRunner, Step, StepFailed, Transition
+from .metrics import Metrics, DETECT_BUCKETS, CHECKOUT_BUCKETS
+from .profile import BrowserProfile
+from .screenshots import ScreenshotService, default_service
+from .urls import normalise_url
+from . import metrics as metrics_context
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
 from selenium.common import exceptions
 from selenium.webdriver.support.ui import Select
+from urllib.parse import urljoin
+import itertools
+import threading
+import re
 import time
 import random
 
+_crawler_ids = itertools.count(1)
+
+class Cancelled(Exception):
+    """
+    Raised inside a crawler's thread once cancel() has been called on it.
+    """
+
 class GlobalScrape:
     """
     Shared variables across many crawlers.
     """
+    SITE = None
+    HOME_URL = None
+    # (min, max) seconds between stock checks
+    POLL_INTERVAL = (7.5, 18.2)
+    # fields the site only accepts real keystrokes for
+    KEYSTROKE_FIELDS = set()
+    # url patterns the stock check never needs, blocked while polling on top of the profile's
+    BLOCKED_WHILE_POLLING = ()
+    # pulls the product id out of a product url, so differently spelled links to one product share a poller
+    SKU_PATTERN = None
+    # one product tile on a category/search results page, and the link to its product page in it
+    LISTING_ITEM = None
+    LISTING_LINK = 'a'
+
     def __init__(self,
                  path: str,
                  contact: ContactDetails,
                  payment: PaymentDetails,
                  login: LoginDetails = None,
                  bot: TelegramBot = None,
-                 headless : bool = False
+                 headless : bool = False,
+                 probe: HttpProbe = None,
+                 pool: DriverPool = None,
+                 sessions: SessionStore = None,
+                 metrics: Metrics = None,
+                 profile: BrowserProfile = None,
+                 screenshots: ScreenshotService = None
                  ) -> None:
         """
         path: absolute path to chromedriver.exe on your system.
         contact, payment, login: Dataclasses used to fill out forms.
-        bot: telegram notification bot (optional)
+        bot: telegram notification bot, any other notification backend, or a Dispatcher shared between crawlers (optional)
+             backends are wrapped in a Dispatcher, so sending never holds up the crawler.
         headless: run without head if True (optional)
+        probe: poll stock over plain http before driving chrome (optional)
+        pool: shared DriverPool to borrow chrome from. Without one the crawler gets a private pool of one. (optional)
+              a SharedBrowser works too, giving the crawler a tab in one shared chrome. The pool launches the
+              browsers, so its profile is used; a profile (or headless) that differs from it raises ValueError.
+        sessions: store cookies/logins on disk so checkout starts warm (optional)
+        metrics: records webdriver command counts/latency and checkout spans (optional)
+        profile: chrome options and resource blocking. Defaults to BrowserProfile(headless=headless) (optional)
+        screenshots: where screenshots are written. Defaults to one service shared by every crawler, ./screenshots/<run>/ (optional)
         """
-        self.PATH = Service(executable_path=path)
-        self.options = '--headless' if headless else None
-        self.driver = webdriver.Chrome(options=self.options, service=self.PATH)
-        self.driver.implicitly_wait(5)
-        self.bot = bot
+        self.PATH = path
+        self.profile = profile if profile else BrowserProfile(headless=headless)
+        # True while the browser is blocking what polling doesn't need
+        self.lean = False
+        # chrome isn't launched until self.driver is first used
+        self.pool = pool if pool else DriverPool(path, size=1, profile=self.profile)
+        if pool is not None:
+            self.profile = pool.use_profile(self.profile, explicit=profile is not None)
+            if headless and not self.profile.headless:
+                raise ValueError("headless=True, but the pool launches browsers with a head")
+        self.options = self.profile.options()
+        self._driver = None
+        self.bot = bot if bot is None or isinstance(bot, Dispatcher) else Dispatcher([bot])
         self.contact_details = contact
         self.payment_details = payment
         self.login = login if login else None
+        self.probe = probe
+        self.sessions = sessions
+        self.metrics = metrics
+        self.screenshots = screenshots
+        # HistoryStore for the probes and stock checks this crawler makes itself (set by Supervisor).
+        # The PollScheduler records its own.
+        self.history = None
+        # watch_key of the product main() is watching
+        self.watching = None
+        self.name = '{}-{}'.format(self.SITE or type(self).__name__.lower(), next(_crawler_ids))
+        # crawlers watching the same product check out highest priority first
+        self.priority = 0
+        # wall clock times (time.time()) for time-to-detect / detect-to-final-click
+        self.watch_started = None
+        self.detected_at = None
+        # True once cookies/login are known good, lets checkout skip popups and logging in
+        self.session_warm = False
+        # explicit waits, the driver has no implicit wait
+        self.wait = Waiter(lambda: self.driver)
+        # fills a page of fields in one round trip
+        self.form = FormFiller(self, self.KEYSTROKE_FIELDS)
+        # skips stock checks of pages that haven't changed since the last poll
+        self.changes = ChangeDetector()
         # reduces number of code when calling to selenium API
-        self.find_by_CSS = lambda val: self.driver.find_element(by=By.CSS_SELECTOR,value=val)
-        self.find_by_NAME = lambda val: self.driver.find_element(by=By.NAME,value=val)
-        self.find_by_TAG_NAME = lambda val: self.driver.find_element(by=By.TAG_NAME,value=val)
-        self.find_by_XPATH = lambda val: self.driver.find_element(by=By.XPATH,value=val)
-        self.find_by_LINK_TEXT = lambda val: self.driver.find_element(by=By.LINK_TEXT,value=val)
-        self.find_by_PARTIAL_LINK_TEXT = lambda val: self.driver.find_element(by=By.PARTIAL_LINK_TEXT,value=val)
-        # these ones return lists
+        # these wait (up to timeout, default self.wait.timeout) for the element to be present
+        self.find_by_CSS = lambda val, timeout=None: self.wait.present(By.CSS_SELECTOR, val, timeout)
+        self.find_by_NAME = lambda val, timeout=None: self.wait.present(By.NAME, val, timeout)
+        self.find_by_TAG_NAME = lambda val, timeout=None: self.wait.present(By.TAG_NAME, val, timeout)
+        self.find_by_XPATH = lambda val, timeout=None: self.wait.present(By.XPATH, val, timeout)
+        self.find_by_LINK_TEXT = lambda val, timeout=None: self.wait.present(By.LINK_TEXT, val, timeout)
+        self.find_by_PARTIAL_LINK_TEXT = lambda val, timeout=None: self.wait.present(By.PARTIAL_LINK_TEXT, val, timeout)
+        # these ones return lists, straight away (no waiting)
         self.find_many_by_CSS = lambda val: self.driver.find_elements(by=By.CSS_SELECTOR,value=val)
+        self.find_many_by_NAME = lambda val: self.driver.find_elements(by=By.NAME,value=val)
+        self.find_many_by_XPATH = lambda val: self.driver.find_elements(by=By.XPATH,value=val)
+        self.find_many_by_LINK_TEXT = lambda val: self.driver.find_elements(by=By.LINK_TEXT,value=val)
+        self.find_many_by_PARTIAL_LINK_TEXT = lambda val: self.driver.find_elements(by=By.PARTIAL_LINK_TEXT,value=val)
+        # every checkout step transition, in order
+        self.transitions = []
+        # set by cancel(), ends waits between polls
+        self.cancelled = threading.Event()
+
+    @property
+    def driver(self) -> PooledDriver:
+        """
+        the crawler's browser, leased from the pool on first use.
+        """
+        if self._driver is None:
+            self._driver = self.pool.acquire()
+        if self.metrics is not None:
+            # every time, not just on lease: a tab's browser can be swapped under it (SharedBrowser.abort),
+            # and instrument() returns straight away for a driver it already hooked
+            self.metrics.instrument(self._driver)
+            metrics_context.bind(self)
+        return self._driver
+
+    def close(self) -> None:
+        """
+        hands the browser back to the pool (if one was ever leased). One that was aborted is
+        discarded as it is; the next lease gets a fresh browser.
+        """
+        driver = self._driver
+        if driver is None:
+            return
+        try:
+            if self.lean and not getattr(driver, 'dead', False):
+                # the next crawler to lease this browser expects it to load everything
+                self.full_loading()
+        except Exception as e:
+            print("couldnt restore full loading, discarding the browser ({})".format(type(e).__name__))
+            self.abort()
+        finally:
+            self._driver = None
+            self.lean = False
+            self.pool.release(driver)
+
+    def pause(self, seconds: float) -> None:
+        """
+        sleeps between polls, raising Cancelled straight away if the crawler is cancelled.
+        """
+        if self.cancelled.wait(seconds):
+            raise Cancelled(self.name)
+        if self.wait.step_started is not None:
+            # still polling, not hung
+            self.wait.step_started = time.monotonic()
+        self.recycle_if_due()
+
+    def recycle_if_due(self) -> None:
+        """
+        swaps a browser that's past the pool's navigation/memory limits for a fresh one, back on the
+        same page (and lean again if it was). A watch holds one lease throughout, so without this the
+        limits would only be checked once it ends.
+        """
+        driver = self._driver
+        if driver is None or not self.pool.due(driver):
+            return
+        print("{}: recycling its browser after {} navigations".format(self.name, driver.navigations))
+        url, lean = driver.current_url, self.lean
+        self._driver = None
+        self.lean = False
+        self.pool.release(driver)
+        if lean:
+            self.lean_loading()
+        self.driver.get(url)
+        self.close_cookie_policy()
+
+    def abort(self) -> None:
+        """
+        quits the crawler's browser from another thread, so whatever the crawler is in the middle
+        of fails fast (e.g. a hung page load). The browser is marked dead so close() and the pool
+        don't try to reuse it. For a tab, the whole SharedBrowser is quit and replaced (see SharedBrowser.abort),
+        since a hung tab holds the lock every other tab needs.
+        """
+        driver = self._driver
+        if isinstance(driver, PooledDriver):
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        elif isinstance(driver, TabDriver):
+            driver._browser.abort(driver)
+
+    def cancel(self) -> None:
+        """
+        stops the crawler for good from another thread: its pauses end (raising Cancelled) and its browser is quit.
+        """
+        self.cancelled.set()
+        self.abort()
+
+    def screenshot(self, label: str) -> None:
+        """
+        one capture command, the file is written in the background (see ScreenshotService).
+        """
+        if self.screenshots is None:
+            self.screenshots = default_service()
+        self.screenshots.capture(self.driver, '{}-{}'.format(self.SITE, label))
+
+    def lean_loading(self) -> None:
+        """
+        stop loading images, fonts, trackers etc. (see BrowserProfile) for the stock polling that follows.
+        """
+        self.lean = self.profile.polling(self.driver, self.BLOCKED_WHILE_POLLING)
+
+    def full_loading(self) -> None:
+        """
+        load everything again, for checkout.
+        """
+        if self.lean:
+            self.profile.checkout(self.driver)
+            self.lean = False
+
+    def probe_available(self, url: str, page: Node) -> bool:
+        """
+        Checks a probed (browserless) copy of the page for stock. Implemented per website.
+        """
+        raise NotImplementedError
+
+    def stock_regions(self, url: str) -> list[str]:
+        """
+        '#id'/'.class' selectors of the page regions the stock check reads. Override per website,
+        the default (none) means any change to the page counts.
+        """
+        return []
+
+    def watch_key(self, url: str) -> str:
+        """
+        what url is a watch of: 'site:sku' when SKU_PATTERN finds the product id, else the normalised url.
+        Crawlers with the same key share one poller.
+        """
+        match = re.search(self.SKU_PATTERN, url) if self.SKU_PATTERN else None
+        if match:
+            return '{}:{}'.format(self.SITE, match.group(1))
+        return normalise_url(url)
+
+    def probe_check(self, probe: HttpProbe, url: str) -> bool:
+        """
+        one probe poll of url. Unchanged pages (304, or same stock region) aren't parsed again.
+        """
+        return self.changes.check(probe, url, self.stock_regions(url), lambda page: self.probe_available(url, page))
+
+    def listing_item_available(self, item: Node) -> bool:
+        """
+        whether a product tile (LISTING_ITEM) on a listing page shows stock. Implemented per website.
+        """
+        raise NotImplementedError
+
+    def listing_regions(self, url: str) -> list[str]:
+        """
+        like stock_regions, for listing pages.
+        """
+        return []
+
+    def listing_stock(self, url: str, page: Node) -> dict[str, bool]:
+        """
+        stock of every product on a probed listing page, keyed by watch_key.
+        """
+        if self.LISTING_ITEM is None:
+            raise NotImplementedError
+        stock = {}
+        for item in page.select(self.LISTING_ITEM):
+            links = [a.get_attribute('href') for a in item.select(self.LISTING_LINK)]
+            if links and links[0]:
+                stock[self.watch_key(urljoin(url, links[0]))] = self.listing_item_available(item)
+        return stock
+
+    def listing_check(self, probe: HttpProbe, url: str) -> dict[str, bool]:
+        """
+        one probe poll of a listing page. Unchanged pages aren't parsed again.
+        """
+        return self.changes.check(probe, url, self.listing_regions(url), lambda page: self.listing_stock(url, page))
+
+    def probe_refresh(self, url: str) -> None:
+        """
+        Polls url over self.probe until probe_available reports stock.
+        The browser isn't touched until this returns.
+        """
+        while True:
+            started = time.monotonic()
+            available = None
+            try:
+                available = self.probe_check(self.probe, url)
+            except (ProbeError, OSError) as e:
+                print("probe failed ({}). Retrying.".format(e))
+            except exceptions.NoSuchElementException:
+                print("couldnt find target on probed page. Retrying.")
+            self.record_probe(available, started)
+            if available:
+                return
+            self.pause(random.uniform(*self.POLL_INTERVAL))
+
+    def driver_check(self, regions: list[str], evaluate) -> bool:
+        """
+        a stock check of the page in the browser (see ChangeDetector.check_driver), recorded in the history.
+        """
+        started = time.monotonic()
+        try:
+            available = self.changes.check_driver(self.driver, regions, evaluate)
+        except Exception:
+            self.record_probe(None, started)
+            raise
+        self.record_probe(available, started)
+        if available:
+            self.mark_detected()
+        return available
+
+    def record_probe(self, available: bool, started: float) -> None:
+        """
+        adds one stock check of the watched product to self.history, if there is one.
+        available: True/False, None if the check failed. started: time.monotonic() when it began.
+        """
+        if self.history is not None and self.watching is not None:
+            self.history.probe(self.watching, self.SITE, available, time.monotonic() - started)
+
+    def checkout_steps(self, url: str) -> list[Step]:
+        """
+        The checkout, product page to final click, as Steps. Implemented per website.
+        """
+        raise NotImplementedError
+
+    def start_watch(self) -> None:
+        """
+        marks when this crawler started watching for stock.
+        """
+        self.watch_started = time.time()
+        self.detected_at = None
+
+    def mark_detected(self) -> None:
+        """
+        marks when stock was first seen.
+        """
+        if self.detected_at is not None:
+            return
+        self.detected_at = time.time()
+        if self.metrics is not None and self.watch_started is not None:
+            self.metrics.observe('time_to_detect_seconds', self.detected_at - self.watch_started, DETECT_BUCKETS, site=self.SITE)
+            self.metrics.span('detect', self.watch_started, self.detected_at, crawler=self.name, site=self.SITE)
+
+    def on_transition(self, transition: Transition) -> None:
+        CheckoutRunner.print_transition(transition)
+        self.transitions.append(transition)
+        end = time.time()
+        if transition.ok and transition.step == 'product':
+            self.mark_detected()
+        if self.metrics is None:
+            return
+        self.metrics.span(transition.step, end - transition.seconds, end, crawler=self.name, site=self.SITE,
+                          ok=transition.ok, attempt=transition.attempt, error=transition.error)
+        if transition.ok and transition.step == 'confirm' and self.detected_at is not None:
+            self.metrics.observe('detect_to_final_click_seconds', end - self.detected_at, CHECKOUT_BUCKETS, site=self.SITE)
+
+    def checkout(self, url: str) -> bool:
+        """
+        Loads url in the browser and buys the product. If a step fails, checkout resumes from
+        whichever step the browser is on instead of starting over.
+        Returns True if the final step went through.
+        """
+        return CheckoutRunner(self.checkout_steps(url), self.wait, self.on_transition).run()
+
+    def session_valid(self) -> bool:
+        """
+        Checks the browser's session is still good (e.g. still logged in). Override per website.
+        """
+        return True
+
+    def refresh_session(self) -> None:
+        """
+        Builds a fresh session in the browser (log in, accept cookies...). Override per website.
+        """
+        self.driver.get(self.HOME_URL)
+
+    def warm_up(self) -> None:
+        """
+        Restores the stored session into the browser, rebuilding it if it's missing or expired.
+        """
+        restored = self.sessions.restore(self.SITE, self.driver, self.login)
+        if not restored or not self.session_valid():
+            self.refresh_session()
+        self.sessions.save(self.SITE, self.driver, self.login)
+        self.session_warm = True
+
+    def keep_session_warm(self, stop: threading.Event, every: float = 600) -> None:
+        """
+        Runs alongside probe polling (the browser is idle then): warms up, then re-checks
+        the session every `every` seconds until stop is set.
+        """
+        try:
+            self.warm_up()
+            while not stop.wait(every):
+                if not self.session_valid():
+                    self.session_warm = False
+                    self.refresh_session()
+                    self.sessions.save(self.SITE, self.driver, self.login)
+                    self.session_warm = True
+        except exceptions.WebDriverException as e:
+            self.session_warm = False
+            print("couldnt keep {} session warm ({}). Proceeding cold.".format(self.SITE, e))
+
+    def main(self, url: str) -> bool:
+        """
+        Begins the web crawler process.
+        url: absolute url to the product page.
+        """
+        self.watching = self.watch_key(url)
+        self.start_watch()
+        keeper = None
+        if self.sessions is not None:
+            if self.probe is not None:
+                # log in etc. in the background while the probe polls
+                stop = threading.Event()
+                keeper = threading.Thread(target=self.keep_session_warm, args=(stop,), daemon=True)
+                keeper.start()
+            else:
+                self.warm_up()
+        # cheap http polling first (if enabled), the browser only loads the page once stock shows up
+        if self.probe is not None:
+            self.probe_refresh(url)
+            self.mark_detected()
+        if keeper is not None:
+            stop.set()
+            keeper.join()
+        return self.checkout(url)
 
 class Game(GlobalScrape):
     """
     crawler for https://www.game.co.uk/
     """
+    SITE = 'game'
+    HOME_URL = 'https://www.game.co.uk/'
+    PS5_URL = 'https://www.game.co.uk/playstation-5'
+    PS5_SELECTOR = '#playstation-5 a'
+    BUY_SELECTOR = '#mainPDPButtons .btnMint a'
+    BUY_LABEL_SELECTOR = '#mainPDPButtons .btnMint .btnName'
+    # https://www.game.co.uk/en/wwe-2k22-2876111
+    SKU_PATTERN = r'game\.co\.uk/.*-(\d{5,})/?(?:[?#]|$)'
+    # search results/category pages
+    LISTING_ITEM = '.product'
+    LISTING_LINK = '.productHeader a'
+
     def __init__(self,
                  path: str,
                  contact: ContactDetails,
                  payment: PaymentDetails,
                  bot: TelegramBot = None,
-                 headless: bool = False
+                 headless: bool = False,
+                 probe: HttpProbe = None,
+                 pool: DriverPool = None,
+                 sessions: SessionStore = None,
+                 metrics: Metrics = None,
+                 profile: BrowserProfile = None,
+                 screenshots: ScreenshotService = None
                  ) -> None:
         """
         inputs described in parent class.
         """
-        super().__init__(path,contact,payment,bot=bot,headless=headless)
+        super().__init__(path,contact,payment,bot=bot,headless=headless,probe=probe,pool=pool,sessions=sessions,metrics=metrics,profile=profile,screenshots=screenshots)
 
     def close_cookie_policy(self) -> None:
         """
         Safely checks whether there is a cookie policy that must be closed.
         """
         try:
-            self.find_by_CSS('.cookiePolicy_inner--actions .cookiePolicy_inner-link').click()
+            self.find_by_CSS('.cookiePolicy_inner--actions .cookiePolicy_inner-link', timeout=2).click()
         except exceptions.NoSuchElementException:
             print("Couldn't find Cookie Policy Popup. Proceeding.")
+
+    def refresh_session(self) -> None:
+        self.driver.get(self.HOME_URL)
+        self.close_cookie_policy()
     
+    def ps5_available_in(self, find_many) -> bool:
+        """
+        ps5 stock check shared by the driver and the http probe.
+        find_many: css selector -> list of elements (anything with a .text)
+        """
+        search = find_many(self.PS5_SELECTOR)
+        if len(search) == 0:
+            raise exceptions.NoSuchElementException(self.PS5_SELECTOR)
+        return "Out of Stock" not in search[0].text
+
     def is_ps5_available(self) -> bool:
         """
         helper function used to check whether the ps5 is available.
         """
-        search = self.find_by_CSS('#playstation-5 a')
-        if "Out of Stock" in search.text:
-            return False
-        else:
-            return True
+        return self.driver_check(self.stock_regions(self.PS5_URL),
+                                 lambda: self.ps5_available_in(self.find_many_by_CSS))
 
     def ps5_refresh(self, url) -> None:
-        availability = self.is_ps5_available('#playstation-5 a')
+        availability = self.is_ps5_available()
         while not availability:
-            time.sleep(random.uniform(7.5,18.2))
+            self.pause(random.uniform(*self.POLL_INTERVAL))
             self.driver.refresh()
-            time.sleep(2)
-            availability = self.is_ps5_available('#playstation-5 a')
+            self.wait.network_idle()
+            availability = self.is_ps5_available()
+        self.full_loading()
         # Onto the Product Page
         self.bot.send_notif("ps5", url) if self.bot is not None else None
-        self.find_by_CSS('#playstation-5 a').click()  
-    
-    def is_product_available(self) -> bool:
+        self.find_by_CSS(self.PS5_SELECTOR).click()
+
+    def product_available_in(self, find_many) -> bool:
         """
-        helper function used to check whether stock is available (on product page).
+        product page stock check shared by the driver and the http probe.
+        find_many: css selector -> list of elements (anything with a .text)
         """
-        search = self.find_many_by_CSS('#mainPDPButtons .btnMint a')
+        search = find_many(self.BUY_SELECTOR)
         if len(search) == 0:
             return False
-        preorder = self.find_many_by_CSS('#mainPDPButtons .btnMint .btnName')
-        if "Pre-order" in preorder[0].text:
+        preorder = find_many(self.BUY_LABEL_SELECTOR)
+        if preorder and "Pre-order" in preorder[0].text:
             return False
         return True
+
+    def is_product_available(self) -> bool:
+        """
+        helper function used to check whether stock is available (on product page).
+        """
+        return self.driver_check(self.stock_regions(None),
+                                 lambda: self.product_available_in(self.find_many_by_CSS))
+
+    def stock_regions(self, url: str) -> list[str]:
+        if url is not None and url in self.PS5_URL:
+            return ['#playstation-5']
+        return ['#mainPDPButtons']
+
+    def listing_item_available(self, item: Node) -> bool:
+        if not item.select('.buyingOptions a'):
+            return False
+        return not any(label in item.text for label in ("Out of Stock", "Pre-order"))
+
+    def listing_regions(self, url: str) -> list[str]:
+        return ['.productList']
+
+    def probe_available(self, url: str, page: Node) -> bool:
+        if url in self.PS5_URL:
+            return self.ps5_available_in(page.select)
+        return self.product_available_in(page.select)
     
     def product_refresh(self, url) -> None:
         availability = self.is_product_available()
         while not availability:
-            time.sleep(random.uniform(7.5,18.2))
+            self.pause(random.uniform(*self.POLL_INTERVAL))
             self.driver.refresh()
-            time.sleep(2)
+            self.wait.network_idle()
             availability = self.is_product_available()
+        self.full_loading()
         self.bot.send_notif("TBC", url) if self.bot is not None else None
-        self.find_by_CSS('#mainPDPButtons .btnMint a').click()
+        self.find_by_CSS(self.BUY_SELECTOR).click()
 
     def fill_checkout_p1(self):
         """
@@ -120,26 +589,13 @@ class Game(GlobalScrape):
         search = self.find_by_CSS('#mat-select-0')
         search.click()
         search.send_keys(Keys.RETURN)
-        
-        search = self.find_by_CSS('#mat-input-0')
-        search.click()
-        search.clear()
-        search.send_keys(self.contact_details.f_name)
-
-        search = self.find_by_CSS('#mat-input-1')
-        search.click()
-        search.clear()
-        search.send_keys(self.contact_details.l_name)
 
-        search = self.find_by_CSS('#mat-input-2')
-        search.click()
-        search.clear()
-        search.send_keys(self.contact_details.email)
-
-        search = self.find_by_CSS('#mat-input-3')
-        search.click()
-        search.clear()
-        search.send_keys(self.contact_details.number)
+        self.form.fill('contact', {
+            '#mat-input-0': self.contact_details.f_name,
+            '#mat-input-1': self.contact_details.l_name,
+            '#mat-input-2': self.contact_details.email,
+            '#mat-input-3': self.contact_details.number,
+        })
 
         self.find_by_CSS('.mat-raised-button.mat-accent-cta.game-full-width .mat-button-wrapper').click()
 
@@ -153,17 +609,11 @@ class Game(GlobalScrape):
         search.click()
         search.send_keys(Keys.RETURN)
 
-        search = self.find_by_CSS('#mat-input-5')
-        search.click()
-        search.send_keys(self.contact_details.street_num + ' ' + self.contact_details.street_name)
-        
-        search = self.find_by_CSS('#mat-input-8')
-        search.click()
-        search.send_keys(self.contact_details.county)
-
-        search = self.find_by_CSS('#mat-input-10')
-        search.click()
-        search.send_keys(self.contact_details.post_code)
+        self.form.fill('address', {
+            '#mat-input-5': self.contact_details.street_num + ' ' + self.contact_details.street_name,
+            '#mat-input-8': self.contact_details.county,
+            '#mat-input-10': self.contact_details.post_code,
+        })
 
         self.find_by_CSS('.mat-raised-button.mat-accent-cta.game-full-width .mat-button-wrapper').click()
 
@@ -172,37 +622,28 @@ class Game(GlobalScrape):
         fills out page 3 of checkout
         """
         self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)
-        self.find_by_CSS('.mat-raised-button.mat-accent-cta .mat-button-wrapper').click()
+        self.wait.clickable(By.CSS_SELECTOR, '.mat-raised-button.mat-accent-cta .mat-button-wrapper').click()
 
     def fill_checkout_p4(self):
         """
         fills out page 4 of checkout
         """
-        iframe = self.find_by_CSS('.mat-expansion-panel-body .mat-form-field-infix iframe')
-        self.driver.switch_to.frame(iframe)
+        self.wait.frame(By.CSS_SELECTOR, '.mat-expansion-panel-body .mat-form-field-infix iframe')
         
         search = self.find_by_NAME('credit-card-number')
         search.send_keys(self.payment_details.card_number)
         self.driver.switch_to.default_content()
 
-        search = self.find_by_CSS('#mat-input-15')
-        search.click()
-        search.send_keys(self.payment_details.name_on_card)
-      
-        search = self.find_by_CSS('#mat-input-16')
-        search.click()
-        search.send_keys(self.payment_details.expiry_date)
-
-        search = self.find_by_CSS('#mat-input-17')
-        search.click()
-        search.send_keys(self.payment_details.cv2)
+        self.form.fill('payment', {
+            '#mat-input-15': self.payment_details.name_on_card,
+            '#mat-input-16': self.payment_details.expiry_date,
+            '#mat-input-17': self.payment_details.cv2,
+        })
 
         self.find_by_CSS('.save-card .mat-button-wrapper').click()
 
         self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        time.sleep(2)
-        self.find_by_CSS('.game-pt-sm .mat-checkbox-inner-container').click()
+        self.wait.clickable(By.CSS_SELECTOR, '.game-pt-sm .mat-checkbox-inner-container').click()
 
     def final_checkout_btn(self):
         """
@@ -210,122 +651,174 @@ class Game(GlobalScrape):
         """
         self.find_by_CSS('button .game-plr-xxl').click()
 
-    def main(self, url):
+    def payment_filled(self) -> bool:
+        """
+        the pay button is on the payment page from the start, it only counts once the card details are in.
+        """
+        cv2 = self.find_many_by_CSS('#mat-input-17')
+        return bool(cv2 and cv2[0].get_attribute('value') and self.find_many_by_CSS('button .game-plr-xxl'))
+
+    def open_product(self, url):
         """
-        Begins the web crawler process, using the helper functions defined within the class.
+        loads the product page (if not already there) and refreshes until stock is available,
+        then adds it to the basket.
         url: absolute url to product page on the game website. Otherwise, the page for the PS5.
         """
-        self.driver.get(url)
-        self.close_cookie_policy()
+        self.lean_loading()
+        if self.driver.current_url != url:
+            self.driver.get(url)
+        if not self.session_warm:
+            self.close_cookie_policy()
 
         # special condition if searching for a PS5
         # loop refresh until ps5 stock available
         # todo: implement better logic for random refreshing.
-        # Also avoid using explicit waits with the implicit driver wait that's already been set.
-        if url in 'https://www.game.co.uk/playstation-5':
-            try:
-                self.ps5_refresh(url)
-            except exceptions.NoSuchElementException:
-                print("couldnt find target on initial url (ps5)")
-                return
+        if url in self.PS5_URL:
+            self.ps5_refresh(url)
         else:
-            try:
-                self.product_refresh(url)
-            except exceptions.NoSuchElementException:
-                print("couldnt find target on initial url")
-                return
-
-        self.driver.save_screenshot('src/screenshots/Game/stock_avail.png')
+            self.product_refresh(url)
 
-        # there's a same page popup to complete
-        try:
-            search = self.find_by_CSS('.modal-content-scroll-wrapper')
-            if "in your basket" not in search.text:
-                print("something went wrong when trying to add to basket")
-                return
-        except exceptions.NoSuchElementException:
-            print("couldnt find element in same-page popup")
-            return
-        
-        # proceed to checkout
-        try:
-            self.find_by_CSS('.modal-content-bottom .secure-checkout').click()
-            self.find_by_LINK_TEXT('SECURE CHECKOUT').click()
-            self.find_by_LINK_TEXT('Checkout as Guest').click()
-        except exceptions.NoSuchElementException:
-            print("something went wrong when trying to get to checkout page")
-            return
-        
-        # fill out details 1) Contact Details
-        try:
-            self.fill_checkout_p1()
-        except exceptions.NoSuchElementException:
-            print("smth went wrong on contact details page")
-            return
+        self.screenshot('stock_avail')
 
-        # fill out details 2) Delivery Address
-        try:
-            self.fill_checkout_p2()
-        except exceptions.NoSuchElementException:
-            print("smth went wrong on delivery address page")
-            return
+    def basket_popup(self):
+        """
+        there's a same page popup to complete
+        """
+        search = self.find_by_CSS('.modal-content-scroll-wrapper')
+        if "in your basket" not in search.text:
+            raise StepFailed("basket popup doesn't say the item is in the basket")
+        self.find_by_CSS('.modal-content-bottom .secure-checkout').click()
 
-        # fill out details 3)Delivery Options
-        try:
-            self.fill_checkout_p3()
-        except exceptions.NoSuchElementException:
-            print("smth went on wrong on delivery options page")
-            return
-        
-        # fill out details 4)Payment
-        try:
-            self.fill_checkout_p4()
-            self.driver.save_screenshot('screenshots/Game/final_payment.png')
-            self.bot.send_final_notif() if self.bot is not None else None
-            self.final_checkout_btn()
-        except exceptions.NoSuchElementException:
-            print("smth went wrong on payment page")
-            return
+    def payment(self):
+        """
+        fills out the payment page, ready for the final button.
+        """
+        self.fill_checkout_p4()
+        self.screenshot('final_payment')
+        self.bot.send_final_notif() if self.bot is not None else None
+
+    def checkout_steps(self, url):
+        return [
+            Step('product', lambda: self.open_product(url), timeout=None),
+            Step('basket popup', self.basket_popup, lambda: self.find_many_by_CSS('.modal-content-scroll-wrapper')),
+            # proceed to checkout
+            Step('basket', lambda: self.find_by_LINK_TEXT('SECURE CHECKOUT').click(), lambda: self.find_many_by_LINK_TEXT('SECURE CHECKOUT')),
+            Step('guest', lambda: self.find_by_LINK_TEXT('Checkout as Guest').click(), lambda: self.find_many_by_LINK_TEXT('Checkout as Guest')),
+            # fill out details 1) Contact Details 2) Delivery Address 3) Delivery Options 4) Payment
+            Step('contact', self.fill_checkout_p1, lambda: self.find_many_by_CSS('#mat-select-0')),
+            Step('address', self.fill_checkout_p2, lambda: self.find_many_by_PARTIAL_LINK_TEXT('Address Entry')),
+            Step('delivery', self.fill_checkout_p3),
+            Step('payment', self.payment, lambda: self.find_many_by_CSS('.mat-expansion-panel-body .mat-form-field-infix iframe')),
+            Step('confirm', self.final_checkout_btn, self.payment_filled),
+        ]
 
 class Argos(GlobalScrape):
     """
     crawler for https://www.argos.co.uk/
     """
+    SITE = 'argos'
+    HOME_URL = 'https://www.argos.co.uk/'
+    LOGIN_URL = 'https://www.argos.co.uk/account/login'
+    ACCOUNT_URL = 'https://www.argos.co.uk/account/overview'
+    TROLLEY_SELECTOR = '.xs-8--none button'
+    # https://www.argos.co.uk/product/9489237
+    SKU_PATTERN = r'argos\.co\.uk/product/(\d+)'
+    # search results/category pages
+    LISTING_ITEM = '.product-card'
+    LISTING_LINK = 'a'
+    # the card number box formats itself on keypresses
+    KEYSTROKE_FIELDS = {'#hps-pan'}
+
     def __init__(self,
                  path: str,
                  contact: ContactDetails,
                  payment: PaymentDetails,
                  login: LoginDetails,
                  bot : TelegramBot = None,
-                 headless: bool = False
+                 headless: bool = False,
+                 probe: HttpProbe = None,
+                 pool: DriverPool = None,
+                 sessions: SessionStore = None,
+                 metrics: Metrics = None,
+                 profile: BrowserProfile = None,
+                 screenshots: ScreenshotService = None
                  ) -> None:
         """
         inputs defined in parent class.
         """
-        super().__init__(path,contact,payment,login, bot, headless)
+        super().__init__(path,contact,payment,login, bot, headless, probe, pool, sessions, metrics, profile, screenshots)
 
     def close_cookie_policy(self):
         """
         Safely checks whether there is a cookie policy that must be closed.
         """
         try:
-            self.find_by_CSS('.consent_prompt_footer #consent_prompt_submit').click()
+            self.find_by_CSS('.consent_prompt_footer #consent_prompt_submit', timeout=2).click()
         except exceptions.NoSuchElementException:
             print("couldn't find cookie policy to close. Proceeding.")
 
+    def log_in(self) -> None:
+        """
+        fills out and submits the login form on the current page.
+        """
+        search = self.find_by_CSS('.form-group__input-wrapper #email')
+        search.click()
+        search.send_keys(self.login.user)
+
+        search = self.find_by_CSS('.form-group__input-wrapper #password')
+        search.click()
+        search.send_keys(self.login.pw)
+
+        self.find_by_XPATH('/html/body/div[1]/div[2]/main/div/div/form/button/div/div[1]').click()
+
+    def session_valid(self) -> bool:
+        """
+        logged out users get bounced from the account page to the login page.
+        """
+        self.driver.get(self.ACCOUNT_URL)
+        return "login" not in self.driver.current_url
+
+    def refresh_session(self) -> None:
+        self.driver.get(self.LOGIN_URL)
+        self.close_cookie_policy()
+        self.log_in()
+
+    def probe_available(self, url: str, page: Node) -> bool:
+        return len(page.select(self.TROLLEY_SELECTOR)) > 0
+
+    def stock_regions(self, url: str) -> list[str]:
+        return ['.xs-8--none']
+
+    def listing_item_available(self, item: Node) -> bool:
+        return any("Add to trolley" in button.text for button in item.select('button'))
+
+    def listing_regions(self, url: str) -> list[str]:
+        return ['.product-list']
+
+    def is_product_available(self) -> bool:
+        """
+        whether the add to trolley button is on the current page.
+        """
+        return self.driver_check(self.stock_regions(None),
+                                 lambda: len(self.find_many_by_CSS(self.TROLLEY_SELECTOR)) > 0)
+
     def add_to_trolley(self,value: str):
         self.find_by_CSS(value).click()
 
     def check_trolley_popup(self):
-        popups = self.driver.find_elements(by=By.XPATH,value='/html/body/div[1]/div/div[2]/main/div[2]/section[1]/div[2]/div[1]/div/div[2]/div[2]/button')
-        if len(popups) == 1:
-            popups[0].click()
+        try:
+            self.find_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[1]/div[2]/div[1]/div/div[2]/div[2]/button', timeout=2).click()
+        except exceptions.NoSuchElementException:
+            pass
+
+    def address_text(self) -> str:
+        return self.contact_details.number + ', '+\
+               self.contact_details.street_name + ', '+\
+               self.contact_details.town.upper()
 
     def dropdown_select_adress(self):
-        select = Select(self.driver.find_element(by=By.CSS_SELECTOR,value='#addressResults'))
-        select.select_by_visible_text(self.contact_details.number + ', '+\
-                                        self.contact_details.street_name + ', '+\
-                                        self.contact_details.town.upper())
+        select = Select(self.find_by_CSS('#addressResults'))
+        select.select_by_visible_text(self.address_text())
 
     def enter_number(self):
         search = self.find_by_CSS('#delivery_phone')
@@ -333,16 +826,16 @@ class Argos(GlobalScrape):
         search.send_keys(self.contact_details.number)
 
     def select_delivery_slot(self):
-        delivery_slots = self.driver.find_elements(by=By.CSS_SELECTOR,value='.smallItemsSlotTable tbody :not(.noSlot).blockContent')
-        delivery_slots[0].click()
+        self.wait.clickable(By.CSS_SELECTOR, '.smallItemsSlotTable tbody :not(.noSlot).blockContent').click()
         self.find_by_CSS('#contextualSubmitContinueEcomm').click()
 
-    def dropdown_select_card_type(self):
+    def card_type_value(self) -> str:
         dic = {"VISA Credit": "VISAC", "VISA": "VISAD", "VISA Electron": "ELECTRON",\
             "Mastercard": "MASTERCARD", "Maestro": "MAESTRO", "American Express": "AMEX"}
-        payment_value = dic[self.payment_details.card_type]
+        return dic[self.payment_details.card_type]
 
-        Select(self.find_by_CSS('#cardTypeSelect')).select_by_value(payment_value)
+    def dropdown_select_card_type(self):
+        Select(self.find_by_CSS('#cardTypeSelect')).select_by_value(self.card_type_value())
 
     def dropdown_select_card_month(self):
         expiry_month = self.payment_details.expiry_date[:2]
@@ -352,97 +845,108 @@ class Argos(GlobalScrape):
         expiry_year = self.payment_details.expiry_date[3:]
         Select(self.find_by_CSS('#expiryDateYear')).select_by_value('20' + expiry_year)
 
-    def main(self, url):
-        self.driver.get(url)
-        self.close_cookie_policy()
-        
-        # Keep searching for add to trolley button (refreshing page), until it is there.
-        while True:
-            try:
-                self.add_to_trolley('.xs-8--none button')
-            except exceptions.NoSuchElementException:
-                time.sleep(random.uniform(7.5,18.2))
-                self.driver.refresh()
-                time.sleep(2)
-            else:
-                break
-        
-        # proceed to checkout page
-        try:
-            self.find_by_LINK_TEXT('Continue without insurance').click()
+    def open_product(self, url):
+        """
+        loads the product page (if not already there) and keeps refreshing until it can be added to the trolley.
+        """
+        self.lean_loading()
+        if self.driver.current_url != url:
+            self.driver.get(url)
+            # the trolley button is rendered client side, give it the chance to appear
+            self.wait.network_idle()
+        if not self.session_warm:
+            self.close_cookie_policy()
 
-            search = self.find_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[1]/div[2]/div/div/div[2]/div/form/div[2]/div/input')
-            search.click()
-            search.send_keys(self.contact_details.post_code)
+        # Keep searching for add to trolley button (refreshing page), until it is there.
+        while not self.is_product_available():
+            self.pause(random.uniform(*self.POLL_INTERVAL))
+            self.driver.refresh()
+            self.wait.network_idle()
+        self.full_loading()
+        self.add_to_trolley(self.TROLLEY_SELECTOR)
 
-            self.find_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[1]/div[2]/div/div/div[2]/div/form/div[3]/button[2]').click()
-            self.check_trolley_popup()
-            self.find_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[3]/div[2]/div[2]/div/div/div/button/span[2]').click()
-        except exceptions.NoSuchElementException:
-            print("smth went wrong when trying to continue to checkout")
-            return
-        except exceptions.ElementClickInterceptedException:
-            return
+    def trolley(self):
+        """
+        enters the postcode and continues to checkout.
+        """
+        search = self.find_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[1]/div[2]/div/div/div[2]/div/form/div[2]/div/input')
+        search.click()
+        search.send_keys(self.contact_details.post_code)
 
-        # log in
-        try:
-            search = self.find_by_CSS('.form-group__input-wrapper #email')
-            search.click()
-            search.send_keys(self.login.user)
+        self.find_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[1]/div[2]/div/div/div[2]/div/form/div[3]/button[2]').click()
+        self.check_trolley_popup()
+        self.find_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[3]/div[2]/div[2]/div/div/div/button/span[2]').click()
 
-            search = self.find_by_CSS('.form-group__input-wrapper #password')
-            search.click()
-            search.send_keys(self.login.pw)
+    def past_login(self) -> bool:
+        """
+        checkout went straight on to your details, i.e. the session is logged in.
+        """
+        return "TrolleyYourDetails" in self.driver.current_url
 
-            self.find_by_XPATH('/html/body/div[1]/div[2]/main/div/div/form/button/div/div[1]').click()
-            self.find_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[3]/div[2]/div[2]/div/div/div/button/span[2]').click()
-        except exceptions.NoSuchElementException:
-            print("smth went wrong when trying to login")
-            return
-        
-        # proceed to checkout
-        try:
-            if "TrolleyYourDetails" in self.driver.current_url:
-                self.find_by_CSS('.well.border-straight-xs.gutter .btn.btn-block.btn-secondary').click()
-                self.enter_number()
-                self.dropdown_select_adress()
-                self.find_by_CSS('#deliveryAddress .btn.btn-block.btn-primary').click()
-                self.find_by_CSS('.panel-body .btn.btn-block.btn-primary').click()
-            self.select_delivery_slot()
-        except exceptions.NoSuchElementException:
-            print("smth went wrong after logging in and continuing to check out")
-            return
-        
-        #payment
-        try:
-            # complete first payment page
-            self.dropdown_select_card_type()
-            self.find_by_CSS('#continue-to-payment-details').click()
-            # payment page 2 (within iframe)
-            # select iframe
-            iframe = self.find_by_NAME('iFrame_a')
-            self.driver.switch_to.frame(iframe)
-            # card num
-            search = self.find_by_CSS('#hps-pan')
-            search.click()
-            search.send_keys(self.payment_details.card_number)
-            #expiry date
-            self.dropdown_select_card_month()
-            self.dropdown_select_card_year()
-            #name on card
-            search = self.find_by_CSS('#nameOnCard')
-            search.click()
-            search.send_keys(self.payment_details.name_on_card)
-            #security code
-            search = self.find_by_CSS('#hps-cvv')
-            search.click()
-            search.send_keys(self.payment_details.cv2)
-            #click pay now
-            self.bot.send_final_notif()
-            self.driver.save_screenshot('src/screenshots/Argos/final.png')
-            time.sleep(15)
-            self.find_by_CSS('#hps-continue').click()
-        except exceptions.NoSuchElementException:
-            print("smth went wrong on payment page")
+    def login_step(self):
+        """
+        logs in from the checkout login page, then continues. Logged in sessions go straight past it.
+        """
+        if self.past_login():
             return
+        if self.session_warm:
+            print("argos session expired since it was warmed up, logging in again")
+            self.session_warm = False
+        self.log_in()
+        before = self.driver.current_url
+        self.find_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[3]/div[2]/div[2]/div/div/div/button/span[2]').click()
+        self.wait.url_changes(before)
+
+    def your_details(self):
+        self.find_by_CSS('.well.border-straight-xs.gutter .btn.btn-block.btn-secondary').click()
+        self.form.fill('your details', {'#delivery_phone': self.contact_details.number},
+                       {'#addressResults': self.address_text()})
+        self.find_by_CSS('#deliveryAddress .btn.btn-block.btn-primary').click()
+        self.find_by_CSS('.panel-body .btn.btn-block.btn-primary').click()
+
+    def payment(self):
+        """
+        complete first payment page
+        """
+        self.form.fill('card type', {}, {'#cardTypeSelect': self.card_type_value()})
+        self.find_by_CSS('#continue-to-payment-details').click()
 
+    def card_details(self):
+        """
+        payment page 2 (within iframe)
+        """
+        # start from the top level page so a retry can re-enter the iframe
+        self.driver.switch_to.default_content()
+        self.wait.frame(By.NAME, 'iFrame_a')
+        # card num, expiry date, name on card, security code
+        self.form.fill('card details', {
+            '#hps-pan': self.payment_details.card_number,
+            '#nameOnCard': self.payment_details.name_on_card,
+            '#hps-cvv': self.payment_details.cv2,
+        }, {
+            '#expiryDateMonth': self.payment_details.expiry_date[:2],
+            '#expiryDateYear': '20' + self.payment_details.expiry_date[3:],
+        })
+        self.bot.send_final_notif() if self.bot is not None else None
+        self.screenshot('final')
+
+    def checkout_steps(self, url):
+        steps = [
+            Step('product', lambda: self.open_product(url), timeout=None),
+            # proceed to checkout page
+            Step('insurance', lambda: self.find_by_LINK_TEXT('Continue without insurance').click(),
+                 lambda: self.find_many_by_LINK_TEXT('Continue without insurance')),
+            Step('trolley', self.trolley,
+                 lambda: self.find_many_by_XPATH('/html/body/div[1]/div/div[2]/main/div[2]/section[1]/div[2]/div/div/div[2]/div/form/div[2]/div/input')),
+            # entered on the login page, or straight away once past it, so a logged in session doesn't wait here
+            # and one that expired since warm up logs in again
+            Step('login', self.login_step,
+                 lambda: self.find_many_by_CSS('.form-group__input-wrapper #email') or self.past_login()),
+            Step('details', self.your_details, self.past_login),
+            Step('delivery', self.select_delivery_slot, lambda: self.find_many_by_CSS('.smallItemsSlotTable')),
+            Step('payment', self.payment, lambda: self.find_many_by_CSS('#cardTypeSelect')),
+            Step('card details', self.card_details, lambda: self.find_many_by_NAME('iFrame_a')),
+            #click pay now
+            Step('confirm', lambda: self.wait.clickable(By.CSS_SELECTOR, '#hps-continue', timeout=20).click()),
+        ]
+        return steps
@@ -1,5 +1,9 @@
-import concurrent.futures
+import asyncio
 from .core.websites import GlobalScrape
+from .core.notifications.dispatcher import share_dispatchers
+from .scheduler import PollScheduler
+from .sharding import ShardCoordinator
+from .supervisor import Supervisor
 from typing import Type
 
 class MultiInstance():
@@ -13,10 +17,37 @@ class MultiInstance():
         self.multi_dic = multi_dic
         self.drivers = list(self.multi_dic.keys())
         self.urls = list(self.multi_dic.values())
+        # crawlers given the same bot notify through one dispatcher, so their alerts are coalesced together
+        share_dispatchers(self.drivers)
 
-    def multi_scrape(self):
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            for key,value in self.multi_dic.items():
-                self.threads = executor.submit(key.main, value)
-            for thread in self.lst:
-                thread.result()
+    def multi_scrape(self, **kwargs) -> dict:
+        """
+        Runs every crawler's main() on its own thread under a Supervisor (see supervisor.py):
+        crashed crawlers are restarted on a fresh browser, Ctrl-C shuts everything down cleanly,
+        and other crawlers after the same product stop once one checks out.
+        kwargs: passed on to Supervisor (restarts, backoff, timeout, step_timeout, cancel_siblings, report_every, history)
+        Returns each crawler's final status.
+        """
+        self.supervisor = Supervisor(self.multi_dic, **kwargs)
+        return self.supervisor.run()
+
+    def multi_poll(self, **kwargs) -> PollScheduler:
+        """
+        Same as multi_scrape, but every crawler is polled from one asyncio event loop
+        and only gets a browser thread once its product is in stock.
+        kwargs: passed on to PollScheduler (probe, per_host, checkout_workers, interval, listings, budget)
+        """
+        self.scheduler = PollScheduler(self.multi_dic, **kwargs)
+        asyncio.run(self.scheduler.run())
+        return self.scheduler
+
+    def multi_shard(self, workers: int = 2, timeout: float = None, **kwargs) -> dict:
+        """
+        Spreads the crawlers over `workers` processes (see sharding.py), each polling its share
+        with its own scheduler. More workers can join from other machines while it runs.
+        kwargs: passed on to ShardWorker (capacity, factory, per_host, checkout_workers, interval)
+        Returns the coordinator's stats once every target has finished.
+        """
+        self.coordinator = ShardCoordinator(self.multi_dic)
+        print("shard coordinator listening on {}:{}".format(*self.coordinator.address))
+        return self.coordinator.run(workers, timeout, **kwargs)
@@ -0,0 +1,398 @@
+import asyncio
+import concurrent.futures
+import heapq
+import itertools
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+from .core.websites import GlobalScrape
+from .core.probe import HttpProbe
+from .core.history import HistoryStore
+from .watch import WatchRegistry
+from .budget import PollBudget
+
+class WatchTarget:
+    """
+    One crawler watching one url.
+    """
+    def __init__(self, crawler: GlobalScrape, url: str, priority: int = 0) -> None:
+        self.crawler = crawler
+        self.url = url
+        self.key = crawler.watch_key(url)
+        self.priority = priority
+        self.host = urlsplit(url).netloc
+        self.site = crawler.SITE or self.host
+        self.state = "waiting"
+        # sequence number of the timer that counts, older ones are dropped when popped
+        self.timer = None
+        self.polls = 0
+        self.errors = 0
+        self.last_error = None
+        self.result = None
+
+class ListingTarget:
+    """
+    One category/search results page, read in one fetch for the stock of every product on it.
+    """
+    def __init__(self, crawler: GlobalScrape, url: str) -> None:
+        self.crawler = crawler
+        self.url = url
+        self.key = url
+        self.priority = 0
+        self.host = urlsplit(url).netloc
+        self.site = crawler.SITE or self.host
+        self.timer = None
+        # watch key -> in stock, as of the last scan
+        self.stock = {}
+        # watch keys this listing is currently answering for
+        self.covers = set()
+        self.scans = 0
+        # product polls the scans stood in for
+        self.replaced = 0
+        self.errors = 0
+        self.last_error = None
+
+class PollScheduler:
+    """
+    Polls many watch targets from a single asyncio event loop.
+    One timer queue decides which target is due next (no per-target sleeping threads),
+    probes are capped per host, and checkouts run on a bounded thread pool (crawlers without probe
+    support run their whole main() on threads of their own, so they don't hold checkout workers).
+    Targets watching the same product share one poller (see watch.py), and products that
+    show up on a watched listing page aren't polled at all until the listing shows them in stock.
+    """
+    def __init__(self,
+                 multi_dic: dict[GlobalScrape, str] = None,
+                 probe: HttpProbe = None,
+                 per_host: int = 2,
+                 checkout_workers: int = 2,
+                 interval: tuple[float, float] = (7.5, 18.2),
+                 listings: list[str] = None,
+                 budget: PollBudget = None,
+                 history: HistoryStore = None
+                 ) -> None:
+        """
+        multi_dic: crawlers and their destination urls (same shape as MultiInstance)
+        probe: shared probe for crawlers that don't bring their own (optional)
+        per_host: max probes in flight per host
+        checkout_workers: max checkouts (browser sessions) running at once
+        interval: (min, max) seconds between polls of the same target, when there's no budget
+        listings: category/search results urls to read stock from in bulk (see add_listing)
+        budget: requests a minute to spread over the targets instead of fixed intervals (see budget.py)
+        history: records every probe result and checkout (optional). Its past restocks seed the budget's weights.
+        """
+        self.probe = probe if probe else HttpProbe()
+        self.per_host = per_host
+        self.interval = interval
+        self.budget = budget
+        self.history = history
+        if budget is not None and history is not None:
+            for key, site, when in history.restocks(since=time.time() - budget.history_days * 86400):
+                budget.record_restock(key, site, when)
+        self.targets = []
+        self._timers = []
+        self._seq = itertools.count()
+        self._host_limits = {}
+        self._probe_pool = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="probe")
+        self._checkout_pool = concurrent.futures.ThreadPoolExecutor(max_workers=checkout_workers, thread_name_prefix="checkout")
+        # main() of crawlers without probe support: it polls in the browser for as long as it takes
+        self._main_pool = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="main")
+        self._checkouts = []
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._queued = 0
+        self._running = 0
+        self._wake = None
+        self._loop = None
+        self._stopped = False
+        self.registry = WatchRegistry()
+        self.listings = []
+        for crawler, url in (multi_dic or {}).items():
+            self.add(crawler, url)
+        for url in listings or []:
+            self.add_listing(url)
+
+    def add(self, crawler: GlobalScrape, url: str, delay: float = 0, priority: int = None) -> WatchTarget:
+        """
+        registers a target, first poll after delay seconds. If its product is already
+        being polled, it subscribes to that poller instead.
+        priority: order among targets for the same product once it's in stock, highest first.
+                  Defaults to crawler.priority
+        """
+        target = WatchTarget(crawler, url, crawler.priority if priority is None else priority)
+        crawler.start_watch()
+        self.targets.append(target)
+        if self.registry.subscribe(target, target.priority):
+            self._schedule(target, delay)
+        else:
+            target.state = "subscribed"
+        return target
+
+    def add_listing(self, url: str, crawler: GlobalScrape = None, delay: float = 0) -> ListingTarget:
+        """
+        polls a category/search results page instead of the product pages on it. Watched products
+        the listing shows out of stock are parked; their product page is only polled again when
+        the listing shows them in stock, or stops showing them.
+        crawler: reads the listing (listing_check). Defaults to a watching crawler on the same host.
+        Raises ValueError if there's no crawler given and none watching that host.
+        """
+        if crawler is None:
+            host = urlsplit(url).netloc
+            crawler = next((t.crawler for t in self.targets if t.host == host), None)
+            if crawler is None:
+                raise ValueError("no target on {} to read listing {} with, add one first or pass crawler".format(host, url))
+        listing = ListingTarget(crawler, url)
+        self.listings.append(listing)
+        self._schedule(listing, delay)
+        return listing
+
+    def _schedule(self, target, delay: float) -> None:
+        target.timer = next(self._seq)
+        heapq.heappush(self._timers, (time.monotonic() + delay, target.timer, target))
+        if self._wake is not None:
+            self._wake.set()
+
+    def _next_delay(self, target) -> float:
+        if self.budget is None:
+            return random.uniform(*self.interval)
+        return self.budget.interval(target, self._active())
+
+    def _active(self) -> list:
+        """
+        everything still making requests: pollers and listings.
+        """
+        return [t for t in self.targets if t.state in ("waiting", "polling")] + self.listings
+
+    def budget_split(self) -> dict:
+        """
+        how the budget is shared out between sites and targets right now (see PollBudget.split)
+        """
+        return self.budget.split(self._active()) if self.budget is not None else {}
+
+    def _limit(self, host: str) -> asyncio.Semaphore:
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    def _probe(self, target: WatchTarget) -> bool:
+        probe = target.crawler.probe if target.crawler.probe is not None else self.probe
+        return target.crawler.probe_check(probe, target.url)
+
+    async def _poll(self, target: WatchTarget) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._limit(target.host):
+            target.state = "polling"
+            self._in_flight += 1
+            started = time.monotonic()
+            try:
+                available = await loop.run_in_executor(self._probe_pool, self._probe, target)
+            except NotImplementedError:
+                # crawler has no probe support, hand the whole blocking main() over instead
+                for subscriber in self._hand_over(target):
+                    self._submit(subscriber, subscriber.crawler.main, self._main_pool)
+                return
+            except Exception as e:
+                target.errors += 1
+                target.last_error = e
+                available = None
+            finally:
+                self._in_flight -= 1
+        self._record(target, available is not None)
+        if self.history is not None:
+            self.history.probe(target.key, target.site, available, time.monotonic() - started)
+        target.polls += 1
+        self.registry.polled(target.key)
+        if available:
+            if self.budget is not None:
+                self.budget.record_restock(target.key, target.site)
+            # highest priority first, so its checkout takes the first free worker
+            for subscriber in self._hand_over(target):
+                subscriber.crawler.mark_detected()
+                self._submit(subscriber, subscriber.crawler.checkout)
+        elif not self._stopped:
+            target.state = "waiting"
+            self._schedule(target, self._next_delay(target))
+
+    def _record(self, target, ok: bool) -> None:
+        if self.budget is None:
+            return
+        if ok:
+            self.budget.succeeded(target.site)
+        else:
+            self.budget.failed(target.site, target.last_error)
+
+    def _list(self, listing: ListingTarget) -> dict[str, bool]:
+        probe = listing.crawler.probe if listing.crawler.probe is not None else self.probe
+        return listing.crawler.listing_check(probe, listing.url)
+
+    async def _scan(self, listing: ListingTarget) -> None:
+        loop = asyncio.get_running_loop()
+        async with self._limit(listing.host):
+            self._in_flight += 1
+            started = time.monotonic()
+            try:
+                stock = await loop.run_in_executor(self._probe_pool, self._list, listing)
+            except NotImplementedError:
+                # crawler can't read listings, its products go back to being polled one by one
+                self._apply_listing(listing, {})
+                return
+            except Exception as e:
+                listing.errors += 1
+                listing.last_error = e
+                stock = None
+            finally:
+                self._in_flight -= 1
+        self._record(listing, stock is not None)
+        stock = stock if stock is not None else {}
+        if self.history is not None:
+            elapsed = time.monotonic() - started
+            for key, in_stock in stock.items():
+                self.history.probe(key, listing.site, in_stock, elapsed, listing=True)
+        listing.scans += 1
+        self._apply_listing(listing, stock)
+        if not self._stopped and any(t.state in ("waiting", "polling", "listed") for t in self.targets):
+            self._schedule(listing, self._next_delay(listing))
+
+    def _apply_listing(self, listing: ListingTarget, stock: dict[str, bool]) -> None:
+        listing.replaced += sum(1 for key in listing.covers if self._poller(key, "listed"))
+        # gone from the listing (or it couldn't be read): back to polling the product page
+        for key in listing.covers - stock.keys():
+            poller = self._poller(key, "listed")
+            if poller is not None:
+                poller.state = "waiting"
+                self._schedule(poller, self._next_delay(poller))
+        listing.covers = set()
+        for key, in_stock in stock.items():
+            poller = self._poller(key, "waiting", "listed")
+            if poller is None:
+                continue
+            listing.covers.add(key)
+            if not in_stock:
+                # dropping the timer parks it
+                poller.state = "listed"
+                poller.timer = None
+            elif poller.state == "listed" or not listing.stock.get(key):
+                # confirm on the product page straight away
+                poller.state = "waiting"
+                self._schedule(poller, 0)
+        listing.stock = stock
+
+    def _poller(self, key: str, *states: str) -> WatchTarget:
+        watch = self.registry.watches.get(key)
+        if watch is None or watch.poller is None or watch.poller.state not in states:
+            return None
+        return watch.poller
+
+    def _hand_over(self, poller: WatchTarget) -> list[WatchTarget]:
+        """
+        the poller's product is done polling: every target still waiting on it, in checkout order.
+        """
+        self.registry.release(poller.key)
+        return [t for t in self.registry.subscribers(poller.key) if t is poller or t.state == "subscribed"]
+
+    def _submit(self, target: WatchTarget, func, pool: concurrent.futures.Executor = None) -> None:
+        target.state = "queued"
+        with self._lock:
+            self._queued += 1
+        pool = pool if pool is not None else self._checkout_pool
+        self._checkouts.append(pool.submit(self._run_checkout, target, func))
+
+    def _run_checkout(self, target: WatchTarget, func) -> None:
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+        target.state = "checking out"
+        started = time.time()
+        try:
+            target.result = func(target.url)
+            target.state = "done"
+        except Exception as e:
+            target.last_error = e
+            target.state = "failed"
+        finally:
+            # give the browser back so the next in-stock target can use it
+            target.crawler.close()
+            with self._lock:
+                self._running -= 1
+            if self.history is not None:
+                self.history.checkout(target.key, target.site, target.crawler.name,
+                                      target.state == "done" and target.result is not False,
+                                      target.crawler.detected_at, time.time() - started,
+                                      str(target.last_error) if target.state == "failed" else None)
+
+    def stats(self) -> dict:
+        """
+        live snapshot of the scheduler.
+        """
+        states = {}
+        for target in self.targets:
+            states[target.state] = states.get(target.state, 0) + 1
+        with self._lock:
+            queued, running = self._queued, self._running
+        return {
+            "targets": len(self.targets),
+            "states": states,
+            "in_flight_probes": self._in_flight,
+            "timers": len(self._timers),
+            "checkout_queue_depth": queued,
+            "checkouts_running": running,
+            "polls": sum(t.polls for t in self.targets),
+            "errors": sum(t.errors for t in self.targets),
+            # polls answered by a 304 or an unchanged stock region, no parsing needed
+            "polls_skipped": sum(t.crawler.changes.skipped() for t in self.targets),
+            # polls shared between targets watching the same product
+            "polls_saved": self.registry.stats()["polls_saved"],
+            # product polls parked behind listing pages
+            "listing_scans": sum(listing.scans for listing in self.listings),
+            "polls_replaced": sum(listing.replaced for listing in self.listings),
+        }
+
+    def stop(self) -> None:
+        """
+        stops polling; checkouts already handed over are left to finish.
+        """
+        self._stopped = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def run(self, until_stopped: bool = False) -> list[WatchTarget]:
+        """
+        Polls until every target has been handed to checkout (or stop() is called),
+        then waits for the checkouts to finish.
+        until_stopped: keep running with nothing left to poll, for targets added later
+                       (from other threads via loop.call_soon_threadsafe(scheduler.add, ...))
+        """
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        polls = set()
+        while not self._stopped and (until_stopped or self._timers or polls):
+            now = time.monotonic()
+            while self._timers and self._timers[0][0] <= now:
+                _, seq, target = heapq.heappop(self._timers)
+                if seq != target.timer:
+                    # rescheduled or parked since
+                    continue
+                wait = self.budget.acquire(target.site) if self.budget is not None else 0
+                if wait > 0:
+                    # over budget (or the site is paused), try again once there's room
+                    self._schedule(target, wait)
+                    continue
+                target.timer = None
+                task = asyncio.create_task(self._scan(target) if isinstance(target, ListingTarget) else self._poll(target))
+                polls.add(task)
+                task.add_done_callback(polls.discard)
+                task.add_done_callback(lambda _: self._wake.set())
+            timeout = self._timers[0][0] - now if self._timers else None
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for task in list(polls):
+            task.cancel()
+        await self._loop.run_in_executor(None, concurrent.futures.wait, list(self._checkouts))
+        self._checkout_pool.shutdown()
+        self._main_pool.shutdown()
+        self._probe_pool.shutdown()
+        return self.targets
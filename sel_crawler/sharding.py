@@ -0,0 +1,500 @@
+"""
+Splits watch targets across worker processes, on this machine or others, with no broker:
+the coordinator listens on a tcp port and workers connect to it.
+
+Protocol: one json object per line.
+    worker -> coordinator  {"type": "hello", "worker": id, "capacity": n}
+                           {"type": "heartbeat", "targets": {target id: {...}}, "stats": {...}, "metrics": {...}}
+    coordinator -> worker  {"type": "assign", "targets": [spec, ...]}
+                           {"type": "stop"}
+
+Run a worker on another box with
+    python -m sel_crawler.sharding --connect coordinator-host:port --details details.json
+
+Specs only carry the site's crawler class name, url, product key and priority. Workers only
+build the crawlers in crawler_classes() (Game, Argos and the shipped site definitions), nothing
+named on the wire gets imported. Contact, payment and login
+details never go over the connection, which is plain tcp with no authentication: each worker
+reads them locally (spawn() hands them to its processes directly). Keep the coordinator on
+localhost or a network you trust.
+"""
+import argparse
+import asyncio
+import dataclasses
+import importlib
+import inspect
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from .core.metrics import Metrics
+from .core.personal_details import ContactDetails, PaymentDetails, LoginDetails
+from .core.websites import GlobalScrape, Game, Argos
+from .core.sites import site_classes
+from .scheduler import PollScheduler
+
+# target states a worker reports that mean checkout has started: never handed to another worker
+CHECKING_OUT = ("queued", "checking out")
+# "broken": the worker couldnt build the target's crawler
+FINISHED = ("done", "failed", "lost", "broken")
+
+def target_spec(crawler: GlobalScrape, url: str) -> dict:
+    """
+    what goes over the wire for a target: which crawler to build and what it watches, no personal details.
+    """
+    return {"site": type(crawler).__name__,
+            "url": url,
+            "key": crawler.watch_key(url),
+            "priority": crawler.priority}
+
+def local_details(crawler: GlobalScrape) -> dict:
+    """
+    the rest of what rebuilding crawler takes, kept on this machine (see ShardWorker's details).
+    """
+    def plain(details):
+        return dataclasses.asdict(details) if details is not None else None
+
+    return {"path": crawler.PATH,
+            "headless": crawler.profile.headless,
+            "contact": plain(crawler.contact_details),
+            "payment": plain(crawler.payment_details),
+            "login": plain(crawler.login)}
+
+def load_details(path: str) -> dict:
+    """
+    reads a worker's details file: json with any of "contact", "payment" and "login" (the
+    dataclasses' fields), "path" and "headless", used for every target the worker gets.
+    """
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def load(name: str):
+    """
+    'package.module:attr' -> attr. Only for names given on this machine (--factory), never ones off the wire.
+    """
+    module, _, attr = name.partition(':')
+    return getattr(importlib.import_module(module), attr)
+
+def crawler_classes() -> dict[str, type]:
+    """
+    the crawler classes a worker will build, by the name specs use: the coded ones and one per
+    shipped site definition (plus any definitions this process loaded itself).
+    """
+    classes = {cls.__name__: cls for cls in (Game, Argos)}
+    for cls in site_classes():
+        classes.setdefault(cls.__name__, cls)
+    return classes
+
+def build_crawler(spec: dict, metrics: Metrics) -> GlobalScrape:
+    """
+    default worker side factory: the spec's site class with chrome from its own pool.
+    spec: the coordinator's spec with the worker's local details merged in.
+    Raises ValueError for a site that isn't one of crawler_classes().
+    """
+    cls = crawler_classes().get(spec["site"])
+    if cls is None:
+        raise ValueError("unknown site {!r}, workers only build {}".format(spec["site"], ', '.join(sorted(crawler_classes()))))
+    kwargs = {"contact": ContactDetails(**spec["contact"]) if spec.get("contact") else None,
+              "payment": PaymentDetails(**spec["payment"]) if spec.get("payment") else None,
+              "login": LoginDetails(**spec["login"]) if spec.get("login") else None,
+              "headless": spec.get("headless", True),
+              "metrics": metrics}
+    accepted = inspect.signature(cls).parameters
+    crawler = cls(spec.get("path"), **{k: v for k, v in kwargs.items() if k in accepted})
+    crawler.priority = spec.get("priority", 0)
+    return crawler
+
+def _send(conn: socket.socket, lock: threading.Lock, message: dict) -> None:
+    data = (json.dumps(message, default=str) + '\n').encode()
+    with lock:
+        conn.sendall(data)
+
+class _Target:
+    def __init__(self, target_id: str, crawler: GlobalScrape, url: str) -> None:
+        self.id = target_id
+        self.crawler = crawler
+        self.url = url
+        self.spec = dict(target_spec(crawler, url), id=target_id)
+        self.worker = None
+        self.state = "unassigned"
+        self.result = None
+        self.error = None
+        self.polls = 0
+        self.errors = 0
+        self.assignments = 0
+
+class _Worker:
+    def __init__(self, worker_id: str, conn: socket.socket, capacity: int) -> None:
+        self.id = worker_id
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.capacity = capacity
+        self.last_seen = time.monotonic()
+        self.targets = set()
+        self.stats = {}
+        self.metrics = None
+        self.alive = True
+
+class ShardCoordinator:
+    """
+    Hands targets out to workers, least loaded first (targets for one product together), and keeps track of them through
+    heartbeats. When a worker dies (connection drops, or no heartbeat within `timeout`)
+    its targets go to the others, except ones already checking out, which are marked
+    lost rather than risk buying twice. Worker metrics and stats are merged.
+    """
+    def __init__(self,
+                 multi_dic: dict[GlobalScrape, str],
+                 host: str = '127.0.0.1',
+                 port: int = 0,
+                 heartbeat: float = 1.0,
+                 timeout: float = 5.0,
+                 settle: float = 15.0,
+                 bot = None
+                 ) -> None:
+        """
+        multi_dic: crawlers and their destination urls (same shape as MultiInstance). The crawlers
+                   themselves never launch a browser here, they're rebuilt inside the workers.
+        host, port: where workers connect. port 0 picks a free one (see self.address)
+        heartbeat: seconds between worker heartbeats.
+        timeout: seconds without a heartbeat before a worker counts as dead.
+        settle: after spawn(), seconds to wait for every spawned worker to join before handing
+                out targets, so the first to start doesn't get them all.
+        bot: notification Dispatcher/backend for stock found and checkout results (optional)
+        """
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.settle = settle
+        self.bot = bot
+        self._expected = 0
+        self._spawned_at = None
+        self.targets = {}
+        for i, (crawler, url) in enumerate(multi_dic.items()):
+            target_id = '{}-{}'.format(crawler.SITE or type(crawler).__name__.lower(), i)
+            self.targets[target_id] = _Target(target_id, crawler, url)
+        self.workers = {}
+        self._lock = threading.Condition()
+        self._stopped = False
+        self._server = socket.create_server((host, port))
+        self.address = self._server.getsockname()[:2]
+        self._processes = []
+        threading.Thread(target=self._accept, name="shard-accept", daemon=True).start()
+        threading.Thread(target=self._monitor, name="shard-monitor", daemon=True).start()
+
+    def spawn(self, n: int, **worker_kwargs) -> list[multiprocessing.Process]:
+        """
+        starts n local worker processes connected to this coordinator.
+        worker_kwargs: passed on to ShardWorker (capacity, factory, per_host, checkout_workers, interval)
+        Each process gets the targets' details through its arguments, never over the socket.
+        """
+        details = {"targets": {t.id: local_details(t.crawler) for t in self.targets.values()}}
+        context = multiprocessing.get_context('spawn')
+        with self._lock:
+            self._expected += n
+            self._spawned_at = time.monotonic()
+        for _ in range(n):
+            process = context.Process(target=run_worker, args=(self.address,), kwargs=dict(worker_kwargs, heartbeat=self.heartbeat, details=details), daemon=True)
+            process.start()
+            self._processes.append(process)
+        return self._processes
+
+    def _accept(self) -> None:
+        while not self._stopped:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        worker = None
+        try:
+            for line in conn.makefile('r', encoding='utf-8'):
+                message = json.loads(line)
+                if message["type"] == "hello":
+                    worker = _Worker(message["worker"], conn, message.get("capacity"))
+                    with self._lock:
+                        self.workers[worker.id] = worker
+                    print("worker {} joined".format(worker.id))
+                    self._assign()
+                elif message["type"] == "heartbeat" and worker is not None:
+                    self._heartbeat(worker, message)
+        except (OSError, ValueError):
+            pass
+        finally:
+            if worker is not None:
+                self._lost(worker, "disconnected")
+
+    def _heartbeat(self, worker: _Worker, message: dict) -> None:
+        events = []
+        with self._lock:
+            worker.last_seen = time.monotonic()
+            worker.stats = message.get("stats", {})
+            worker.metrics = message.get("metrics")
+            for target_id, report in message.get("targets", {}).items():
+                target = self.targets.get(target_id)
+                if target is None or target.worker != worker.id or target.state in FINISHED:
+                    continue
+                if report["state"] in CHECKING_OUT + ("done", "failed") and target.state not in CHECKING_OUT:
+                    events.append((target, "detected"))
+                if report["state"] in ("done", "failed", "broken"):
+                    events.append((target, report["state"]))
+                target.state = report["state"]
+                target.result = report.get("result")
+                target.error = report.get("error")
+                target.polls = report.get("polls", 0)
+                target.errors = report.get("errors", 0)
+            self._lock.notify_all()
+        for target, event in events:
+            self._notify(target, event)
+
+    def _notify(self, target: _Target, event: str) -> None:
+        print("{} {} on {}".format(target.id, event, target.worker))
+        if self.bot is None:
+            return
+        if event == "detected":
+            self.bot.send_notif(target.crawler.SITE, target.url)
+        elif event == "broken":
+            if hasattr(self.bot, 'notify'):
+                self.bot.notify('{} couldnt start on {} ({})'.format(target.id, target.worker, target.error))
+        elif hasattr(self.bot, 'notify'):
+            self.bot.notify('{} checkout {} at {}'.format(target.id, 'succeeded' if target.result else 'failed', target.url))
+
+    def _lost(self, worker: _Worker, why: str) -> None:
+        with self._lock:
+            if not worker.alive:
+                return
+            worker.alive = False
+            for target_id in worker.targets:
+                target = self.targets[target_id]
+                if target.state in FINISHED:
+                    continue
+                if target.state in CHECKING_OUT:
+                    # it may have gone through, don't risk a second order
+                    target.state = "lost"
+                else:
+                    target.state = "unassigned"
+                    target.worker = None
+            worker.targets = set()
+            self._lock.notify_all()
+        try:
+            worker.conn.close()
+        except OSError:
+            pass
+        if not self._stopped:
+            print("worker {} {}, reassigning its targets".format(worker.id, why))
+            self._assign()
+
+    def _monitor(self) -> None:
+        while not self._stopped:
+            time.sleep(self.heartbeat)
+            now = time.monotonic()
+            with self._lock:
+                silent = [w for w in self.workers.values() if w.alive and now - w.last_seen > self.timeout]
+            for worker in silent:
+                self._lost(worker, "missed heartbeats")
+            # picks up targets nobody could take before (all workers full, or still settling)
+            self._assign()
+
+    def _assign(self) -> None:
+        batches = {}
+        with self._lock:
+            live = [w for w in self.workers.values() if w.alive]
+            if len(self.workers) < self._expected and time.monotonic() - self._spawned_at < self.settle:
+                return
+            for target in self.targets.values():
+                if target.state != "unassigned":
+                    continue
+                free = [w for w in live if w.capacity is None or len(w.targets) < w.capacity]
+                if not free:
+                    break
+                # same product on the same worker, so its scheduler polls it once for all of them
+                same = [w for w in free if any(self.targets[t].spec["key"] == target.spec["key"] for t in w.targets)]
+                worker = min(same or free, key=lambda w: len(w.targets))
+                worker.targets.add(target.id)
+                target.worker = worker.id
+                target.state = "assigned"
+                target.assignments += 1
+                batches.setdefault(worker.id, (worker, []))[1].append(target.spec)
+        for worker, specs in batches.values():
+            try:
+                _send(worker.conn, worker.send_lock, {"type": "assign", "targets": specs})
+            except OSError:
+                self._lost(worker, "unreachable")
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        blocks until every target is done, failed or lost. False on timeout.
+        """
+        with self._lock:
+            return self._lock.wait_for(lambda: all(t.state in FINISHED for t in self.targets.values()), timeout)
+
+    def run(self, workers: int = 0, timeout: float = None, **worker_kwargs) -> dict:
+        """
+        spawns `workers` local processes (remote ones can join too), waits for every target
+        to finish, then stops everything. Returns stats().
+        """
+        if workers:
+            self.spawn(workers, **worker_kwargs)
+        try:
+            self.wait(timeout)
+        finally:
+            self.stop()
+        return self.stats()
+
+    def metrics(self) -> Metrics:
+        """
+        every worker's latest metrics added together.
+        """
+        with self._lock:
+            snapshots = [w.metrics for w in self.workers.values() if w.metrics]
+        return Metrics.merged(snapshots)
+
+    def stats(self) -> dict:
+        with self._lock:
+            merged = {}
+            for worker in self.workers.values():
+                for key, value in worker.stats.items():
+                    if isinstance(value, (int, float)):
+                        merged[key] = merged.get(key, 0) + value
+            return {"workers": {w.id: {"alive": w.alive, "targets": len(w.targets)} for w in self.workers.values()},
+                    "targets": {t.id: {"state": t.state, "worker": t.worker, "result": t.result, "polls": t.polls,
+                                       "errors": t.errors, "error": t.error, "assignments": t.assignments} for t in self.targets.values()},
+                    "scheduler": merged}
+
+    def stop(self) -> None:
+        """
+        tells every worker to stop (checkouts in progress finish) and closes the listener.
+        """
+        self._stopped = True
+        with self._lock:
+            workers = [w for w in self.workers.values() if w.alive]
+        for worker in workers:
+            try:
+                _send(worker.conn, worker.send_lock, {"type": "stop"})
+            except OSError:
+                pass
+        self._server.close()
+        for process in self._processes:
+            process.join(self.timeout)
+
+class ShardWorker:
+    """
+    Runs the targets a coordinator assigns it on its own PollScheduler, heartbeating their
+    state, scheduler stats and metrics back. Stops polling when told to or when the
+    coordinator goes away.
+    """
+    def __init__(self,
+                 address: tuple[str, int],
+                 worker_id: str = None,
+                 capacity: int = None,
+                 heartbeat: float = 1.0,
+                 factory = None,
+                 details = None,
+                 **scheduler_kwargs
+                 ) -> None:
+        """
+        address: (host, port) of the coordinator.
+        worker_id: defaults to hostname-pid.
+        capacity: most targets this worker takes (None for no limit)
+        factory: (spec, metrics) -> crawler, or 'module:function' naming one. Defaults to build_crawler.
+        details: this machine's contact/payment/login details, path and headless, merged into every
+                 spec before the factory sees it. A dict or the path of a json file (see load_details);
+                 a "targets" entry maps target ids to details of their own.
+        scheduler_kwargs: passed on to PollScheduler (per_host, checkout_workers, interval)
+        """
+        self.address = tuple(address)
+        self.id = worker_id if worker_id else '{}-{}'.format(socket.gethostname(), os.getpid())
+        self.capacity = capacity
+        self.heartbeat = heartbeat
+        self.factory = load(factory) if isinstance(factory, str) else (factory if factory else build_crawler)
+        self.details = load_details(details) if isinstance(details, str) else dict(details or {})
+        self.metrics = Metrics()
+        self.scheduler = PollScheduler(**scheduler_kwargs)
+        self.targets = {}
+        # target id -> why its crawler couldnt be built
+        self.broken = {}
+        self._stop = threading.Event()
+
+    def _local_spec(self, spec: dict) -> dict:
+        local = dict(spec)
+        local.update((k, v) for k, v in self.details.items() if k != "targets")
+        local.update(self.details.get("targets", {}).get(spec["id"], {}))
+        return local
+
+    def _report(self) -> dict:
+        targets = {target_id: {"state": t.state, "polls": t.polls, "errors": t.errors,
+                               "result": t.result, "error": str(t.last_error) if t.last_error else None}
+                   for target_id, t in list(self.targets.items())}
+        targets.update((target_id, {"state": "broken", "polls": 0, "errors": 1, "result": None, "error": error})
+                       for target_id, error in list(self.broken.items()))
+        stats = self.scheduler.stats()
+        stats.pop("states", None)
+        return {"type": "heartbeat", "targets": targets, "stats": stats, "metrics": self.metrics.snapshot()}
+
+    def run(self) -> None:
+        conn = socket.create_connection(self.address)
+        lock = threading.Lock()
+        loop = asyncio.new_event_loop()
+        polling = threading.Thread(target=loop.run_until_complete, args=(self.scheduler.run(until_stopped=True),), daemon=True)
+        polling.start()
+
+        def beat():
+            while not self._stop.wait(self.heartbeat):
+                try:
+                    _send(conn, lock, self._report())
+                except OSError:
+                    return
+
+        def add(target_id, crawler, url):
+            self.targets[target_id] = self.scheduler.add(crawler, url)
+
+        _send(conn, lock, {"type": "hello", "worker": self.id, "capacity": self.capacity})
+        threading.Thread(target=beat, daemon=True).start()
+        try:
+            for line in conn.makefile('r', encoding='utf-8'):
+                message = json.loads(line)
+                if message["type"] == "assign":
+                    for spec in message["targets"]:
+                        try:
+                            crawler = self.factory(self._local_spec(spec), self.metrics)
+                        except Exception as e:
+                            # one bad spec doesnt take the worker (and its other targets) down
+                            self.broken[spec["id"]] = "{}: {}".format(type(e).__name__, e)
+                            print("couldnt build {} ({})".format(spec["id"], self.broken[spec["id"]]))
+                            _send(conn, lock, self._report())
+                            continue
+                        loop.call_soon_threadsafe(add, spec["id"], crawler, spec["url"])
+                elif message["type"] == "stop":
+                    break
+        except (OSError, ValueError):
+            pass
+        finally:
+            # no coordinator, no polling. Checkouts already started are left to finish.
+            self.scheduler.stop()
+            polling.join()
+            self._stop.set()
+            try:
+                _send(conn, lock, self._report())
+            except OSError:
+                pass
+            conn.close()
+
+def run_worker(address: tuple[str, int], **kwargs) -> None:
+    """
+    process entry point for ShardCoordinator.spawn.
+    """
+    ShardWorker(address, **kwargs).run()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="run a shard worker")
+    parser.add_argument('--connect', required=True, help='coordinator host:port')
+    parser.add_argument('--capacity', type=int, help='most targets to take on')
+    parser.add_argument('--factory', help='module:function building crawlers from specs')
+    parser.add_argument('--details', help='json file with this machine\'s contact/payment/login details')
+    parser.add_argument('--checkout-workers', type=int, default=2)
+    args = parser.parse_args()
+
+    host, _, port = args.connect.rpartition(':')
+    run_worker((host, int(port)), capacity=args.capacity, factory=args.factory, details=args.details, checkout_workers=args.checkout_workers)
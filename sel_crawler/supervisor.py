@@ -0,0 +1,265 @@
+import threading
+import signal
+import time
+from .core.websites import GlobalScrape, Cancelled
+from .core.checkout import OrderUncertain
+from .core.history import HistoryStore
+
+# states a crawler is still live in
+LIVE = ("starting", "running", "backoff")
+
+class _Run:
+    def __init__(self, crawler: GlobalScrape, url: str) -> None:
+        self.crawler = crawler
+        self.url = url
+        self.key = crawler.watch_key(url)
+        self.state = "starting"
+        self.attempts = 0
+        self.restarts = 0
+        self.result = None
+        self.error = None
+        # why it was cancelled, becomes the final state
+        self.reason = None
+        self.started = None
+        self.attempt_started = None
+        self.thread = None
+
+class Supervisor:
+    """
+    Runs each crawler's main() on its own thread and looks after it: a crawler that crashes
+    (chrome dying, an unexpected exception) is restarted on a fresh browser after a backoff,
+    one that runs past its wall clock timeout or hangs in a checkout step is stopped, one whose
+    final click failed part way is never restarted (it may have bought already), and on
+    Ctrl-C/SIGTERM every crawler is cancelled, browsers quit and notification/screenshot
+    queues flushed. Once a checkout succeeds, other crawlers watching the same product can be
+    cancelled.
+    """
+    def __init__(self,
+                 multi_dic: dict[GlobalScrape, str],
+                 restarts: int = 3,
+                 backoff: float = 5.0,
+                 max_backoff: float = 300.0,
+                 timeout: float = None,
+                 step_timeout: float = 120.0,
+                 cancel_siblings: bool = True,
+                 report_every: float = None,
+                 history: HistoryStore = None
+                 ) -> None:
+        """
+        multi_dic: crawlers and their destination urls (same shape as MultiInstance)
+        restarts: times a crawler is restarted after crashing (or its checkout failing) before it counts as failed.
+        backoff: seconds before the first restart, doubling each time up to max_backoff.
+        timeout: wall clock seconds a crawler may run for in total, None for no limit.
+        step_timeout: seconds a checkout step may go without progress (a poll counts) before its browser is
+                      quit and the crawler restarted.
+        cancel_siblings: cancel crawlers watching the same product once one checks out.
+        report_every: print status() every this many seconds (optional)
+        history: records every stock check the crawlers make and every checkout they get to (optional)
+        """
+        self.runs = [_Run(crawler, url) for crawler, url in multi_dic.items()]
+        self.restarts = restarts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.step_timeout = step_timeout
+        self.cancel_siblings = cancel_siblings
+        self.report_every = report_every
+        self.history = history
+        if history is not None:
+            for run in self.runs:
+                if run.crawler.history is None:
+                    run.crawler.history = history
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _watch(self, run: _Run) -> None:
+        crawler = run.crawler
+        while True:
+            run.attempts += 1
+            run.state = "running"
+            run.attempt_started = time.monotonic()
+            ok, error, uncertain = False, None, None
+            try:
+                ok = crawler.main(run.url)
+                if ok is not True and ok is not False:
+                    uncertain = "checkout returned {!r}".format(ok)
+                elif not ok:
+                    # a step before the final click gave up, nothing was bought
+                    error = "checkout didnt go through"
+            except Cancelled:
+                pass
+            except OrderUncertain as e:
+                uncertain = str(e)
+            except Exception as e:
+                error = "{}: {}".format(type(e).__name__, str(e).strip().splitlines()[0] if str(e).strip() else '')
+            finally:
+                # a browser that died is quit by the pool, the next attempt gets a fresh one
+                try:
+                    crawler.close()
+                except Exception:
+                    pass
+            self._record_checkout(run, ok, error or uncertain)
+            if ok:
+                run.result = True
+                run.state = "done"
+                print("{} checked out {}".format(crawler.name, run.url))
+                if self.cancel_siblings:
+                    self._cancel_siblings(run)
+                return
+            if uncertain is not None:
+                # restarting could buy a second time
+                run.error = uncertain
+                run.state = "unknown"
+                print("{} may or may not have checked out {} ({}), not restarting it".format(crawler.name, run.url, uncertain))
+                if hasattr(crawler.bot, 'notify'):
+                    crawler.bot.notify("{} may or may not have ordered {}, check the account".format(crawler.name, run.url))
+                if self.cancel_siblings:
+                    self._cancel_siblings(run)
+                return
+            if crawler.cancelled.is_set():
+                run.state = run.reason or "cancelled"
+                return
+            run.error = error
+            if run.restarts >= self.restarts:
+                run.state = "failed"
+                print("{} failed for good after {} attempts ({})".format(crawler.name, run.attempts, error))
+                return
+            delay = min(self.max_backoff, self.backoff * 2 ** run.restarts)
+            run.restarts += 1
+            run.state = "backoff"
+            print("{} crashed ({}), restarting in {:.0f}s".format(crawler.name, error, delay))
+            if crawler.cancelled.wait(delay):
+                run.state = run.reason or "cancelled"
+                return
+
+    def _record_checkout(self, run: _Run, ok: bool, error: str) -> None:
+        """
+        adds the attempt to the history if it got as far as seeing stock.
+        """
+        crawler = run.crawler
+        if self.history is None or crawler.detected_at is None:
+            return
+        if not ok and error is None and crawler.cancelled.is_set():
+            error = run.reason or "cancelled"
+        self.history.checkout(run.key, crawler.SITE, crawler.name, ok is True, crawler.detected_at,
+                              time.time() - crawler.detected_at, error)
+
+    def cancel(self, run: _Run, reason: str = "cancelled") -> None:
+        """
+        stops run's crawler for good; reason becomes its final state.
+        """
+        with self._lock:
+            if run.state not in LIVE or run.crawler.cancelled.is_set():
+                return
+            run.reason = reason
+        run.crawler.cancel()
+
+    def _cancel_siblings(self, done: _Run) -> None:
+        for run in self.runs:
+            if run is not done and run.key == done.key:
+                self.cancel(run, "cancelled (sibling checked out)")
+
+    def _check(self) -> None:
+        """
+        enforces the wall clock and step timeouts.
+        """
+        now = time.monotonic()
+        for run in self.runs:
+            if run.state not in LIVE:
+                continue
+            if self.timeout is not None and now - run.started > self.timeout:
+                print("{} ran past its {:.0f}s timeout".format(run.crawler.name, self.timeout))
+                self.cancel(run, "timed out")
+                continue
+            wait = run.crawler.wait
+            started = wait.step_started
+            if (self.step_timeout is not None and run.state == "running" and started is not None
+                    and started >= run.attempt_started and now - started > self.step_timeout):
+                run.error = "step {} hung for {:.0f}s".format(wait.current_step, now - started)
+                print("{}: {}, restarting it".format(run.crawler.name, run.error))
+                # only the first time this step is noticed
+                wait.step_started = None
+                run.crawler.abort()
+
+    def shutdown(self, reason: str = "shut down") -> None:
+        """
+        cancels every crawler; run() then cleans up and returns.
+        """
+        self._stop.set()
+        for run in self.runs:
+            self.cancel(run, reason)
+
+    def _cleanup(self, grace: float) -> None:
+        """
+        waits up to grace seconds for the crawler threads, then quits every browser and flushes
+        the notification and screenshot queues.
+        """
+        deadline = time.monotonic() + grace
+        for run in self.runs:
+            if run.thread is not None:
+                run.thread.join(max(0.0, deadline - time.monotonic()))
+        seen = set()
+        for run in self.runs:
+            crawler = run.crawler
+            for resource in (crawler.pool, crawler.bot, crawler.screenshots):
+                if resource is None or id(resource) in seen:
+                    continue
+                seen.add(id(resource))
+                try:
+                    if resource is crawler.pool:
+                        resource.close()
+                    elif resource is crawler.bot:
+                        resource.flush(grace)
+                    else:
+                        resource.flush()
+                except Exception as e:
+                    print("couldnt clean up {} ({})".format(type(resource).__name__, e))
+
+    def run(self, grace: float = 10.0) -> dict:
+        """
+        starts every crawler and blocks until all of them are done, failed or cancelled.
+        Ctrl-C/SIGTERM shut everything down (when called from the main thread).
+        grace: seconds given to crawler threads to wind down before browsers are quit.
+        Returns status().
+        """
+        handlers = {}
+        if threading.current_thread() is threading.main_thread():
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                handlers[sig] = signal.signal(sig, lambda signum, frame: self.shutdown("shut down (signal {})".format(signum)))
+        last_report = time.monotonic()
+        try:
+            for run in self.runs:
+                run.started = time.monotonic()
+                run.thread = threading.Thread(target=self._watch, args=(run,), name=run.crawler.name, daemon=True)
+                run.thread.start()
+            while any(run.thread.is_alive() for run in self.runs):
+                # short waits so signal handlers get to run
+                self._stop.wait(0.5)
+                self._check()
+                if self.report_every is not None and time.monotonic() - last_report >= self.report_every:
+                    last_report = time.monotonic()
+                    self.report()
+        finally:
+            self._stop.set()
+            self._cleanup(grace)
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+        return self.status()
+
+    def status(self) -> dict:
+        """
+        per crawler: url, state, attempts, restarts, current checkout step, seconds running, result, last error.
+        """
+        now = time.monotonic()
+        return {run.crawler.name: {"url": run.url, "state": run.state, "attempts": run.attempts,
+                                   "restarts": run.restarts,
+                                   "step": run.crawler.wait.current_step if run.state == "running" else None,
+                                   "elapsed": round(now - run.started, 1) if run.started is not None else 0.0,
+                                   "result": run.result, "error": run.error}
+                for run in self.runs}
+
+    def report(self) -> None:
+        for name, info in self.status().items():
+            print("{:<12} {:<32} attempts={} step={} {:.0f}s{}".format(
+                name, info["state"], info["attempts"], info["step"], info["elapsed"],
+                "  last error: {}".format(info["error"]) if info["error"] else ''))
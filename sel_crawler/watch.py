@@ -0,0 +1,70 @@
+import itertools
+
+class Watch:
+    """
+    Everything subscribed to one product: the first subscriber's target does the polling
+    for all of them.
+    """
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.poller = None
+        self.subscribers = []
+        self.polls = 0
+
+    def ordered(self) -> list:
+        """
+        subscribers highest priority first, then in the order they subscribed.
+        """
+        return [target for _, _, target in sorted(self.subscribers, key=lambda s: (-s[0], s[1]))]
+
+class WatchRegistry:
+    """
+    Keys watch targets by product (see GlobalScrape.watch_key) so that crawlers watching the
+    same product, for different accounts or payment details, share one poller instead of
+    each polling it. When the poller sees stock, every subscriber is handed over, highest
+    priority first.
+    """
+    def __init__(self) -> None:
+        self.watches = {}
+        self._seq = itertools.count()
+
+    def subscribe(self, target, priority: int = 0) -> bool:
+        """
+        adds target (anything with a .key) to its product's watch.
+        Returns True if target is the watch's poller, i.e. the first one for the product.
+        """
+        watch = self.watches.get(target.key)
+        if watch is None:
+            watch = self.watches[target.key] = Watch(target.key)
+        watch.subscribers.append((priority, next(self._seq), target))
+        if watch.poller is None:
+            watch.poller = target
+            return True
+        return False
+
+    def release(self, key: str) -> None:
+        """
+        the poller is done (stock found), the next target to subscribe polls again.
+        """
+        self.watches[key].poller = None
+
+    def polled(self, key: str) -> None:
+        self.watches[key].polls += 1
+
+    def subscribers(self, key: str) -> list:
+        """
+        everyone waiting on key, in the order they should check out.
+        """
+        return self.watches[key].ordered()
+
+    def stats(self) -> dict:
+        """
+        polls: polls actually made, one poller per product
+        polls_saved: polls that one poller per subscriber would have made on top
+        reduction: fraction of polls saved
+        """
+        subscribers = sum(len(w.subscribers) for w in self.watches.values())
+        polls = sum(w.polls for w in self.watches.values())
+        saved = sum(w.polls * (len(w.subscribers) - 1) for w in self.watches.values())
+        return {"products": len(self.watches), "subscribers": subscribers, "polls": polls,
+                "polls_saved": saved, "reduction": saved / (polls + saved) if polls + saved else 0.0}
@@ -0,0 +1,24 @@
+from sel_crawler.core.personal_details import ContactDetails, PaymentDetails, LoginDetails
+from sel_crawler.core.probe import HttpProbe
+from benchmarks.fixture_site import FixtureSite
+import pytest
+
+CONTACT = ContactDetails('Jane', 'Doe', 'jane@example.com', '07515365978', 'SW1A 1AA',
+                         '1', 'Cecilia Palace', 'Greater London', 'London')
+PAYMENT = PaymentDetails('VISA', '4111111111111111', 'J DOE', '04/27', '123')
+LOGIN = LoginDetails('jane@example.com', 'not-a-real-password')
+
+@pytest.fixture
+def fixtures():
+    """
+    benchmarks/fixtures served over http.server on localhost, everything out of stock.
+    """
+    site = FixtureSite()
+    yield site
+    site.close()
+
+@pytest.fixture
+def probe():
+    probe = HttpProbe(max_per_host=2)
+    yield probe
+    probe.close()
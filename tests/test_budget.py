@@ -0,0 +1,79 @@
+from sel_crawler.budget import PollBudget
+from sel_crawler.scheduler import PollScheduler
+from sel_crawler.core.probe import ProbeError
+from sel_crawler.core.websites import Game
+from tests.conftest import CONTACT, PAYMENT
+import threading
+import asyncio
+import time
+
+class Target:
+    def __init__(self, key: str, site: str, priority: int = 0) -> None:
+        self.key = key
+        self.site = site
+        self.priority = priority
+
+def test_bucket_lets_a_burst_through_then_refills_at_the_rate(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    budget = PollBudget(rpm=60, burst=2)
+    assert budget.acquire('game') == 0 and budget.acquire('game') == 0
+    # empty: one token a second at 60 rpm
+    assert budget.acquire('game') == 1.0
+    now[0] += 0.5
+    assert budget.acquire('game') == 0.5
+    now[0] += 0.5
+    assert budget.acquire('game') == 0
+    # a long idle spell refills no further than the burst
+    now[0] += 60
+    assert [budget.acquire('game') for _ in range(3)] == [0, 0, 1.0]
+
+def test_site_cap_holds_back_only_that_site(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    budget = PollBudget(rpm=600, per_site={'argos': 6}, burst=1)
+    assert budget.acquire('argos') == 0
+    assert budget.acquire('argos') == 10.0
+    # the global bucket is back after a tenth of a second, argos's isn't
+    now[0] += 0.1
+    assert budget.acquire('game') == 0
+    assert round(budget.acquire('argos'), 6) == 9.9
+
+def test_budget_is_split_by_weight_within_the_site_caps():
+    budget = PollBudget(rpm=60, per_site={'argos': 10}, min_interval=0.1)
+    targets = [Target('game:1', 'game'), Target('game:2', 'game', priority=1),
+               Target('argos:1', 'argos'), Target('argos:2', 'argos')]
+    split = budget.split(targets)
+    # argos would get half, its cap gives the rest to game
+    assert round(split['argos']['rpm'], 6) == 10
+    assert round(split['game']['rpm'], 6) == 50
+    game = split['game']['targets']
+    assert abs(game['game:2']['rpm'] / game['game:1']['rpm'] - 2) < 0.01
+    # a product that restocked before gets polled more
+    budget.record_restock('argos:1', 'argos')
+    argos = budget.split(targets)['argos']['targets']
+    assert argos['argos:1']['rpm'] > argos['argos:2']['rpm']
+
+def test_throttled_site_is_paused_for_retry_after():
+    budget = PollBudget(rpm=600)
+    budget.failed('argos', ProbeError('https://www.argos.co.uk/product/1', 429, retry_after=30))
+    assert 29 < budget.acquire('argos') <= 30
+    assert budget.acquire('game') == 0
+    assert budget.split([Target('argos:1', 'argos')])['argos']['backoff'] == 2
+
+def test_scheduler_stays_within_the_budget():
+    polled = []
+    scheduler = PollScheduler(budget=PollBudget(rpm=600, burst=1, min_interval=0.01, max_interval=0.05))
+    for i in range(5):
+        crawler = Game(None, CONTACT, PAYMENT)
+        crawler.probe_check = lambda probe, url: polled.append(time.monotonic()) or False
+        scheduler.add(crawler, 'https://www.game.co.uk/en/console-{}'.format(100000 + i))
+    thread = threading.Thread(target=asyncio.run, args=(scheduler.run(),))
+    thread.start()
+    time.sleep(1.05)
+    scheduler.stop()
+    thread.join(10)
+    # 10 a second, the one token it starts with aside
+    assert 8 <= len(polled) <= 12
+    gaps = [b - a for a, b in zip(polled, polled[1:])]
+    assert min(gaps) > 0.07
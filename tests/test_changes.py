@@ -0,0 +1,70 @@
+from sel_crawler.core.changes import ChangeDetector, region_html
+from sel_crawler.core.websites import Game
+from benchmarks.fake_driver import FakeDriver
+from tests.conftest import CONTACT, PAYMENT
+from selenium.webdriver.common.by import By
+
+def test_region_html():
+    html = '<div id="a"><div class="b c">x<div>y</div></div></div><div class="bc">no</div>'
+    assert region_html(html, '.b') == ['<div class="b c">x<div>y</div></div>']
+    assert region_html(html, '#a') == [html[:html.index('<div class="bc">')]]
+    assert region_html(html, '.missing') == []
+
+def test_unchanged_page_isnt_reparsed(fixtures, probe):
+    url = fixtures.url('game/product.html')
+    changes = ChangeDetector()
+    crawler = Game(None, CONTACT, PAYMENT)
+    evaluated = []
+
+    def evaluate(page):
+        evaluated.append(page)
+        return crawler.probe_available(url, page)
+
+    crawler = Game(None, CONTACT, PAYMENT)
+    evaluated = []
+
+    def evaluate(page):
+        evaluated.append(page)
+        return crawler.probe_available(url, page)
+
+    assert changes.check(probe, url, ['#mainPDPButtons'], evaluate) is False
+    # same etag -> 304, the last answer is reused without parsing
+    assert changes.check(probe, url, ['#mainPDPButtons'], evaluate) is False
+    assert changes.stats()[url]['not_modified'] == 1
+    assert len(evaluated) == 1
+    fixtures.restock('game/product.html')
+    assert changes.check(probe, url, ['#mainPDPButtons'], evaluate) is True
+    assert len(evaluated) == 2
+
+def test_check_driver_only_evaluates_changed_regions(fixtures):
+    url = fixtures.url('game/product.html')
+    driver = FakeDriver()
+    changes = ChangeDetector()
+    crawler = Game(None, CONTACT, PAYMENT)
+    evaluated = []
+
+    def evaluate():
+        evaluated.append(driver.current_url)
+        return crawler.product_available_in(lambda css: driver.find_elements(By.CSS_SELECTOR, css))
+
+    driver.get(url)
+    assert changes.check_driver(driver, ['#mainPDPButtons'], evaluate) is False
+    driver.refresh()
+    # same markup in the region: the last answer stands, no element lookups
+    finds = driver.commands['findElements']
+    assert changes.check_driver(driver, ['#mainPDPButtons'], evaluate) is False
+    assert len(evaluated) == 1 and driver.commands['findElements'] == finds
+    assert changes.stats()[('driver', '#mainPDPButtons')]['unchanged'] == 1
+    fixtures.restock('game/product.html')
+    driver.refresh()
+    assert changes.check_driver(driver, ['#mainPDPButtons'], evaluate) is True
+    assert len(evaluated) == 2
+
+def test_check_driver_evaluates_when_nothing_rendered():
+    driver = FakeDriver()
+    changes = ChangeDetector()
+    evaluated = []
+    # about:blank: no region markup, so nothing to compare against
+    for _ in range(2):
+        changes.check_driver(driver, ['#mainPDPButtons'], lambda: evaluated.append(1) or False)
+    assert len(evaluated) == 2
@@ -0,0 +1,129 @@
+from sel_crawler.core.websites import Game, Argos
+from sel_crawler.core.sites import load_site
+from sel_crawler.core.checkout import CheckoutRunner, Step, StepFailed, OrderUncertain
+from sel_crawler.core.screenshots import ScreenshotService
+from benchmarks.offline_bench import make_crawler
+import pytest
+
+@pytest.fixture
+def game(fixtures, tmp_path):
+    """
+    a Game crawler on the fake driver, with the fixture product in stock.
+    """
+    fixtures.restock('game/product.html')
+    drivers = []
+    screenshots = ScreenshotService(str(tmp_path))
+    crawler = make_crawler(Game, drivers, 0.0, 0.0, screenshots)
+    yield crawler, drivers
+    crawler.pool.close()
+    screenshots.close()
+
+def fail_once(action):
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise StepFailed("simulated failure")
+        action()
+    return flaky
+
+def test_resumes_at_failed_step(fixtures, game):
+    crawler, drivers = game
+    crawler.fill_checkout_p2 = fail_once(crawler.fill_checkout_p2)
+    assert crawler.checkout(fixtures.url('game/product.html'))
+
+    runs = [(t.step, t.ok) for t in crawler.transitions]
+    assert runs.count(('address', False)) == 1
+    # the retry picks up at address, nothing before it is done again
+    failed = runs.index(('address', False))
+    assert runs[failed + 1] == ('address', True)
+    done = [step for step, ok in runs if ok]
+    assert len(done) == len(set(done))
+    assert done[-1] == 'confirm'
+    assert sum(len(driver.orders) for driver in drivers) == 1
+
+def test_gives_up_after_retries_without_confirming(fixtures, game):
+    crawler, drivers = game
+
+    def broken():
+        raise StepFailed("always broken")
+    crawler.fill_checkout_p3 = broken
+    assert not crawler.checkout(fixtures.url('game/product.html'))
+    failures = [t for t in crawler.transitions if t.step == 'delivery']
+    assert len(failures) == 3 and not any(t.ok for t in failures)
+    assert 'confirm' not in [t.step for t in crawler.transitions]
+    assert sum(len(driver.orders) for driver in drivers) == 0
+
+def test_confirm_is_never_run_twice(fixtures, game):
+    """
+    a final click that errors part way may have placed the order, so it isn't clicked again
+    even though the pay button is still there.
+    """
+    crawler, drivers = game
+    steps = crawler.checkout_steps(fixtures.url('game/product.html'))
+    clicks = []
+    confirm = steps[-1]
+
+    def fails_mid_click():
+        clicks.append(1)
+        raise StepFailed("lost the page mid click")
+    steps[-1] = Step('confirm', fails_mid_click, confirm.detect)
+    with pytest.raises(OrderUncertain):
+        CheckoutRunner(steps, crawler.wait, crawler.on_transition).run()
+    assert len(clicks) == 1
+    # the pay button was still on the page for a retry to find
+    assert confirm.detect()
+
+@pytest.mark.parametrize('site', [Game, load_site('game')], ids=['coded', 'declared'])
+def test_failed_payment_is_not_skipped(fixtures, tmp_path, site):
+    """
+    the pay button is on the payment page before the card details are in: a failed payment
+    step is retried, never resumed at confirm.
+    """
+    fixtures.restock('game/product.html')
+    drivers = []
+    screenshots = ScreenshotService(str(tmp_path))
+    crawler = make_crawler(site, drivers, 0.0, 0.0, screenshots)
+    checkout_steps = crawler.checkout_steps
+
+    def broken():
+        raise StepFailed("card frame didnt load")
+
+    def steps(url):
+        steps = checkout_steps(url)
+        payment = [step.name for step in steps].index('payment')
+        steps[payment] = Step('payment', broken, steps[payment].detect)
+        return steps
+    crawler.checkout_steps = steps
+    try:
+        assert not crawler.checkout(fixtures.url('game/product.html'))
+        # still on the unfilled payment page, with the pay button showing
+        assert crawler.find_many_by_CSS('button .game-plr-xxl')
+        assert not checkout_steps(fixtures.url('game/product.html'))[-1].detect()
+    finally:
+        crawler.pool.close()
+        screenshots.close()
+    runs = [(t.step, t.ok) for t in crawler.transitions]
+    assert runs[-3:] == [('payment', False)] * 3
+    assert 'confirm' not in [step for step, _ in runs]
+    assert sum(len(driver.orders) for driver in drivers) == 0
+
+@pytest.mark.parametrize('coded', [Game, Argos], ids=['game', 'argos'])
+def test_definitions_match_the_coded_crawlers(coded):
+    """
+    the coded classes are the reference, the shipped definitions have to walk the same steps.
+    """
+    declared = load_site(coded.SITE)
+    assert [step.name for step in declared.DEFINITION.steps] == [step.name for step in coded.checkout_steps(
+        coded.__new__(coded), 'https://example.com')][1:]
+
+def test_resume_looks_no_further_than_the_failed_step():
+    on_page = {'a', 'b', 'c'}
+    steps = [Step(name, lambda: None, lambda name=name: name in on_page) for name in 'abc']
+    runner = CheckoutRunner(steps, None)
+    assert runner.locate() == 2
+    assert runner.locate(end=1) == 1
+    assert runner.locate(1, 1) == 1
+    on_page.clear()
+    assert runner.locate(end=2) is None
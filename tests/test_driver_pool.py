@@ -0,0 +1,131 @@
+from sel_crawler.core.driver_pool import DriverPool
+from sel_crawler.core.websites import Game
+from sel_crawler.core.profile import BrowserProfile
+from sel_crawler.core.screenshots import ScreenshotService
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.offline_bench import make_crawler
+import pytest
+import threading
+import atexit
+import time
+
+class DeadDriver:
+    """
+    what's left of a driver whose chromedriver was killed: every call fails at the connection.
+    """
+    def __getattr__(self, name):
+        raise ConnectionRefusedError("chromedriver is gone")
+
+    def quit(self):
+        raise ConnectionRefusedError("chromedriver is gone")
+
+def test_dead_driver_is_replaced_on_acquire():
+    drivers = [DeadDriver(), FakeDriver()]
+    pool = DriverPool(size=1, launch=lambda: drivers.pop(0))
+    pooled = pool.acquire()
+    with pool._cond:
+        # pretend it was released healthy and died while idle
+        pool._leased.discard(pooled)
+        pool._idle.append(pooled)
+    replacement = pool.acquire(timeout=1)
+    assert isinstance(replacement._driver, FakeDriver)
+    assert pool.stats()["leased"] == 1
+    pool.close()
+
+def test_release_of_dead_driver_frees_the_slot():
+    drivers = [DeadDriver(), FakeDriver()]
+    pool = DriverPool(size=1, launch=lambda: drivers.pop(0))
+    pool.release(pool.acquire())
+    assert pool.stats()["leased"] == 0
+    assert pool.stats()["recycled"] == 1
+    assert isinstance(pool.acquire(timeout=1)._driver, FakeDriver)
+    pool.close()
+
+def test_close_unregisters_from_atexit(monkeypatch):
+    registered = []
+    monkeypatch.setattr(atexit, 'register', registered.append)
+    monkeypatch.setattr(atexit, 'unregister', lambda f: registered.remove(f) if f in registered else None)
+    pool = DriverPool(size=1, launch=FakeDriver)
+    assert registered == [pool.close]
+    pool.close()
+    pool.close()
+    assert registered == []
+
+class SlowDriver(FakeDriver):
+    """
+    a chromedriver that stops answering the health check until let go.
+    """
+    def __init__(self) -> None:
+        super().__init__(0.0, 0.0)
+        self.hang = threading.Event()
+        self.checking = threading.Event()
+
+    @property
+    def window_handles(self) -> list[str]:
+        self.checking.set()
+        self.hang.wait(10)
+        return super().window_handles
+
+def test_health_check_doesnt_hold_the_pool_lock():
+    slow = SlowDriver()
+    drivers = [slow, FakeDriver()]
+    pool = DriverPool(size=2, launch=lambda: drivers.pop(0))
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    acquiring = threading.Thread(target=pool.acquire)
+    acquiring.start()
+    assert slow.checking.wait(5)
+    start = time.monotonic()
+    # the other lease goes back while the first driver's health check hangs
+    pool.release(second)
+    assert pool.stats()["idle"] == 1
+    assert time.monotonic() - start < 1
+    slow.hang.set()
+    acquiring.join(5)
+    pool.close()
+
+def test_long_watch_recycles_between_polls(fixtures, tmp_path):
+    """
+    the product page is refreshed under one lease; the browser is swapped once it passes max_navigations.
+    """
+    fixtures.sell_out()
+    drivers = []
+    screenshots = ScreenshotService(str(tmp_path))
+    crawler = make_crawler(Game, drivers, 0.0, 0.0, screenshots)
+    crawler.pool.max_navigations = 3
+    url = fixtures.url('game/product.html')
+    restock = threading.Timer(1.0, fixtures.restock, args=('game/product.html',))
+    restock.start()
+    try:
+        assert crawler.checkout(url)
+    finally:
+        restock.cancel()
+        crawler.pool.close()
+        screenshots.close()
+    assert len(drivers) > 1
+    assert all(driver.quit_called for driver in drivers[:-1])
+    # bought from the fresh browser, back on the product page
+    assert len(drivers[-1].orders) == 1
+
+def test_shared_pool_launches_with_the_crawlers_profile():
+    pool = DriverPool(size=2, launch=FakeDriver)
+    headless = BrowserProfile(headless=True)
+    first = Game(None, None, None, pool=pool, profile=headless)
+    assert pool.profile is headless
+    assert '--headless=new' in pool.options.arguments
+    # not asked for anything, so it runs with the pool's
+    assert Game(None, None, None, pool=pool).profile is headless
+    with pytest.raises(ValueError):
+        Game(None, None, None, pool=pool, profile=BrowserProfile(headless=False, page_load_strategy='normal'))
+    assert first.profile == BrowserProfile(headless=True)
+    pool.close()
+
+def test_pool_profile_wins_over_a_default_crawler():
+    pool = DriverPool(size=1, launch=FakeDriver, profile=BrowserProfile(headless=True, block_patterns=('*reviews*',)))
+    assert Game(None, None, None, pool=pool).profile is pool.profile
+    assert Game(None, None, None, pool=pool, headless=True).profile is pool.profile
+    pool.close()
+    headed = DriverPool(size=1, launch=FakeDriver, profile=BrowserProfile())
+    with pytest.raises(ValueError):
+        Game(None, None, None, pool=headed, headless=True)
+    headed.close()
@@ -0,0 +1,35 @@
+from sel_crawler.core.forms import FormFiller
+from benchmarks.fake_driver import FakeDriver
+from selenium.webdriver.common.by import By
+
+class Page:
+    """
+    what FormFiller needs of a crawler: its driver and find_by_CSS.
+    """
+    def __init__(self, driver: FakeDriver) -> None:
+        self.driver = driver
+
+    def find_by_CSS(self, selector: str):
+        return self.driver.find_element(By.CSS_SELECTOR, selector)
+
+def value(driver: FakeDriver, selector: str) -> str:
+    return driver.find_element(By.CSS_SELECTOR, selector).get_attribute('value')
+
+def test_batch_fill(fixtures):
+    driver = FakeDriver()
+    driver.get(fixtures.url('game/contact.html'))
+    report = FormFiller(Page(driver)).fill('contact', {'#mat-input-0': 'Jane', '#mat-input-1': 'Doe'})
+    assert report.scripted == 2 and report.typed == [] and report.round_trips == 2
+    assert value(driver, '#mat-input-0') == 'Jane' and value(driver, '#mat-input-1') == 'Doe'
+
+def test_field_without_a_value_is_typed_not_fatal(fixtures):
+    """
+    a selector that lands on a div (no value property) is handed back and typed, the rest of the batch still goes through.
+    """
+    driver = FakeDriver()
+    driver.get(fixtures.url('game/contact.html'))
+    report = FormFiller(Page(driver)).fill('contact', {'#mat-input-0': 'Jane', '#mat-select-0': 'Mr', '#mat-input-1': 'Doe'})
+    assert report.scripted == 2 and report.typed == ['#mat-select-0']
+    assert value(driver, '#mat-input-0') == 'Jane' and value(driver, '#mat-input-1') == 'Doe'
+    assert value(driver, '#mat-select-0') == 'Mr'
+    assert driver.commands['sendKeysToElement'] == 1
@@ -0,0 +1,36 @@
+from sel_crawler.core.history import HistoryStore
+from contextlib import closing
+import sqlite3
+import atexit
+import time
+
+def test_round_trip(tmp_path):
+    store = HistoryStore(str(tmp_path / 'h.sqlite'))
+    now = time.time()
+    store.probe('game:1', 'game', False, 0.1, when=now - 10)
+    store.probe('game:1', 'game', True, 0.1, when=now - 5)
+    store.probe('game:1', 'game', False, 0.1, when=now)
+    store.close()
+    [window] = store.windows('game:1')
+    assert round(window["seconds"]) == 5
+    assert store.detection_lag()["game"]["max"] == 5
+    assert store.stats()["probes"] == 3
+
+def test_probe_queries_use_the_indexes(tmp_path):
+    store = HistoryStore(str(tmp_path / 'h.sqlite'))
+    store.close()
+    with closing(sqlite3.connect(store.path)) as conn:
+        def plan(sql):
+            return ' '.join(row[-1] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, (0,)))
+        # pruning, and the last probe per product the writer loads on start
+        assert 'probes_t' in plan('DELETE FROM probes WHERE t < ?')
+        assert 'probes_product' in plan('SELECT product, MAX(t) FROM probes WHERE result != ? GROUP BY product')
+
+def test_close_drops_the_exit_hook(tmp_path, monkeypatch):
+    hooks = []
+    monkeypatch.setattr(atexit, 'register', hooks.append)
+    monkeypatch.setattr(atexit, 'unregister', lambda func: hooks.remove(func) if func in hooks else None)
+    store = HistoryStore(str(tmp_path / 'h.sqlite'))
+    assert hooks == [store.close]
+    store.close()
+    assert hooks == []
@@ -0,0 +1,85 @@
+from sel_crawler.core.urls import normalise_url
+from sel_crawler.scheduler import PollScheduler
+from sel_crawler.core.screenshots import ScreenshotService
+from sel_crawler.core.websites import Game, Argos
+from benchmarks.offline_bench import make_crawler, PRODUCTS, LISTINGS
+from tests.conftest import CONTACT, PAYMENT, LOGIN
+import threading
+import asyncio
+import pytest
+import time
+
+def test_normalise_url():
+    assert normalise_url('HTTPS://Shop.Example.com:443/p/1/?b=2&a=1&utm_medium=x&gclid=y#top') == 'https://shop.example.com/p/1?a=1&b=2'
+    assert normalise_url('http://shop.example.com:8080') == 'http://shop.example.com:8080/'
+    # www. is a different host as far as the url goes
+    assert normalise_url('https://www.example.com/p') != normalise_url('https://example.com/p')
+
+@pytest.mark.parametrize('site', [Game, Argos])
+def test_listing_stock_is_keyed_like_the_product_pages(fixtures, probe, site):
+    crawler = site(None, CONTACT, PAYMENT, LOGIN) if site is Argos else site(None, CONTACT, PAYMENT)
+    listing = fixtures.url(LISTINGS[site.SITE])
+    product = crawler.watch_key(fixtures.url(PRODUCTS[site.SITE] + '?id=3'))
+    stock = crawler.listing_check(probe, listing)
+    assert len(stock) == 100 and stock[product] is False
+    fixtures.restock(LISTINGS[site.SITE])
+    assert crawler.listing_check(probe, listing)[product] is True
+
+@pytest.fixture
+def scheduler(fixtures, probe, tmp_path):
+    """
+    Game targets for products 0-2 (on the listing) and 500 (not on it), and the listing itself.
+    """
+    screenshots = ScreenshotService(str(tmp_path))
+    scheduler = PollScheduler(probe=probe, interval=(0.05, 0.1))
+    for i in (0, 1, 2, 500):
+        scheduler.add(make_crawler(Game, [], 0.0, 0.0, screenshots), fixtures.url('{}?id={}'.format(PRODUCTS['game'], i)))
+    scheduler.add_listing(fixtures.url(LISTINGS['game']), delay=0.01)
+    thread = threading.Thread(target=asyncio.run, args=(scheduler.run(),))
+    thread.start()
+    yield scheduler
+    if thread.is_alive():
+        scheduler.stop()
+        thread.join(10)
+    screenshots.close()
+    for target in scheduler.targets:
+        target.crawler.pool.close()
+
+def test_listed_products_are_parked_until_the_listing_shows_stock(fixtures, scheduler):
+    time.sleep(0.6)
+    listed, unlisted = scheduler.targets[:3], scheduler.targets[3]
+    assert [t.state for t in listed] == ["listed"] * 3
+    parked = [t.polls for t in listed]
+    assert all(polls <= 1 for polls in parked)
+    assert unlisted.state in ("waiting", "polling") and unlisted.polls > 3
+    time.sleep(0.3)
+    assert [t.polls for t in listed] == parked
+    assert scheduler.stats()["polls_replaced"] > 0
+    # the listing says in stock, the product pages are checked straight away and bought
+    fixtures.restock(LISTINGS['game'])
+    fixtures.restock(PRODUCTS['game'])
+    deadline = time.monotonic() + 10
+    while any(t.state != "done" for t in scheduler.targets) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert [t.state for t in scheduler.targets] == ["done"] * 4
+
+def test_listing_in_stock_is_confirmed_on_the_product_page(fixtures, scheduler):
+    time.sleep(0.6)
+    parked = [t.polls for t in scheduler.targets[:3]]
+    # the listing is ahead of the product page: polled again, nothing bought yet
+    fixtures.restock(LISTINGS['game'])
+    time.sleep(0.5)
+    assert all(t.polls > polls for t, polls in zip(scheduler.targets, parked))
+    assert all(t.state in ("waiting", "polling") for t in scheduler.targets)
+
+def test_product_that_drops_off_the_listing_is_polled_again(fixtures, scheduler):
+    time.sleep(0.6)
+    target = scheduler.targets[0]
+    assert target.state == "listed"
+    [listing] = scheduler.listings
+    gone = {key: False for key in listing.stock if key != target.key}
+    # the next scans no longer show it
+    listing.crawler.listing_check = lambda probe, url: gone
+    polls = target.polls
+    time.sleep(0.4)
+    assert target.state in ("waiting", "polling") and target.polls > polls
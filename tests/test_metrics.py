@@ -0,0 +1,82 @@
+from sel_crawler.core.metrics import Metrics
+from sel_crawler.core.driver_pool import DriverPool
+from sel_crawler.core.tabs import SharedBrowser
+from sel_crawler.core.websites import Game
+from benchmarks.fake_driver import FakeDriver
+from tests.conftest import CONTACT, PAYMENT
+import atexit
+
+def commands(metrics: Metrics, command: str) -> float:
+    return sum(v for (name, labels), v in metrics.counters.items()
+               if name == 'webdriver_commands_total' and ('command', command) in labels)
+
+def test_commands_are_counted_per_crawler(fixtures):
+    metrics = Metrics()
+    crawler = Game(None, CONTACT, PAYMENT, pool=DriverPool(size=1, launch=FakeDriver), metrics=metrics)
+    try:
+        crawler.driver.get(fixtures.url('game/product.html'))
+        crawler.find_many_by_CSS('#mainPDPButtons')
+    finally:
+        crawler.close()
+        crawler.pool.close()
+    labels = {dict(labels)["command"]: dict(labels) for (name, labels) in metrics.counters if name == 'webdriver_commands_total'}
+    assert labels["get"]["crawler"] == crawler.name and labels["get"]["site"] == 'game'
+    assert commands(metrics, 'findElements') == 1
+
+def test_browser_leased_after_a_restart_is_still_timed(fixtures):
+    metrics = Metrics()
+    drivers = []
+    pool = DriverPool(size=1, launch=lambda: drivers.append(FakeDriver(0.0, 0.0)) or drivers[-1])
+    crawler = Game(None, CONTACT, PAYMENT, pool=pool, metrics=metrics)
+    try:
+        crawler.driver.get(fixtures.url('game/product.html'))
+        # what the supervisor does to a hung crawler before restarting it
+        crawler.abort()
+        crawler.close()
+        crawler.driver.get(fixtures.url('game/product.html'))
+        assert len(drivers) == 2
+        assert commands(metrics, 'get') == 2
+    finally:
+        crawler.close()
+        pool.close()
+
+def test_tab_moved_to_a_new_browser_is_still_timed(fixtures):
+    metrics = Metrics()
+    drivers = []
+    shared = SharedBrowser(pool=DriverPool(size=1, launch=lambda: drivers.append(FakeDriver(0.0, 0.0)) or drivers[-1]))
+    crawler = Game(None, CONTACT, PAYMENT, pool=shared, metrics=metrics)
+    other = Game(None, CONTACT, PAYMENT, pool=shared, metrics=metrics)
+    try:
+        crawler.driver.get(fixtures.url('game/product.html'))
+        other.driver.get(fixtures.url('argos/product.html'))
+        other.abort()
+        crawler.driver.title
+        assert len(drivers) == 2
+        # the reload of its page in the new browser, then the title
+        assert commands(metrics, 'get') == 3 and commands(metrics, 'getTitle') == 1
+    finally:
+        shared.close()
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.inc('checkouts_total', error='said "no"\nC:\\path')
+    assert 'sel_checkouts_total{error="said \\"no\\"\\nC:\\\\path"} 1' in metrics.render().splitlines()
+
+def test_snapshots_merge():
+    first, second = Metrics(), Metrics()
+    first.inc('polls_total', site='game')
+    second.inc('polls_total', 2, site='game')
+    second.observe('webdriver_command_seconds', 0.02, site='game')
+    merged = Metrics.merged([first.snapshot(), second.snapshot()])
+    assert merged.counters[('polls_total', (('site', 'game'),))] == 3
+    assert merged.histograms[('webdriver_command_seconds', (('site', 'game'),))].count == 1
+
+def test_close_drops_the_exit_hook(tmp_path, monkeypatch):
+    hooks = []
+    monkeypatch.setattr(atexit, 'register', hooks.append)
+    monkeypatch.setattr(atexit, 'unregister', lambda func: [hooks.remove(h) for h in list(hooks) if h == func])
+    metrics = Metrics(str(tmp_path / 'trace.jsonl'))
+    metrics.serve(port=0)
+    assert hooks == [metrics.close, metrics.close]
+    metrics.close()
+    assert hooks == []
@@ -0,0 +1,110 @@
+from sel_crawler.core.notifications.dispatcher import Dispatcher
+from sel_crawler.core.notifications.webhook import WebhookBackend
+from sel_crawler.core.websites import Game
+from sel_crawler.multi_instance import MultiInstance
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tests.conftest import CONTACT, PAYMENT
+import threading
+import atexit
+import json
+import time
+import pytest
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        stub = self.server.stub
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(stub.delay)
+        status = stub.statuses.pop(0) if stub.statuses else 200
+        stub.requests.append((status, body))
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+class StubWebhook:
+    """
+    local webhook endpoint: records every POST and answers with the queued statuses (then 200s).
+    """
+    def __init__(self) -> None:
+        self.requests = []
+        self.statuses = []
+        self.delay = 0.0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.stub = self
+        self.url = 'http://{}:{}/hook'.format(*self.server.server_address)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def texts(self, status: int = 200) -> list[str]:
+        return [body['text'] for code, body in self.requests if code == status]
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+@pytest.fixture
+def hook():
+    stub = StubWebhook()
+    yield stub
+    stub.close()
+
+def test_burst_is_coalesced(hook):
+    dispatcher = Dispatcher([WebhookBackend(hook.url)], coalesce=0.3)
+    dispatcher.send_notif('ps5', 'https://example.com/ps5')
+    dispatcher.send_notif('ps5', 'https://example.com/ps5')
+    dispatcher.send_final_notif()
+    assert dispatcher.flush(5)
+    assert hook.texts() == ['ps5 available at https://example.com/ps5 (x2)\nFilling out Final Details Page']
+    assert dispatcher.stats()["coalesced"] == 1
+    dispatcher.close()
+
+def test_retries_on_5xx_not_4xx(hook):
+    dispatcher = Dispatcher([WebhookBackend(hook.url)], coalesce=0, backoff=0.01)
+    hook.statuses = [503, 500]
+    dispatcher.notify('restock')
+    assert dispatcher.flush(5)
+    assert [code for code, _ in hook.requests] == [503, 500, 200]
+    assert dispatcher.stats()["sent"] == 1 and dispatcher.stats()["retried"] == 2
+
+    hook.statuses = [400]
+    dispatcher.notify('bad request')
+    assert dispatcher.flush(5)
+    assert [code for code, _ in hook.requests][3:] == [400]
+    assert dispatcher.stats()["failed"] == 1
+    dispatcher.close()
+
+def test_flush_skips_the_coalesce_wait_and_honours_grace(hook):
+    dispatcher = Dispatcher([WebhookBackend(hook.url)], coalesce=30)
+    dispatcher.notify('restock')
+    start = time.monotonic()
+    assert dispatcher.flush(5)
+    assert time.monotonic() - start < 5
+    assert hook.texts() == ['restock']
+
+    hook.delay = 1.0
+    dispatcher.notify('slow')
+    # grace runs out before the endpoint answers
+    assert not dispatcher.flush(0.1)
+    assert dispatcher.flush(5)
+    dispatcher.close()
+
+def test_multi_instance_shares_one_dispatcher(hook):
+    backend = WebhookBackend(hook.url)
+    first, second = Game(None, CONTACT, PAYMENT, bot=backend), Game(None, CONTACT, PAYMENT, bot=backend)
+    other = Game(None, CONTACT, PAYMENT, bot=WebhookBackend(hook.url))
+    MultiInstance({first: 'https://www.game.co.uk/a-12345', second: 'https://www.game.co.uk/b-12345',
+                   other: 'https://www.game.co.uk/c-12345'})
+    assert first.bot is second.bot
+    # a different backend object isn't merged in
+    assert other.bot is not first.bot
+
+def test_close_drops_the_exit_hook(monkeypatch):
+    hooks = []
+    monkeypatch.setattr(atexit, 'register', hooks.append)
+    monkeypatch.setattr(atexit, 'unregister', lambda func: hooks.remove(func) if func in hooks else None)
+    dispatcher = Dispatcher([])
+    assert hooks == [dispatcher.close]
+    dispatcher.close()
+    assert hooks == []
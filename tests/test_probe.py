@@ -0,0 +1,50 @@
+from sel_crawler.core.probe import ProbeError, parse_html
+from sel_crawler.core.websites import Game, Argos
+from tests.conftest import CONTACT, PAYMENT, LOGIN
+import pytest
+
+PAGE = parse_html("""
+<div id="main" class="pdp wide">
+  <div class="buttons"><a class="btn buy" href="/add">Add <span class="label">to basket</span></a></div>
+  <ul class="list"><li class="item noSlot">Mon</li><li class="item">Tue</li></ul>
+  <img src="x.png"><p>after a void tag</p>
+</div>
+<p class="buy">outside</p>
+""")
+
+def texts(selector: str) -> list[str]:
+    return [node.text for node in PAGE.select(selector)]
+
+def test_descendant_and_class_combinations():
+    assert texts('#main .buy') == ['Add to basket']
+    assert texts('.buy') == ['Add to basket', 'outside']
+    assert texts('a.btn.buy .label') == ['to basket']
+    assert texts('div.pdp.wide > .buttons > a') == ['Add to basket']
+    assert texts('.list :not(.noSlot).item') == ['Tue']
+    # void tags don't swallow what follows them
+    assert texts('#main > p') == ['after a void tag']
+
+def test_missing_elements():
+    assert PAGE.select('#missing') == []
+    assert PAGE.select('.pdp > .label') == []
+    assert PAGE.select('.buttons.list') == []
+    assert PAGE.select('a')[0].get_attribute('title') is None
+
+@pytest.mark.parametrize('site, page', [(Game, 'game/product.html'), (Argos, 'argos/product.html')])
+def test_stock_on_fixture_pages(fixtures, probe, site, page):
+    crawler = site(None, CONTACT, PAYMENT, LOGIN) if site is Argos else site(None, CONTACT, PAYMENT)
+    url = fixtures.url(page)
+    assert crawler.probe_available(url, probe.fetch_page(url)) is False
+    fixtures.restock(page)
+    assert crawler.probe_available(url, probe.fetch_page(url)) is True
+
+def test_error_status(fixtures, probe):
+    with pytest.raises(ProbeError) as error:
+        probe.fetch(fixtures.url('game/no-such-page.html'))
+    assert error.value.status == 404
+
+def test_conditional_get(fixtures, probe):
+    url = fixtures.url('game/product.html')
+    first = probe.fetch(url)
+    assert first.status == 200 and first.headers['etag']
+    assert probe.fetch(url, {'If-None-Match': first.headers['etag']}).status == 304
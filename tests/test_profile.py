@@ -0,0 +1,53 @@
+from sel_crawler.core.profile import BrowserProfile, RESOURCE_PATTERNS
+from sel_crawler.core.driver_pool import DriverPool
+from sel_crawler.core.websites import Game
+from benchmarks.fake_driver import FakeDriver
+from tests.conftest import CONTACT, PAYMENT
+import pytest
+
+def cdp_calls(driver: FakeDriver) -> list[str]:
+    return [command for _, command in driver.log if command == 'executeCdpCommand']
+
+def test_polling_blocks_resources_over_cdp():
+    driver = FakeDriver(0.0, 0.0)
+    profile = BrowserProfile(block_types=('image', 'tracking'), block_patterns=('*reviews*',))
+    assert profile.polling(driver, ('*recommendations*',)) is True
+    assert driver.blocked_urls == RESOURCE_PATTERNS['image'] + RESOURCE_PATTERNS['tracking'] + ['*reviews*', '*recommendations*']
+    # Network.enable, then Network.setBlockedURLs
+    assert len(cdp_calls(driver)) == 2
+    assert profile.checkout(driver) is True
+    assert driver.blocked_urls == []
+
+def test_browser_without_devtools_loads_everything():
+    class NoCdp:
+        pass
+    assert BrowserProfile().polling(NoCdp()) is False
+
+def test_crawler_goes_lean_while_polling_and_full_for_checkout():
+    crawler = Game(None, CONTACT, PAYMENT, pool=DriverPool(size=1, launch=lambda: FakeDriver(0.0, 0.0)))
+    try:
+        crawler.lean_loading()
+        driver = crawler.driver
+        assert crawler.lean and driver.blocked_urls == crawler.profile.blocklist(Game.BLOCKED_WHILE_POLLING)
+        crawler.full_loading()
+        assert not crawler.lean and driver.blocked_urls == []
+        # already full: no devtools round trip
+        calls = len(cdp_calls(driver))
+        crawler.full_loading()
+        assert len(cdp_calls(driver)) == calls
+    finally:
+        crawler.close()
+        crawler.pool.close()
+
+def test_options():
+    options = BrowserProfile(headless=True, page_load_strategy='none', disable_images=True, arguments=('--lang=en-GB',)).options()
+    assert options.page_load_strategy == 'none'
+    assert options.arguments == ['--headless=new', '--lang=en-GB']
+    assert options.experimental_options['prefs'] == {'profile.managed_default_content_settings.images': 2}
+    assert BrowserProfile().options().arguments == []
+
+def test_bad_settings_are_refused():
+    with pytest.raises(ValueError):
+        BrowserProfile(page_load_strategy='lazy')
+    with pytest.raises(ValueError):
+        BrowserProfile(block_types=('images',))
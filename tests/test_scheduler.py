@@ -0,0 +1,141 @@
+from sel_crawler.scheduler import PollScheduler
+from sel_crawler.core.probe import HttpProbe
+from sel_crawler.core.screenshots import ScreenshotService
+from sel_crawler.core.websites import Game
+from benchmarks.offline_bench import make_crawler, PRODUCTS
+from tests.conftest import CONTACT, PAYMENT
+import threading
+import asyncio
+import pytest
+import time
+
+def crawler(check, checkout=lambda url: True) -> Game:
+    """
+    a Game crawler that never opens a browser: probe_check(url) and checkout(url) are the given functions.
+    """
+    crawler = Game(None, CONTACT, PAYMENT)
+    crawler.probe_check = lambda probe, url: check(url)
+    crawler.checkout = checkout
+    return crawler
+
+def run(scheduler: PollScheduler, timeout: float = 10) -> None:
+    thread = threading.Thread(target=asyncio.run, args=(scheduler.run(),))
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "scheduler didnt finish"
+
+def test_timers_fire_in_due_order():
+    polled = []
+    scheduler = PollScheduler(interval=(0.01, 0.01))
+    for url, delay in (('https://a.test/3', 0.3), ('https://a.test/1', 0.1), ('https://b.test/2', 0.2), ('https://a.test/0', 0)):
+        scheduler.add(crawler(lambda url: polled.append(url) or True), url, delay=delay)
+    run(scheduler)
+    assert polled == ['https://a.test/0', 'https://a.test/1', 'https://b.test/2', 'https://a.test/3']
+    assert [t.state for t in scheduler.targets] == ["done"] * 4
+
+def test_probes_are_capped_per_host():
+    lock = threading.Lock()
+    in_flight = {}
+    most = {}
+
+    def check(url):
+        host = url.split('/')[2]
+        with lock:
+            in_flight[host] = in_flight.get(host, 0) + 1
+            most[host] = max(most.get(host, 0), in_flight[host])
+        time.sleep(0.1)
+        with lock:
+            in_flight[host] -= 1
+        return True
+
+    scheduler = PollScheduler(per_host=2, checkout_workers=8)
+    for i in range(6):
+        scheduler.add(crawler(check), 'https://a.test/{}'.format(i))
+    for i in range(3):
+        scheduler.add(crawler(check), 'https://b.test/{}'.format(i))
+    started = time.monotonic()
+    run(scheduler)
+    assert most == {'a.test': 2, 'b.test': 2}
+    # the hosts were probed side by side, not one after the other
+    assert time.monotonic() - started < 0.1 * 8
+
+def test_polls_are_jittered_within_the_interval():
+    polled = []
+
+    def check(url):
+        polled.append(time.monotonic())
+        return len(polled) == 8
+
+    scheduler = PollScheduler(interval=(0.02, 0.08))
+    scheduler.add(crawler(check), 'https://a.test/1')
+    run(scheduler)
+    gaps = [b - a for a, b in zip(polled, polled[1:])]
+    assert len(gaps) == 7
+    assert all(0.02 <= gap < 0.08 + 0.05 for gap in gaps)
+    assert len({round(gap, 3) for gap in gaps}) > 1
+
+def test_listing_needs_a_crawler_on_its_host():
+    scheduler = PollScheduler()
+    scheduler.add(crawler(lambda url: False), 'https://a.test/1')
+    with pytest.raises(ValueError):
+        scheduler.add_listing('https://b.test/search?q=ps5')
+
+def test_crawlers_without_a_probe_dont_hold_checkout_workers():
+    release = threading.Event()
+
+    def no_probe(url):
+        raise NotImplementedError
+
+    def main(url):
+        # polls in the browser until it sees stock
+        release.wait(10)
+        return True
+
+    browser_only = crawler(no_probe)
+    browser_only.main = main
+    in_stock = []
+    scheduler = PollScheduler(checkout_workers=1)
+    scheduler.add(browser_only, 'https://a.test/1')
+    scheduler.add(crawler(lambda url: True, lambda url: in_stock.append(url) or True), 'https://a.test/2', delay=0.1)
+    thread = threading.Thread(target=asyncio.run, args=(scheduler.run(),))
+    thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while not in_stock and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert in_stock == ['https://a.test/2']
+        assert scheduler.targets[0].state == "checking out"
+    finally:
+        release.set()
+        thread.join(10)
+    assert [t.state for t in scheduler.targets] == ["done", "done"]
+
+def test_restock_on_the_fixture_site_checks_out_every_target(fixtures, tmp_path):
+    probe = HttpProbe(max_per_host=4)
+    screenshots = ScreenshotService(str(tmp_path))
+    scheduler = PollScheduler(probe=probe, per_host=4, checkout_workers=2, interval=(0.05, 0.1))
+    drivers = {}
+    for i in range(4):
+        # targets 0 and 1 watch the same product
+        url = fixtures.url('{}?id={}'.format(PRODUCTS['game'], max(i, 1)))
+        scheduler.add(make_crawler(Game, drivers.setdefault(i, []), 0.0, 0.0, screenshots), url)
+    thread = threading.Thread(target=asyncio.run, args=(scheduler.run(),))
+    thread.start()
+    try:
+        time.sleep(0.5)
+        # nothing in stock: polling only, no browser yet
+        assert scheduler.stats()["polls"] > 0 and not any(drivers.values())
+        fixtures.restock(PRODUCTS['game'])
+        thread.join(30)
+        assert not thread.is_alive()
+    finally:
+        if thread.is_alive():
+            scheduler.stop()
+            thread.join(10)
+        probe.close()
+        screenshots.close()
+        for target in scheduler.targets:
+            target.crawler.pool.close()
+    assert [t.state for t in scheduler.targets] == ["done"] * 4
+    assert [sum(len(d.orders) for d in drivers[i]) for i in range(4)] == [1] * 4
+    assert scheduler.targets[1].polls == 0 and scheduler.stats()["polls_saved"] > 0
@@ -0,0 +1,81 @@
+from sel_crawler.core.screenshots import ScreenshotService
+import threading
+import atexit
+import base64
+import os
+
+PNG = base64.b64encode(b'\x89PNG\r\n\x1a\n not really a png').decode()
+
+class Camera:
+    def get_screenshot_as_base64(self) -> str:
+        return PNG
+
+def files(service: ScreenshotService) -> list[str]:
+    return sorted(os.listdir(service.directory)) if os.path.isdir(service.directory) else []
+
+def test_capture_after_close_is_written(tmp_path):
+    service = ScreenshotService(str(tmp_path), run_id='run')
+    assert service.capture(Camera(), 'before')
+    service.close()
+    assert service.capture(Camera(), 'after')
+    assert files(service) == ['0001-before.png', '0002-after.png']
+
+def test_no_capture_is_lost_while_closing(tmp_path):
+    service = ScreenshotService(str(tmp_path), run_id='run', max_queue=1000)
+    taken = []
+    start = threading.Barrier(5)
+
+    def shoot(n: int) -> None:
+        start.wait()
+        for i in range(50):
+            if service.capture(Camera(), 'shot-{}-{}'.format(n, i)):
+                taken.append(1)
+
+    threads = [threading.Thread(target=shoot, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    service.close()
+    for thread in threads:
+        thread.join()
+    assert len(files(service)) == len(taken) == 200
+    assert service.stats()["written"] == 200
+
+def test_close_drops_the_exit_hook(tmp_path, monkeypatch):
+    hooks = []
+    monkeypatch.setattr(atexit, 'register', hooks.append)
+    monkeypatch.setattr(atexit, 'unregister', lambda func: hooks.remove(func) if func in hooks else None)
+    service = ScreenshotService(str(tmp_path))
+    assert hooks == [service.close]
+    service.close()
+    assert hooks == []
+
+def test_services_started_together_dont_share_a_run(tmp_path, monkeypatch):
+    first = ScreenshotService(str(tmp_path))
+    # a shard worker started in the same second
+    monkeypatch.setattr(os, 'getpid', lambda: 1)
+    second = ScreenshotService(str(tmp_path))
+    try:
+        assert first.directory != second.directory
+        first.capture(Camera(), 'a')
+        second.capture(Camera(), 'b')
+        first.flush()
+        second.flush()
+        assert files(first) == ['0001-a.png'] and files(second) == ['0001-b.png']
+    finally:
+        first.close()
+        second.close()
+
+def test_rotation_only_removes_old_runs(tmp_path):
+    for run in ('20200101-000000-10', '20200102-000000-11'):
+        os.makedirs(str(tmp_path / run))
+        (tmp_path / run / '0001-old.png').write_bytes(b'old')
+    os.makedirs(str(tmp_path / 'keep'))
+    (tmp_path / 'keep' / 'notes.txt').write_text('mine')
+    (tmp_path / '20200102-000000-11' / 'notes.txt').write_text('mine too')
+    service = ScreenshotService(str(tmp_path), max_runs=1)
+    service.close()
+    service.capture(Camera(), 'new')
+    assert sorted(os.listdir(str(tmp_path))) == sorted(['20200102-000000-11', 'keep', service.run_id])
+    assert os.listdir(str(tmp_path / '20200102-000000-11')) == ['notes.txt']
+    assert os.listdir(str(tmp_path / 'keep')) == ['notes.txt']
@@ -0,0 +1,23 @@
+from sel_crawler.core.websites import Argos
+from sel_crawler.core.sites import load_site
+from sel_crawler.core.screenshots import ScreenshotService
+from benchmarks.offline_bench import make_crawler
+import pytest
+
+@pytest.mark.parametrize('site', [Argos, load_site('argos')], ids=['coded', 'declared'])
+def test_expired_warm_session_logs_in_again(fixtures, tmp_path, site):
+    """
+    the fixture trolley always goes to the login page, as it would once the stored session expired.
+    """
+    fixtures.restock('argos/product.html')
+    screenshots = ScreenshotService(str(tmp_path))
+    crawler = make_crawler(site, [], 0.0, 0.0, screenshots)
+    crawler.session_warm = True
+    try:
+        assert crawler.checkout(fixtures.url('argos/product.html'))
+    finally:
+        crawler.pool.close()
+        screenshots.close()
+    done = [t.step for t in crawler.transitions if t.ok]
+    assert done.index('login') < done.index('details')
+    assert crawler.session_warm is False
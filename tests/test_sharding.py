@@ -0,0 +1,82 @@
+from sel_crawler.core.websites import Game, Argos
+from sel_crawler.sharding import ShardCoordinator, ShardWorker, build_crawler
+from sel_crawler.core.metrics import Metrics
+from tests.conftest import CONTACT, PAYMENT, LOGIN
+from benchmarks.offline_bench import PRODUCTS
+from sel_crawler.core.sites import load_site
+import importlib
+import threading
+import pytest
+import time
+import socket
+import json
+
+def test_details_never_go_over_the_wire():
+    crawler = Argos(None, CONTACT, PAYMENT, LOGIN)
+    coordinator = ShardCoordinator({crawler: 'https://www.argos.co.uk/product/8349000'})
+    try:
+        conn = socket.create_connection(coordinator.address)
+        conn.sendall(b'{"type": "hello", "worker": "snoop", "capacity": 1}\n')
+        line = conn.makefile('r', encoding='utf-8').readline()
+        conn.close()
+    finally:
+        coordinator.stop()
+    message = json.loads(line)
+    assert message["type"] == "assign"
+    assert set(message["targets"][0]) == {"id", "site", "url", "key", "priority"}
+    for secret in (PAYMENT.card_number, PAYMENT.cv2, LOGIN.pw, CONTACT.email, CONTACT.post_code):
+        assert secret not in line
+
+def test_worker_fills_in_its_local_details():
+    spec = {"id": "argos-0", "site": "Argos", "url": "https://www.argos.co.uk/product/8349000",
+            "key": "argos:8349000", "priority": 2}
+    details = {"contact": vars(CONTACT), "payment": vars(PAYMENT), "headless": True,
+               "targets": {"argos-0": {"login": vars(LOGIN)}}}
+    worker = ShardWorker(('127.0.0.1', 1), details=details)
+    crawler = build_crawler(worker._local_spec(spec), Metrics())
+    assert isinstance(crawler, Argos) and crawler.priority == 2
+    assert crawler.payment_details == PAYMENT and crawler.contact_details == CONTACT and crawler.login == LOGIN
+    # a target without its own entry still gets the shared ones
+    other = worker._local_spec(dict(spec, id="game-1", site="Game"))
+    assert "login" not in other and other["payment"] == vars(PAYMENT)
+    assert isinstance(build_crawler(other, Metrics()), Game)
+
+def test_only_known_sites_are_built(monkeypatch):
+    imported = []
+    monkeypatch.setattr(importlib, 'import_module', imported.append)
+    for site in ("os:system", "subprocess:Popen", "GlobalScrape"):
+        spec = {"id": "x", "site": site, "url": "https://example.com", "key": "x", "priority": 0}
+        with pytest.raises(ValueError):
+            build_crawler(spec, Metrics())
+    assert imported == []
+    spec = {"id": "x", "site": load_site('game').__name__, "url": "https://example.com", "key": "x", "priority": 0}
+    assert isinstance(build_crawler(spec, Metrics()), load_site('game'))
+
+def test_a_spec_that_wont_build_is_reported_not_fatal(fixtures):
+    game = Game(None, CONTACT, PAYMENT)
+    argos = Argos(None, CONTACT, PAYMENT, LOGIN)
+    coordinator = ShardCoordinator({game: fixtures.url(PRODUCTS['game']), argos: fixtures.url(PRODUCTS['argos'])},
+                                   heartbeat=0.1)
+    built = []
+
+    def factory(spec, metrics):
+        if spec["site"] == "Game":
+            raise RuntimeError("no chrome")
+        built.append(spec["id"])
+        return build_crawler(spec, metrics)
+
+    worker = ShardWorker(coordinator.address, capacity=2, heartbeat=0.1, factory=factory, details={"headless": True},
+                         interval=(30, 30))
+    thread = threading.Thread(target=worker.run, daemon=True)
+    thread.start()
+    try:
+        deadline = time.monotonic() + 10
+        while coordinator.stats()["targets"]["game-0"]["state"] != "broken" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        targets = coordinator.stats()["targets"]
+        assert targets["game-0"]["state"] == "broken" and "no chrome" in targets["game-0"]["error"]
+        assert built == ["argos-1"] and thread.is_alive()
+        assert targets["argos-1"]["state"] not in ("broken", "unassigned")
+    finally:
+        coordinator.stop()
+        thread.join(10)
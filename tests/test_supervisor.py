@@ -0,0 +1,105 @@
+from sel_crawler.core.websites import Game
+from sel_crawler.core.screenshots import ScreenshotService
+from sel_crawler.supervisor import Supervisor
+from sel_crawler.core.checkout import StepFailed
+from sel_crawler.core.history import HistoryStore
+from benchmarks.offline_bench import make_crawler
+from benchmarks.fake_driver import FakeDriver
+import threading
+import time
+
+class ChromeLikeDriver(FakeDriver):
+    """
+    once quit, fails at the connection like a real chromedriver (urllib3 errors), not with a WebDriverException.
+    """
+    def execute(self, command: str, params: dict = None):
+        if self.quit_called:
+            raise ConnectionRefusedError("chromedriver is gone")
+        return super().execute(command, params)
+
+def test_restarts_on_a_working_browser_after_a_hung_step(fixtures, tmp_path):
+    """
+    the first attempt hangs while polling (browser in lean mode); the supervisor quits its
+    browser, and the restart must get a fresh one from the pool of one.
+    """
+    fixtures.restock('game/product.html')
+    drivers = []
+    screenshots = ScreenshotService(str(tmp_path))
+    crawler = make_crawler(Game, drivers, 0.0, 0.0, screenshots)
+    crawler.pool.launch = lambda: drivers.append(ChromeLikeDriver(0.0, 0.0)) or drivers[-1]
+    product_refresh = crawler.product_refresh
+    hung = []
+
+    def hangs_once(url):
+        if hung:
+            return product_refresh(url)
+        hung.append(crawler.lean)
+        # like a page load that never returns, until the browser is quit under it
+        while not drivers[0].quit_called:
+            time.sleep(0.01)
+        crawler.driver.current_url
+    crawler.product_refresh = hangs_once
+
+    supervisor = Supervisor({crawler: fixtures.url('game/product.html')}, restarts=1, backoff=0.01, step_timeout=0.5)
+    thread = threading.Thread(target=supervisor.run, kwargs={"grace": 1})
+    thread.start()
+    thread.join(30)
+    try:
+        assert not thread.is_alive(), "restart never got a browser"
+        assert hung == [True]
+        status = supervisor.status()[crawler.name]
+        assert status["state"] == "done" and status["attempts"] == 2
+        assert len(drivers) == 2 and drivers[0].quit_called
+        assert len(drivers[1].orders) == 1
+    finally:
+        crawler.cancel()
+        crawler.pool.close()
+        screenshots.close()
+
+def test_final_click_that_errors_is_not_restarted(fixtures, tmp_path):
+    """
+    the pay click goes through but errors afterwards: the order is placed once and the crawler
+    isn't restarted to buy again.
+    """
+    fixtures.restock('game/product.html')
+    drivers = []
+    screenshots = ScreenshotService(str(tmp_path))
+    crawler = make_crawler(Game, drivers, 0.0, 0.0, screenshots)
+    final_checkout_btn = crawler.final_checkout_btn
+
+    def clicks_then_fails():
+        final_checkout_btn()
+        raise StepFailed("confirmation page didnt load")
+    crawler.final_checkout_btn = clicks_then_fails
+    supervisor = Supervisor({crawler: fixtures.url('game/product.html')}, restarts=2, backoff=0.01)
+    try:
+        status = supervisor.run(grace=1)[crawler.name]
+    finally:
+        crawler.pool.close()
+        screenshots.close()
+    assert status["state"] == "unknown" and status["attempts"] == 1
+    assert sum(len(driver.orders) for driver in drivers) == 1
+
+def test_records_stock_checks_and_the_checkout(fixtures, tmp_path):
+    """
+    under the supervisor (no scheduler) the in-browser stock checks and the checkout still reach the history.
+    """
+    drivers = []
+    screenshots = ScreenshotService(str(tmp_path / 'shots'))
+    history = HistoryStore(str(tmp_path / 'h.sqlite'))
+    crawler = make_crawler(Game, drivers, 0.0, 0.0, screenshots)
+    restock = threading.Timer(0.5, fixtures.restock, args=('game/product.html',))
+    restock.start()
+    supervisor = Supervisor({crawler: fixtures.url('game/product.html')}, restarts=0, history=history)
+    try:
+        status = supervisor.run(grace=1)[crawler.name]
+    finally:
+        restock.cancel()
+        crawler.pool.close()
+        screenshots.close()
+        history.close()
+    assert status["state"] == "done"
+    # out of stock polls, then the restock
+    assert history.stats()["probes"] >= 2
+    assert [(key, site) for key, site, when in history.restocks()] == [(crawler.watching, "game")]
+    assert history.success_rate("game")["game"]["ok"] == 1
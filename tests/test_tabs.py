@@ -0,0 +1,72 @@
+from sel_crawler.core.tabs import SharedBrowser
+from sel_crawler.core.driver_pool import DriverPool
+from sel_crawler.core.websites import Game
+from benchmarks.fake_driver import FakeDriver
+from tests.conftest import CONTACT, PAYMENT
+import threading
+import time
+import pytest
+
+class HangingDriver(FakeDriver):
+    """
+    execute_script('hang') blocks like a page that never answers, until the browser is quit.
+    """
+    def __init__(self) -> None:
+        super().__init__(0.0, 0.0)
+        self.hanging = threading.Event()
+
+    def _cmd_executeScript(self, params):
+        if params['script'] == 'hang':
+            self.hanging.set()
+            while not self.quit_called:
+                time.sleep(0.01)
+            raise ConnectionRefusedError("chromedriver is gone")
+        return super()._cmd_executeScript(params)
+
+@pytest.fixture
+def shared():
+    drivers = []
+    shared = SharedBrowser(pool=DriverPool(size=1, launch=lambda: drivers.append(HangingDriver()) or drivers[-1]))
+    shared.launched = drivers
+    yield shared
+    shared.close()
+
+def test_tabs_keep_their_own_pages(fixtures, shared):
+    first, second = shared.acquire(), shared.acquire()
+    first.get(fixtures.url('game/product.html'))
+    second.get(fixtures.url('argos/product.html'))
+    assert first.current_url.endswith('game/product.html') and second.current_url.endswith('argos/product.html')
+    assert len(shared.launched) == 1
+
+def test_hung_tab_doesnt_block_the_others_after_abort(fixtures, shared):
+    crawler = Game(None, CONTACT, PAYMENT, pool=shared)
+    crawler.driver.get(fixtures.url('game/product.html'))
+    other = shared.acquire()
+    other.get(fixtures.url('argos/product.html'))
+    errors = []
+
+    def hang():
+        try:
+            crawler.driver.execute_script('hang')
+        except Exception as e:
+            errors.append(e)
+
+    hung = threading.Thread(target=hang)
+    hung.start()
+    assert shared.launched[0].hanging.wait(5)
+    # while it hangs, every other tab waits on the browser lock
+    waiting = threading.Thread(target=lambda: other.title)
+    waiting.start()
+    waiting.join(0.2)
+    assert waiting.is_alive()
+
+    crawler.abort()
+    hung.join(5)
+    waiting.join(5)
+    assert not hung.is_alive() and not waiting.is_alive() and errors
+    # the other tab carries on in a fresh browser, on the page it was on
+    assert len(shared.launched) == 2 and shared.launched[0].quit_called
+    assert other.current_url.endswith('argos/product.html')
+    assert shared.stats()["tabs"] == 1
+    crawler.close()
+    assert shared.stats()["tabs"] == 1
@@ -0,0 +1,59 @@
+from sel_crawler.core.waits import Waiter
+from benchmarks.fake_driver import FakeDriver
+from selenium.webdriver.common.by import By
+from selenium.common import exceptions
+import pytest
+import time
+
+@pytest.fixture
+def page(fixtures):
+    driver = FakeDriver(0.0, 0.0)
+    driver.get(fixtures.url('game/contact.html'))
+    return driver
+
+def test_element_waits_return_the_element(page):
+    wait = Waiter(lambda: page, timeout=1, poll=0.01)
+    wait.begin('contact')
+    assert wait.present(By.ID, 'mat-input-0').get_attribute('id') == 'mat-input-0'
+    assert wait.clickable(By.CSS_SELECTOR, '.mat-raised-button').tag_name == 'button'
+    assert wait.report()['contact'] == {"count": 2, "total_s": pytest.approx(0, abs=0.5),
+                                         "max_s": pytest.approx(0, abs=0.5), "timeouts": 0}
+
+def test_missing_element_times_out_as_no_such_element(page):
+    wait = Waiter(lambda: page, timeout=5, poll=0.01)
+    wait.begin('contact')
+    started = time.monotonic()
+    with pytest.raises(exceptions.NoSuchElementException):
+        wait.present(By.ID, 'not-on-the-page', timeout=0.2)
+    assert 0.2 <= time.monotonic() - started < 1
+    step, what, seconds, ok = wait.timings[-1]
+    assert (step, what, ok) == ('contact', 'present not-on-the-page', False) and seconds >= 0.2
+    assert wait.report()['contact']['timeouts'] == 1
+
+def test_url_waits(page):
+    wait = Waiter(lambda: page, timeout=0.2, poll=0.01)
+    old = page.current_url
+    assert wait.url_changes(old) is False
+    assert wait.url_contains('address.html') is False
+    page.find_element(By.CSS_SELECTOR, '.mat-raised-button').click()
+    assert wait.url_changes(old) is True
+    assert wait.url_contains('address.html') is True
+
+def test_stale_elements_are_retried(page):
+    wait = Waiter(lambda: page, timeout=1, poll=0.01)
+    calls = []
+
+    def condition(driver):
+        calls.append(1)
+        if len(calls) < 3:
+            raise exceptions.StaleElementReferenceException("page re-rendered")
+        return driver.current_url
+
+    assert wait.until('rerender', condition) == page.current_url
+    assert len(calls) == 3
+
+def test_network_idle(page):
+    wait = Waiter(lambda: page, timeout=1, poll=0.01)
+    started = time.monotonic()
+    assert wait.network_idle(quiet=0.1) is True
+    assert 0.1 <= time.monotonic() - started < 1
@@ -0,0 +1,70 @@
+from sel_crawler.watch import WatchRegistry
+from sel_crawler.scheduler import PollScheduler
+from sel_crawler.core.probe import HttpProbe
+from sel_crawler.core.screenshots import ScreenshotService
+from sel_crawler.core.websites import Game
+from benchmarks.offline_bench import make_crawler, PRODUCTS
+from tests.conftest import CONTACT, PAYMENT
+import threading
+import asyncio
+import time
+
+class Target:
+    def __init__(self, key: str) -> None:
+        self.key = key
+
+def test_first_subscriber_polls_for_the_rest():
+    registry = WatchRegistry()
+    first, second, third, other = Target('game:1'), Target('game:1'), Target('game:1'), Target('game:2')
+    assert registry.subscribe(first, 0) and registry.subscribe(other, 0)
+    assert not registry.subscribe(second, 5) and not registry.subscribe(third, 0)
+    # highest priority first, then in the order they subscribed
+    assert registry.subscribers('game:1') == [second, first, third]
+    for _ in range(4):
+        registry.polled('game:1')
+    registry.polled('game:2')
+    stats = registry.stats()
+    assert stats["polls"] == 5 and stats["polls_saved"] == 8
+    registry.release('game:1')
+    assert registry.subscribe(Target('game:1'))
+
+def test_spellings_of_one_product_share_a_poller():
+    crawler = Game(None, CONTACT, PAYMENT)
+    urls = ['https://www.game.co.uk/en/playstation-5-console-2826338',
+            'https://WWW.game.co.uk/en/playstation-5-console-2826338/?utm_source=mail#reviews',
+            'https://www.game.co.uk/en/m/playstation-5-console-2826338?gclid=abc']
+    assert len({crawler.watch_key(url) for url in urls}) == 1
+
+def test_restock_checks_out_every_subscriber_in_priority_order(fixtures, tmp_path):
+    probe = HttpProbe(max_per_host=4)
+    screenshots = ScreenshotService(str(tmp_path))
+    # one checkout at a time, so the order they're handed over is the order they buy in
+    scheduler = PollScheduler(probe=probe, checkout_workers=1, interval=(0.05, 0.1))
+    url = fixtures.url(PRODUCTS['game'] + '?id=1')
+    drivers = {}
+    for i, (spelling, priority) in enumerate(((url, 0), (url + '&utm_source=mail', 2), (url + '#reviews', 1))):
+        crawler = make_crawler(Game, drivers.setdefault(i, []), 0.0, 0.0, screenshots)
+        crawler.priority = priority
+        scheduler.add(crawler, spelling)
+    thread = threading.Thread(target=asyncio.run, args=(scheduler.run(),))
+    thread.start()
+    try:
+        time.sleep(0.5)
+        first, second, third = scheduler.targets
+        assert first.polls > 0 and second.polls == third.polls == 0
+        assert second.state == third.state == "subscribed"
+        fixtures.restock(PRODUCTS['game'])
+        thread.join(30)
+        assert not thread.is_alive()
+    finally:
+        if thread.is_alive():
+            scheduler.stop()
+            thread.join(10)
+        probe.close()
+        screenshots.close()
+        for target in scheduler.targets:
+            target.crawler.pool.close()
+    assert [t.state for t in scheduler.targets] == ["done"] * 3
+    ordered = sorted(range(3), key=lambda i: drivers[i][0].orders[0][0])
+    assert ordered == [1, 2, 0]
+    assert scheduler.stats()["polls_saved"] == 2 * scheduler.targets[0].polls